@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+PageRank Benchmarks
+Times graph build, iteration and result extraction for pagerank() on synthetic graphs, as reported by the timings
+pagerank() puts on its result
+
+Every case runs in a fresh process so its peak RSS is its own. Results are appended as JSON lines (one per case,
+tagged with the git commit) so runs from different commits can be compared with --compare.
+
+    python benchmarks/run_benchmarks.py --sizes 1e3 1e4 1e5 1e6 --generators rmat ba random
+    python benchmarks/run_benchmarks.py --modes power workers4 quadratic --output results.jsonl
+    python benchmarks/run_benchmarks.py --compare before.jsonl after.jsonl
+"""
+
+import argparse
+import json
+import logging
+import multiprocessing as mp
+import os
+import platform
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+import numpy as np
+
+import solvers # pagerank() pulls this in lazily, load it up front so the import never lands in a timed phase
+from generators import generate
+from pagerank import pagerank
+
+try:
+    import resource
+except ImportError: # Not on Windows
+    resource = None
+
+# Engine modes: name -> (pagerank() keyword arguments)
+MODES = {
+    'power': {},
+    'workers4': {'workers': 4},
+    'float32': {'dtype': 'float32'},
+    'compressed': {'compress': True},
+    'gauss-seidel': {'method': 'gauss-seidel'},
+    'quadratic': {'method': 'quadratic'},
+    'gmres': {'method': 'gmres'},
+    'bicgstab': {'method': 'bicgstab'},
+    'scc': {'method': 'scc'},
+}
+
+def peak_rss_mb():
+    """Peak resident memory of this process in MB (None where the OS doesn't tell us)"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2**20 if sys.platform == 'darwin' else peak / 2**10 # bytes on macOS, KB on Linux
+
+def git_commit():
+    """Short hash of the commit being benchmarked"""
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_case(generator, edges, mode, d, tol, max_iter, seed):
+    """Time one (generator, size, mode) case through pagerank() itself, the phases come from result.timings"""
+    graph = generate(generator, edges, seed=seed)
+
+    result = pagerank(graph, max_iter=max_iter, d=d, tol=tol, log_level=logging.DEBUG, **MODES[mode])
+    timings = result.timings
+    iterate_seconds = timings.get('iterate', 0.0)
+
+    return {
+        'generator': generator,
+        'mode': mode,
+        'nodes': len(result),
+        'edges': graph.number_of_edges(),
+        'build_seconds': timings.get('index', 0.0) + timings.get('matrix', 0.0),
+        'iterate_seconds': iterate_seconds,
+        'extract_seconds': timings.get('results', 0.0),
+        'seconds_per_iteration': iterate_seconds / max(result.iterations, 1),
+        'iterations': result.iterations,
+        'converged': result.converged,
+        'result_size': len(result),
+        'matrix_mb': result.memory.get('matrix_bytes', 0) / 2**20,
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+def _child(queue, args):
+    try:
+        queue.put(run_case(*args))
+    except Exception as e:
+        queue.put({'error': f"{type(e).__name__}: {e}"})
+
+def run_isolated(*args):
+    """run_case in a fresh process so the peak memory number only belongs to this case"""
+    context = mp.get_context('spawn')
+    queue = context.Queue()
+    process = context.Process(target=_child, args=(queue, args))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+def key(row):
+    return (row['generator'], row['requested_edges'], row['mode'])
+
+def compare(before_path, after_path):
+    """Print the speedup per case between two result files"""
+    def load(path):
+        with open(path) as f:
+            return {key(row): row for row in map(json.loads, f) if 'error' not in row}
+
+    before, after = load(before_path), load(after_path)
+
+    print(f"{'Generator':<10} {'Edges':>12} {'Mode':<14} {'Build':>8} {'Iterate':>8} {'Extract':>8} {'RSS':>8}")
+    print("-" * 74)
+    for case in sorted(set(before) & set(after)):
+        old, new = before[case], after[case]
+        ratios = [old[f] / new[f] if new[f] else float('inf')
+                  for f in ('build_seconds', 'iterate_seconds', 'extract_seconds')]
+        rss = (old['peak_rss_mb'] / new['peak_rss_mb']) if old.get('peak_rss_mb') and new.get('peak_rss_mb') else float('nan')
+        print(f"{case[0]:<10} {case[1]:>12} {case[2]:<14} " + " ".join(f"{r:>7.2f}x" for r in ratios) + f" {rss:>7.2f}x")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark pagerank() on synthetic graphs")
+    parser.add_argument('--sizes', nargs='+', type=float, default=[1e3, 1e4, 1e5, 1e6], help="Edge counts (1e3 .. 1e8)")
+    parser.add_argument('--generators', nargs='+', default=['rmat', 'ba', 'random'], choices=['rmat', 'kronecker', 'ba', 'random', 'web'])
+    parser.add_argument('--modes', nargs='+', default=['power'], choices=list(MODES))
+    parser.add_argument('--damping', type=float, default=0.85)
+    parser.add_argument('--tol', type=float, default=1e-6)
+    parser.add_argument('--max-iter', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', default='bench_results.jsonl', help="JSON lines file the results get appended to")
+    parser.add_argument('--compare', nargs=2, metavar=('BEFORE', 'AFTER'), help="Compare two result files instead")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    run = {'commit': git_commit(), 'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'), 'python': platform.python_version(),
+           'numpy': np.__version__, 'cpus': os.cpu_count()}
+
+    with open(args.output, 'a') as out:
+        for generator in args.generators:
+            for size in args.sizes:
+                for mode in args.modes:
+                    row = run_isolated(generator, int(size), mode, args.damping, args.tol, args.max_iter, args.seed)
+                    row.update(run, generator=generator, mode=mode, requested_edges=int(size))
+                    out.write(json.dumps(row) + "\n")
+                    out.flush()
+
+                    if 'error' in row:
+                        print(f"{generator:<8} {int(size):>12} {mode:<14} FAILED {row['error']}")
+                    else:
+                        print(f"{generator:<8} {row['edges']:>12} {mode:<14} build {row['build_seconds']:.3f}s  "
+                              f"iterate {row['iterate_seconds']:.3f}s ({row['iterations']} it)  "
+                              f"extract {row['extract_seconds']:.3f}s  matrix {row['matrix_mb']:.0f} MB  "
+                              f"peak {row['peak_rss_mb'] or 0:.0f} MB")
+
+if __name__ == "__main__":
+    main()
@@ -4,17 +4,23 @@ PageRank Engine - Main Menu Interface
 A comprehensive PageRank analysis tool with visualization capabilities
 """
 
+import logging
 import sys
 import os
+import numpy as np
 
 # Add src directory to path for imports
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
 
-from pagerank import pagerank
+from cache import cached_pagerank
+from export import export_scores, guess_format
+from pagerank import damping_sweep
 import graph_loader as gl
 import utils
 from pagerank_visualizer import main as run_visualizer
 
+VISUALIZER_NODES = 20000 # Bigger graphs only get their top pages (and the links between them) drawn
+
 def print_banner():
     """Print the application banner"""
     print("\n" + "="*60)
@@ -43,37 +49,53 @@ def print_graph_menu():
     print("1. Default Graph (Original)")
     print("2. Create Custom Graph")
     print("3. Load Sample Graphs")
-    print("4. Back to Main Menu")
+    print("4. Load Edge List File")
+    print("5. Back to Main Menu")
     print("-" * 30)
 
 def print_advanced_menu():
     """Print the advanced options menu"""
     print("\nADVANCED OPTIONS")
     print("-" * 30)
-    print("1. Change Iteration Count")
+    print("1. Change Max Iteration Count")
     print("2. Change Damping Factor")
     print("3. Export Results to File")
-    print("4. Back to Main Menu")
+    print("4. Damping Factor Sweep")
+    print("5. Back to Main Menu")
     print("-" * 30)
 
 def calculate_and_display_pagerank(graph, iterations=100, damping=0.85):
     """Calculate and display PageRank results"""
     print(f"\nCalculating PageRank...")
-    print(f"Iterations: {iterations}, Damping Factor: {damping}")
+    print(f"Max Iterations: {iterations}, Damping Factor: {damping}")
     
     try:
-        scores = pagerank(graph, iterations, damping)
+        scores = cached_pagerank(graph, iterations, damping) # Free if nothing changed since last time
         utils.print_pagerank_results(scores)
+        utils.print_convergence_info(scores)
+        utils.print_phase_timings(scores)
         return scores
     except Exception as e:
         print(f"Error calculating PageRank: {e}")
         return None
 
+def visualizer_graph(graph, iterations=100, damping=0.85):
+    """The networkx graph to hand the visualizer, cut down to the top VISUALIZER_NODES pages when it's bigger"""
+    n = graph.number_of_nodes()
+    if n <= VISUALIZER_NODES:
+        return graph.to_networkx() if isinstance(graph, (gl.EdgeListGraph, gl.CSRGraph, gl.CompressedGraph)) else graph
+    
+    # Rank the whole graph from its own arrays (or compressed store), only the part that gets drawn becomes networkx
+    scores = cached_pagerank(graph, iterations, damping)
+    print(f"{n:,} nodes is too many to draw, showing the top {VISUALIZER_NODES:,} by PageRank and the links between them")
+    print("(the visualizer ranks that subgraph on its own, option 1 has the scores for the whole graph)")
+    return gl.subgraph_networkx(graph, scores.nodes.take(scores.top_indices(VISUALIZER_NODES)))
+
 def handle_graph_selection():
     """Handle graph selection menu"""
     while True:
         print_graph_menu()
-        choice = input("Select option (1-4): ").strip()
+        choice = input("Select option (1-5): ").strip()
         
         if choice == "1":
             graph = gl.load_default_graph()
@@ -91,22 +113,64 @@ def handle_graph_selection():
             graph = gl.load_sample_graphs()
             return graph
         elif choice == "4":
+            graph = gl.load_edge_list_interactive()
+            if graph is not None:
+                return graph
+        elif choice == "5":
             return None
         else:
             print("Invalid choice. Please try again.")
 
-def handle_advanced_options(iterations, damping):
+def export_results(graph, iterations, damping):
+    """Ask where and how to write the scores of the current graph, then stream them to the file"""
+    path = input("Output file (.csv, .tsv, .ndjson or .prc for binary, add .gz to compress): ").strip()
+    if not path:
+        print("No file given")
+        return
+    
+    top = input("Only export the top N nodes (Enter for all): ").strip()
+    try:
+        top = int(top) if top else None
+    except ValueError:
+        print("Invalid number format")
+        return
+    
+    try:
+        scores = cached_pagerank(graph, iterations, damping)
+        rows = export_scores(scores, path, top=top)
+        print(f"Wrote {rows} nodes to {path} ({guess_format(path)})")
+    except (OSError, ValueError) as e:
+        print(f"Error exporting results: {e}")
+
+def run_damping_sweep(graph, iterations):
+    """Ask for a range of damping factors and rank the graph for all of them in one go"""
+    try:
+        start = float(input("Lowest damping factor (e.g. 0.5): "))
+        end = float(input("Highest damping factor (e.g. 0.95): "))
+        count = int(input("How many values: "))
+    except ValueError:
+        print("Invalid number format")
+        return
+    
+    if not (0 < start <= end < 1) or count < 1:
+        print("Damping factors must be between 0 and 1 (lowest first), with at least one value")
+        return
+    
+    sweep = damping_sweep(graph, np.linspace(start, end, count), max_iter=iterations)
+    utils.print_damping_sweep(sweep)
+
+def handle_advanced_options(iterations, damping, graph):
     """Handle advanced options menu"""
     while True:
         print_advanced_menu()
-        choice = input("Select option (1-4): ").strip()
+        choice = input("Select option (1-5): ").strip()
         
         if choice == "1":
             try:
-                new_iterations = int(input(f"Enter iteration count (current: {iterations}): "))
+                new_iterations = int(input(f"Enter max iteration count (current: {iterations}): "))
                 if new_iterations > 0:
                     iterations = new_iterations
-                    print(f"Iterations set to {iterations}")
+                    print(f"Max iterations set to {iterations}")
                 else:
                     print("Invalid iteration count")
             except ValueError:
@@ -124,9 +188,12 @@ def handle_advanced_options(iterations, damping):
                 print("Invalid number format")
         
         elif choice == "3":
-            print("Export feature coming soon!")
+            export_results(graph, iterations, damping)
         
         elif choice == "4":
+            run_damping_sweep(graph, iterations)
+        
+        elif choice == "5":
             break
         
         else:
@@ -136,6 +203,7 @@ def handle_advanced_options(iterations, damping):
 
 def main():
     """Main application loop"""
+    logging.basicConfig(level=logging.INFO, format="%(message)s") # pagerank() reports its progress through logging
     # Initialize default settings
     current_graph = gl.load_default_graph()
     iterations = 100
@@ -156,7 +224,7 @@ def main():
             print("\nLaunching Graph Visualizer...")
             print("Close the visualizer window to return to menu")
             try:
-                run_visualizer(current_graph)
+                run_visualizer(visualizer_graph(current_graph, iterations, damping_factor))
             except Exception as e:
                 print(f"Error launching visualizer: {e}")
         
@@ -174,7 +242,7 @@ def main():
         
         elif choice == "5":
             # Advanced options
-            iterations, damping_factor = handle_advanced_options(iterations, damping_factor)
+            iterations, damping_factor = handle_advanced_options(iterations, damping_factor, current_graph)
         
         elif choice == "6":
             # Exit
@@ -190,6 +258,12 @@ def main():
             input("\nPress Enter to continue...")
 
 if __name__ == "__main__":
+    if sys.argv[1:2] == ["serve"]:
+        # Service mode for scripts and pipelines: python main.py serve --port 8765
+        import service
+        service.main(sys.argv[2:])
+        sys.exit(0)
+    
     try:
         main()
     except KeyboardInterrupt:
@@ -0,0 +1,352 @@
+import hashlib
+import json
+import logging
+import os
+import struct
+import tempfile
+from collections import OrderedDict
+import numpy as np
+import networkx as nx
+
+from pagerank import PageRankScores, graph_arrays, pagerank
+from interning import LabelTable, _mix
+
+'''
+Remembers PageRank results so asking again for the same graph with the same settings is free. Results are keyed by
+a fingerprint of the graph's content (not the python object), so a graph loaded twice from the same file, or the same
+links in a networkx graph and in an edge list, hit the same entry.
+
+The fingerprint is a sum of one 128 bit hash per node and per link, so it doesn't care about the order the links come
+in (no sorting needed) and a single edit just adds or subtracts one term, see GraphFingerprint.
+
+Entries live in an in-memory LRU capped by bytes, and optionally in a directory of score files behind it
+(set PAGERANK_CACHE_DIR to turn that on for the menu and the visualizer).
+'''
+
+logger = logging.getLogger(__name__)
+
+SCORE_MAGIC = b'PRSCORE\x00'
+SCORE_VERSION = 1
+
+_SEEDS = np.array([0x9E3779B97F4A7C15, 0xC2B2AE3D27D4EB4F], dtype=np.uint64) # One per 64 bit half of the hash
+_NODE_TAG = np.uint64(0xD6E8FEB86659FD93)
+
+def label_hashes(labels):
+    """64 bit hash of every node label, the same whether the labels sit in a list, a NumPy array or a LabelTable"""
+    return LabelTable.from_labels(labels).hashes()
+
+def _node_terms(hashes):
+    return np.stack([_mix(hashes ^ _NODE_TAG ^ seed) for seed in _SEEDS])
+
+def _edge_terms(source_hashes, destination_hashes):
+    return np.stack([_mix(_mix(source_hashes ^ seed) * np.uint64(3) + destination_hashes) for seed in _SEEDS])
+
+class GraphFingerprint:
+    """Order independent hash of a graph's nodes and links that can be kept up to date one edit at a time"""
+
+    def __init__(self):
+        self.nodes = 0
+        self.edges = 0
+        self.sums = np.zeros(2, dtype=np.uint64)
+
+    @classmethod
+    def of(cls, g):
+        """Fingerprint of any graph type pagerank() takes"""
+        if hasattr(g, 'indptr'): # Compiled CSRGraph
+            labels = g.labels
+            src = np.repeat(np.arange(len(g.indptr) - 1), np.diff(g.indptr))
+            dst = np.asarray(g.indices)
+        else:
+            labels, src, dst = graph_arrays(g)
+
+        hashes = label_hashes(labels)
+        fingerprint = cls()
+        fingerprint.nodes = len(hashes)
+        fingerprint.edges = len(src)
+        fingerprint.sums += np.add.reduce(_node_terms(hashes), axis=1, dtype=np.uint64)
+        fingerprint.sums += np.add.reduce(_edge_terms(hashes[src], hashes[dst]), axis=1, dtype=np.uint64)
+        return fingerprint
+
+    def _change(self, terms, count):
+        terms = terms[:, 0] * np.uint64(abs(count))
+        self.sums = self.sums + terms if count > 0 else self.sums - terms
+
+    def add_node(self, node, count=1):
+        self.nodes += count
+        self._change(_node_terms(label_hashes([node])), count)
+
+    def remove_node(self, node):
+        self.add_node(node, -1)
+
+    def add_edge(self, u, v, count=1):
+        """Account for count more u -> v links (negative to take them away)"""
+        self.edges += count
+        self._change(_edge_terms(label_hashes([u]), label_hashes([v])), count)
+
+    def remove_edge(self, u, v):
+        self.add_edge(u, v, -1)
+
+    def copy(self):
+        """Snapshot that later edits to this one don't touch"""
+        other = GraphFingerprint()
+        other.nodes, other.edges, other.sums = self.nodes, self.edges, self.sums.copy()
+        return other
+
+    def hexdigest(self):
+        return f"{self.nodes:x}-{self.edges:x}-{int(self.sums[0]):016x}{int(self.sums[1]):016x}"
+
+    def __eq__(self, other):
+        return isinstance(other, GraphFingerprint) and self.hexdigest() == other.hexdigest()
+
+    def __hash__(self):
+        return hash(self.hexdigest())
+
+    def __repr__(self):
+        return f"GraphFingerprint({self.hexdigest()})"
+
+class FingerprintedDiGraph(nx.DiGraph):
+    """nx.DiGraph that keeps its GraphFingerprint up to date through every add/remove, so fingerprint() is free
+
+    Only the graph methods are tracked, editing the adjacency dicts directly behind its back isn't.
+    """
+
+    def __init__(self, incoming_graph_data=None, **attr):
+        self.fingerprint = GraphFingerprint()
+        super().__init__(incoming_graph_data, **attr)
+
+    def add_node(self, node_for_adding, **attr):
+        if node_for_adding not in self._node:
+            self.fingerprint.add_node(node_for_adding)
+        super().add_node(node_for_adding, **attr)
+
+    def add_nodes_from(self, nodes_for_adding, **attr):
+        for node in nodes_for_adding:
+            try: # Same test networkx uses: a (node, attribute dict) pair isn't hashable
+                node in self._node
+                data = {}
+            except TypeError:
+                node, data = node
+            self.add_node(node, **{**attr, **data})
+
+    def remove_node(self, n):
+        links = [(n, v) for v in self._succ.get(n, ())] + [(u, n) for u in self._pred.get(n, ()) if u != n]
+        super().remove_node(n) # Raises for a missing node before anything is counted
+        for u, v in links:
+            self.fingerprint.remove_edge(u, v)
+        self.fingerprint.remove_node(n)
+
+    def remove_nodes_from(self, nodes):
+        for n in list(nodes):
+            if n in self._node:
+                self.remove_node(n)
+
+    def add_edge(self, u_of_edge, v_of_edge, **attr):
+        self.add_node(u_of_edge)
+        self.add_node(v_of_edge)
+        if not self.has_edge(u_of_edge, v_of_edge):
+            self.fingerprint.add_edge(u_of_edge, v_of_edge)
+        super().add_edge(u_of_edge, v_of_edge, **attr)
+
+    def add_edges_from(self, ebunch_to_add, **attr):
+        for edge in ebunch_to_add:
+            u, v, *data = edge
+            self.add_edge(u, v, **{**attr, **(data[0] if data else {})})
+
+    def add_weighted_edges_from(self, ebunch_to_add, weight='weight', **attr):
+        self.add_edges_from(((u, v, {weight: w}) for u, v, w in ebunch_to_add), **attr)
+
+    def remove_edge(self, u, v):
+        super().remove_edge(u, v)
+        self.fingerprint.remove_edge(u, v)
+
+    def remove_edges_from(self, ebunch):
+        for u, v, *_ in list(ebunch):
+            if self.has_edge(u, v):
+                self.remove_edge(u, v)
+
+    def clear(self):
+        super().clear()
+        self.fingerprint = GraphFingerprint()
+
+    def clear_edges(self):
+        super().clear_edges()
+        self.fingerprint = GraphFingerprint.of(self)
+
+_recent_fingerprints = OrderedDict() # id(graph) -> (graph, fingerprint) for the last few array graphs
+
+def fingerprint(g):
+    """Fingerprint of a graph, remembered for the last few array graph objects so asking again costs nothing
+
+    networkx graphs get edited in place (rewiring a link keeps the node and link counts) and keep no edit counter,
+    so they're hashed from their content every time, unless they're a FingerprintedDiGraph (what the menu builds)
+    that keeps its own up to date. IncrementalPageRank.fingerprint does the same for its edits.
+    """
+    if isinstance(g, FingerprintedDiGraph) and not nx.is_frozen(g): # Views share the class but not the edits
+        return g.fingerprint.copy()
+    if isinstance(g, nx.Graph):
+        return GraphFingerprint.of(g)
+
+    known = _recent_fingerprints.get(id(g))
+    if known is not None and known[0] is g:
+        _recent_fingerprints.move_to_end(id(g))
+        return known[1]
+
+    value = GraphFingerprint.of(g)
+    _recent_fingerprints[id(g)] = (g, value)
+    while len(_recent_fingerprints) > 8:
+        _recent_fingerprints.popitem(last=False)
+    return value
+
+def save_scores(scores, path):
+    """Write a PageRankScores to one binary file: magic, JSON header, then the label and score arrays"""
+    label_kind, arrays = scores.nodes.arrays()
+    arrays['scores'] = np.ascontiguousarray(scores.scores)
+
+    header = {
+        'version': SCORE_VERSION,
+        'nodes': len(scores),
+        'label_kind': label_kind,
+        'iterations': scores.iterations,
+        'residual': float(scores.residual),
+        'residuals': [float(r) for r in scores.residuals],
+        'converged': bool(scores.converged),
+        'arrays': {name: {'dtype': array.dtype.str, 'shape': list(array.shape)} for name, array in arrays.items()},
+    }
+    header_bytes = json.dumps(header).encode('utf-8')
+
+    with open(path, 'wb') as f:
+        f.write(SCORE_MAGIC)
+        f.write(struct.pack('<I', len(header_bytes)))
+        f.write(header_bytes)
+        for array in arrays.values():
+            f.write(array.tobytes())
+
+def load_scores(path):
+    """Read a file written by save_scores back into a PageRankScores"""
+    with open(path, 'rb') as f:
+        if f.read(len(SCORE_MAGIC)) != SCORE_MAGIC:
+            raise ValueError(f"{path} is not a score file")
+        (length,) = struct.unpack('<I', f.read(4))
+        header = json.loads(f.read(length).decode('utf-8'))
+        if header.get('version') != SCORE_VERSION:
+            raise ValueError(f"{path} uses score format version {header.get('version')}, expected {SCORE_VERSION}")
+
+        arrays = {}
+        for name, info in header['arrays'].items():
+            count = int(np.prod(info['shape']))
+            array = np.fromfile(f, dtype=info['dtype'], count=count)
+            if array.size != count:
+                raise ValueError(f"{path} is truncated (array '{name}' runs past the end of the file)")
+            arrays[name] = array.reshape(info['shape'])
+
+    return PageRankScores(LabelTable.from_arrays(header['label_kind'], arrays), arrays['scores'],
+                          iterations=header['iterations'], residual=header['residual'],
+                          residuals=header['residuals'], converged=header['converged'])
+
+def _storable(nodes):
+    """Whether the labels come back from a score file exactly as they went in (all numbers or all strings)"""
+    return nodes.kind != 'object'
+
+def result_bytes(scores):
+    """Rough memory held by a result (python labels count about 64 bytes each)"""
+    return scores.scores.nbytes + scores.nodes.nbytes
+
+class ResultCache:
+    """LRU of PageRank results capped at max_bytes, with an optional directory of score files behind it"""
+
+    def __init__(self, max_bytes=256 * 2**20, directory=None):
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.entries = OrderedDict() # key -> (scores, bytes)
+        self.bytes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(graph_fingerprint, **params):
+        """Cache key for a graph fingerprint plus the settings that change the answer"""
+        text = graph_fingerprint.hexdigest() + json.dumps(params, sort_keys=True)
+        return hashlib.blake2b(text.encode('utf-8'), digest_size=16).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.prs")
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+        if self.directory is not None and os.path.exists(self._path(key)):
+            try:
+                scores = load_scores(self._path(key))
+            except (OSError, ValueError) as e: # A half written or stale file is just a miss
+                logger.warning("Ignoring unreadable cache file %s: %s", self._path(key), e)
+            else:
+                self.disk_hits += 1
+                self._remember(key, scores)
+                return scores
+
+        self.misses += 1
+        return None
+
+    def _remember(self, key, scores):
+        size = result_bytes(scores)
+        if size > self.max_bytes:
+            return
+
+        old = self.entries.pop(key, None)
+        if old is not None:
+            self.bytes -= old[1]
+
+        self.entries[key] = (scores, size)
+        self.bytes += size
+        while self.bytes > self.max_bytes:
+            _, (_, evicted) = self.entries.popitem(last=False)
+            self.bytes -= evicted
+
+    def put(self, key, scores):
+        self._remember(key, scores)
+
+        if self.directory is not None and _storable(scores.nodes):
+            # Write next to the final name and rename, so readers never see half a file
+            handle, temporary = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            os.close(handle)
+            try:
+                save_scores(scores, temporary)
+                os.replace(temporary, self._path(key))
+            except OSError as e:
+                logger.warning("Could not write cache file %s: %s", self._path(key), e)
+                if os.path.exists(temporary):
+                    os.remove(temporary)
+
+    def clear(self):
+        """Forget everything in memory (score files on disk stay)"""
+        self.entries.clear()
+        self.bytes = 0
+
+    def stats(self):
+        return {'entries': len(self.entries), 'bytes': self.bytes, 'hits': self.hits, 'disk_hits': self.disk_hits,
+                'misses': self.misses}
+
+default_cache = ResultCache(directory=os.environ.get('PAGERANK_CACHE_DIR') or None)
+
+def cached_pagerank(g, max_iter=100, d=0.85, tol=1e-6, norm='l1', method='power', cache=None, **options):
+    """pagerank() that hands back the stored result when the same graph was already ranked with the same settings"""
+    cache = cache if cache is not None else default_cache
+    dtype = np.dtype(options.get('dtype', np.float64)).name
+    key = cache.key(fingerprint(g), max_iter=max_iter, d=d, tol=tol, norm=norm, method=method, dtype=dtype)
+
+    scores = cache.get(key)
+    if scores is not None:
+        logger.info("Using cached PageRank scores (graph and settings unchanged)")
+        return scores
+
+    scores = pagerank(g, max_iter, d, tol, norm, method=method, **options)
+    cache.put(key, scores)
+    return scores
@@ -0,0 +1,294 @@
+import logging
+import multiprocessing as mp
+import queue
+import threading
+import traceback
+import numpy as np
+from multiprocessing import shared_memory
+from scipy import sparse
+
+from pagerank import PageRankScores, graph_matrix, damp, matvec_into
+from parallel import row_blocks
+
+logger = logging.getLogger(__name__)
+
+'''
+PageRank split over several worker processes by ranges of nodes. Every worker owns the rows of the vote matrix for
+its node range and only gets told about the outside nodes that link into it (its boundary). One step is:
+
+    1. coordinator sends 'step'
+    2. boundary exchange: each worker fetches the current scores of its own nodes and its boundary nodes
+    3. each worker computes the new scores for its range and publishes them, then replies with its residual
+    4. barrier: the coordinator waits for every reply before the next step, then decides whether to stop
+
+Nothing about the graph gets pickled. The coordinator puts the partitions and the two score buffers (current and
+next, they swap every step) somewhere the workers can attach to, and only sends small handles and messages.
+
+The transport decides where that "somewhere" is and how messages travel. SharedMemoryTransport uses worker processes,
+multiprocessing.shared_memory and pipes. LocalTransport runs the same worker code on threads with plain arrays and
+queues, which is handy for testing. Another transport (say over sockets) only needs share/view/spawn/close, an
+attach() case for its handles and an exchange with fetch/publish.
+'''
+
+def _attach_shared(name):
+    """Attach to a shared memory block the coordinator owns (and will unlink)"""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError: # Python < 3.13 has no track flag, workers share the coordinator's resource tracker anyway
+        return shared_memory.SharedMemory(name=name)
+
+def attach(handle, keep):
+    """Worker side: turn a handle from Transport.share back into an array (blocks are appended to keep)"""
+    kind = handle[0]
+    if kind == 'local':
+        return handle[1]
+    if kind == 'shm':
+        _, name, shape, dtype = handle
+        block = _attach_shared(name)
+        keep.append(block)
+        return np.ndarray(shape, dtype=dtype, buffer=block.buf)
+    raise ValueError(f"Unknown array handle kind '{kind}'")
+
+class BufferExchange:
+    """Boundary exchange over two score buffers both sides can address (shared memory or plain arrays)"""
+
+    def __init__(self, buffers):
+        self.buffers = buffers
+
+    def fetch(self, iteration, indices):
+        return self.buffers[iteration % 2][indices]
+
+    def fetch_range(self, iteration, start, end):
+        return self.buffers[iteration % 2][start:end]
+
+    def publish(self, iteration, start, values):
+        self.buffers[(iteration + 1) % 2][start:start + len(values)] = values
+
+def run_worker(channel, partition, score_handles):
+    """Worker loop: answer 'step' messages for one node range until told to 'stop'
+
+    If anything goes wrong the worker replies with an 'error' message and quits, so the coordinator raises instead
+    of waiting forever for a reply that never comes.
+    """
+    keep = []
+    try:
+        _serve(channel, partition, score_handles, keep)
+    except Exception as e:
+        try:
+            channel.send({'error': f"{type(e).__name__}: {e}", 'traceback': traceback.format_exc()})
+        except (BrokenPipeError, OSError): # The coordinator is gone already
+            pass
+    finally:
+        for shared in keep:
+            shared.close()
+
+def _serve(channel, partition, score_handles, keep):
+    """run_worker's loop, the shared blocks it attaches to go in keep"""
+    start, end = partition['start'], partition['end']
+    ghosts = attach(partition['ghosts'], keep)
+    indptr = attach(partition['indptr'], keep)
+    indices = attach(partition['indices'], keep)
+    data = attach(partition['data'], keep)
+    exchange = BufferExchange([attach(handle, keep) for handle in score_handles])
+
+    own = end - start
+    block = sparse.csr_matrix((data, indices, indptr), shape=(own, own + len(ghosts)), copy=False)
+    local = np.empty(own + len(ghosts))
+    new = np.empty(own)
+    diff = np.empty(own)
+
+    try:
+        while True:
+            message = channel.recv()
+            if message['cmd'] == 'stop':
+                break
+
+            iteration = message['iteration']
+
+            # Boundary exchange: our own scores first, then the outside nodes that link to us
+            local[:own] = exchange.fetch_range(iteration, start, end)
+            local[own:] = exchange.fetch(iteration, ghosts)
+
+            matvec_into(block, local, new)
+            new += message['base']
+
+            np.subtract(new, local[:own], out=diff)
+            np.abs(diff, out=diff)
+            exchange.publish(iteration, start, new)
+
+            channel.send({'l1': float(diff.sum()), 'linf': float(diff.max()) if own else 0.0})
+    finally:
+        del block, exchange, ghosts, indptr, indices, data
+
+class PipeChannel:
+    """Coordinator end of a worker connection"""
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def send(self, message):
+        self.connection.send(message)
+
+    def recv(self):
+        return self.connection.recv()
+
+class QueueChannel:
+    """One end of a pair of queues, the in-process stand-in for a pipe or socket"""
+
+    def __init__(self, inbox, outbox):
+        self.inbox = inbox
+        self.outbox = outbox
+
+    def send(self, message):
+        self.outbox.put(message)
+
+    def recv(self):
+        return self.inbox.get()
+
+class SharedMemoryTransport:
+    """Worker processes that attach to partitions and score buffers in multiprocessing.shared_memory"""
+
+    def __init__(self, context=None):
+        self.context = context or mp.get_context()
+        self._blocks = []
+        self._workers = []
+
+    def share(self, array):
+        array = np.ascontiguousarray(array)
+        block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+        self._blocks.append(block)
+        return ('shm', block.name, array.shape, array.dtype.str)
+
+    def view(self, handle):
+        block = next(b for b in self._blocks if b.name == handle[1])
+        return np.ndarray(handle[2], dtype=handle[3], buffer=block.buf)
+
+    def spawn(self, partition, score_handles):
+        parent, child = self.context.Pipe()
+        process = self.context.Process(target=run_worker, args=(child, partition, score_handles), daemon=True)
+        process.start()
+        child.close()
+        self._workers.append(process)
+        return PipeChannel(parent)
+
+    def close(self):
+        for process in self._workers:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        for block in self._blocks:
+            block.close()
+            block.unlink()
+        self._workers = []
+        self._blocks = []
+
+class LocalTransport:
+    """Same protocol on threads with plain arrays and queues, no processes or shared memory involved"""
+
+    def __init__(self):
+        self._threads = []
+
+    def share(self, array):
+        return ('local', np.ascontiguousarray(array))
+
+    def view(self, handle):
+        return handle[1]
+
+    def spawn(self, partition, score_handles):
+        to_worker, to_coordinator = queue.Queue(), queue.Queue()
+        thread = threading.Thread(target=run_worker, args=(QueueChannel(to_worker, to_coordinator), partition, score_handles),
+                                  daemon=True)
+        thread.start()
+        self._threads.append(thread)
+        return QueueChannel(to_coordinator, to_worker)
+
+    def close(self):
+        for thread in self._threads:
+            thread.join(timeout=5)
+        self._threads = []
+
+def partition_matrix(voteMatrix, parts):
+    """Cut the vote matrix into node ranges balanced by links, each with its boundary nodes and local columns"""
+    voteMatrix = sparse.csr_matrix(voteMatrix)
+    bounds = row_blocks(voteMatrix.indptr, parts)
+
+    partitions = []
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        rows = voteMatrix[start:end]
+        columns = rows.indices
+
+        outside = (columns < start) | (columns >= end)
+        ghosts = np.unique(columns[outside])
+
+        local = np.empty_like(columns)
+        local[~outside] = columns[~outside] - start
+        local[outside] = (end - start) + np.searchsorted(ghosts, columns[outside])
+
+        partitions.append({'start': int(start), 'end': int(end), 'ghosts': ghosts,
+                           'indptr': rows.indptr, 'indices': local, 'data': rows.data})
+    return partitions
+
+def partitioned_pagerank(g, parts=2, max_iter=100, d=0.85, tol=1e-6, norm='l1', transport=None):
+    """pagerank() run by `parts` workers that each own a range of nodes"""
+    if norm not in ('l1', 'linf'):
+        raise ValueError(f"Unknown norm '{norm}', use 'l1' or 'linf'")
+
+    all_nodes, voteMatrix = graph_matrix(g)
+    n = len(all_nodes)
+    if not n:
+        return PageRankScores(converged=True)
+
+    voteMatrix = damp(voteMatrix, d)
+    transport = transport or SharedMemoryTransport()
+
+    try:
+        score_handles = [transport.share(np.full(n, 1.0 / n)), transport.share(np.zeros(n))]
+
+        channels = []
+        for partition in partition_matrix(voteMatrix, parts):
+            shared = {key: transport.share(value) if isinstance(value, np.ndarray) else value
+                      for key, value in partition.items()}
+            channels.append(transport.spawn(shared, score_handles))
+
+        logger.info("\nDoing up to %d interations on %d workers\n", max_iter, len(channels))
+
+        residuals = []
+        converged = False
+        try:
+            for iteration in range(max_iter):
+                for channel in channels:
+                    try:
+                        channel.send({'cmd': 'step', 'iteration': iteration, 'base': (1 - d) / n})
+                    except (BrokenPipeError, OSError): # A worker that already failed, its error reply is waiting
+                        pass
+
+                replies = [channel.recv() for channel in channels] # Barrier: every range is published
+                failed = [reply for reply in replies if 'error' in reply]
+                if failed:
+                    raise RuntimeError(f"A PageRank worker failed: {failed[0]['error']}\n{failed[0]['traceback']}")
+                if norm == 'l1':
+                    residuals.append(sum(reply['l1'] for reply in replies))
+                else:
+                    residuals.append(max(reply['linf'] for reply in replies))
+
+                if residuals[-1] <= tol:
+                    converged = True
+                    break
+        except EOFError:
+            raise RuntimeError("A PageRank worker died in the middle of an iteration")
+        finally:
+            for channel in channels:
+                try:
+                    channel.send({'cmd': 'stop'})
+                except (BrokenPipeError, OSError):
+                    pass
+
+        final = transport.view(score_handles[len(residuals) % 2]).copy()
+    finally:
+        transport.close()
+
+    logger.info("Complete! The interations are done!\n")
+
+    return PageRankScores(all_nodes, final, iterations=len(residuals),
+                          residual=residuals[-1] if residuals else 0.0, residuals=residuals, converged=converged)
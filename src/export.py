@@ -0,0 +1,302 @@
+import csv
+import gzip
+import io
+import json
+import struct
+import numpy as np
+
+from interning import LabelTable
+from pagerank import top_positions
+
+'''
+Writes PageRank results to disk as CSV, TSV, newline delimited JSON or a binary columnar file, optionally gzipped and
+optionally only the top k nodes.
+
+Rows are written chunk_size at a time straight from the label table and the score array. Numbers get turned into digits with
+NumPy arithmetic into a (rows x characters) byte matrix, with a zero byte as padding, and dropping the zero bytes
+leaves the finished text of the whole chunk, so no python string is built per row. Only chunks with labels that need
+quoting or escaping, hold a zero byte (or aren't plain numbers or strings) fall back to the csv/json modules. Scores
+come out digit for digit the same as printf's %.9e, the few that sit right on a rounding half are printed by python.
+
+    export_scores(scores, 'ranks.csv')
+    export_scores(scores, 'top.ndjson.gz', top=1000)
+    export_scores(scores, 'ranks.prc', dtype='float32')
+'''
+
+COLUMNS_MAGIC = b'PRSCOLS\x00'
+COLUMNS_VERSION = 1
+FORMATS = ('csv', 'tsv', 'ndjson', 'binary')
+EXTENSIONS = {'.csv': 'csv', '.tsv': 'tsv', '.ndjson': 'ndjson', '.jsonl': 'ndjson', '.prc': 'binary', '.bin': 'binary'}
+MAX_FAST_PRECISION = 10 # Past this many digits float64 rounding starts to show in the last one, printf takes over
+
+_PAD = 0 # Padding byte in the character matrices, dropped when the chunk is joined
+
+def guess_format(path):
+    """Pick the export format from the file extension (ignoring .gz)"""
+    name = str(path).lower()
+    if name.endswith('.gz'):
+        name = name[:-3]
+    for extension, format in EXTENSIONS.items():
+        if name.endswith(extension):
+            return format
+    return 'csv'
+
+def _column(text, rows):
+    """The same bytes on every row"""
+    return np.broadcast_to(np.frombuffer(text.encode('utf-8'), dtype=np.uint8), (rows, len(text)))
+
+def _integer_chars(values):
+    """Decimal digits of an integer array as a (rows x width) byte matrix, left padded"""
+    values = np.asarray(values, dtype=np.int64)
+    magnitude = np.abs(values).astype(np.uint64)
+    width = len(str(int(magnitude.max()))) if len(values) else 1
+
+    chars = np.zeros((len(values), width + 1), dtype=np.uint8)
+    chars[:, 0] = np.where(values < 0, ord('-'), _PAD) # The padding in between disappears later
+    for column in range(width, 0, -1):
+        digit = (magnitude % np.uint64(10)).astype(np.uint8)
+        chars[:, column] = np.where((magnitude > 0) | (column == width), digit + ord('0'), _PAD)
+        magnitude //= np.uint64(10)
+    return chars
+
+def _float_chars(values, precision):
+    """Scientific notation with `precision` significant digits ('3.141592654e-01') as a byte matrix"""
+    values = np.asarray(values, dtype=np.float64)
+    magnitude = np.abs(values)
+    nonzero = magnitude > 0
+
+    exponent = np.zeros(len(values), dtype=np.int64)
+    exponent[nonzero] = np.floor(np.log10(magnitude[nonzero])).astype(np.int64)
+
+    ambiguous = np.zeros(len(values), dtype=bool)
+
+    def mantissa(exponent):
+        # The scaling isn't exact, so a value within a few ulps of a half could round either way. printf rounds the
+        # exact decimal expansion, those rows get formatted by python further down
+        scaled = magnitude * 10.0 ** (precision - 1 - exponent)
+        ambiguous[:] |= np.abs(scaled - np.floor(scaled) - 0.5) <= scaled * 1e-15
+        return np.floor(scaled + 0.5).astype(np.int64)
+
+    # log10 can land one off right next to a power of ten, and rounding can carry into a new digit
+    digits = mantissa(exponent)
+    low = nonzero & (digits < 10 ** (precision - 1))
+    exponent[low] -= 1
+    high = digits >= 10 ** precision
+    exponent[high] += 1
+    if low.any() or high.any():
+        digits = mantissa(exponent)
+
+    exact = {i: b'%.*e' % (precision - 1, values[i]) for i in np.flatnonzero(ambiguous).tolist()}
+    for i, text in exact.items():
+        exponent[i] = int(text.rpartition(b'e')[2])
+
+    exponent_width = 3 if np.any(np.abs(exponent) >= 100) else 2
+    chars = np.zeros((len(values), precision + 3 + exponent_width + 1), dtype=np.uint8)
+    chars[:, 0] = np.where(values < 0, ord('-'), _PAD)
+
+    for position in range(precision, 0, -1):
+        column = position + 1 if position > 1 else 1 # Leave room for the decimal point after the first digit
+        chars[:, column] = digits % 10 + ord('0')
+        digits //= 10
+    chars[:, 2] = ord('.')
+    if precision == 1:
+        chars[:, 2] = _PAD
+
+    start = precision + 2
+    chars[:, start] = ord('e')
+    chars[:, start + 1] = np.where(exponent < 0, ord('-'), ord('+'))
+    power = np.abs(exponent)
+    for column in range(start + 1 + exponent_width, start + 1, -1):
+        chars[:, column] = power % 10 + ord('0')
+        power //= 10
+    if exponent_width == 3: # Keep two digit exponents two digits wide like printf does
+        chars[:, start + 2] = np.where(np.abs(exponent) >= 100, chars[:, start + 2], _PAD)
+
+    for i, text in exact.items():
+        chars[i] = _PAD
+        chars[i, :len(text)] = np.frombuffer(text, dtype=np.uint8)
+    return chars
+
+def _plain_floats(values):
+    """Whether the arithmetic formatting handles all of these (no inf/nan, nothing near the ends of the float range)"""
+    magnitude = np.abs(values)
+    return bool(np.all(((magnitude >= 1e-290) & (magnitude < 1e290)) | (magnitude == 0)))
+
+def _string_chars(table):
+    """UTF-8 bytes of a string label table as a byte matrix, right padded"""
+    lengths = table.lengths()
+    width = max(int(lengths.max()) if len(lengths) else 0, 1)
+    chars = np.zeros((len(table), width), dtype=np.uint8)
+    chars[np.arange(width) < lengths[:, None]] = table.data[table.offsets[0]:table.offsets[-1]]
+    return chars
+
+def _join(parts):
+    """Glue the per-column byte matrices side by side and drop the padding"""
+    chars = np.concatenate(parts, axis=1).ravel()
+    return chars[chars != _PAD].tobytes()
+
+def _needs_escaping(chars, special):
+    return bool(np.isin(chars, np.frombuffer(special, dtype=np.uint8)).any()) or bool((chars == 0x7f).any())
+
+class _TextWriter:
+    """Formats chunks of (labels, scores) as CSV/TSV or NDJSON bytes"""
+
+    def __init__(self, format, precision):
+        self.format = format
+        self.precision = precision
+        self.delimiter = '\t' if format == 'tsv' else ','
+
+    def header(self):
+        return b'' if self.format == 'ndjson' else f"node{self.delimiter}score\n".encode('utf-8')
+
+    def chunk(self, labels, scores):
+        """Text for a LabelTable chunk and its scores"""
+        rows = len(labels)
+        if not rows:
+            return b''
+
+        fast = self.precision <= MAX_FAST_PRECISION and _plain_floats(scores)
+        integers = labels.kind == 'numeric' and labels.values.dtype.kind in 'iu'
+        if fast and integers and (labels.values.dtype.kind == 'i' or labels.values.max() < 2**63):
+            label_chars, quoted = _integer_chars(labels.values), False
+        elif fast and labels.kind == 'utf8':
+            quoted = self.format == 'ndjson'
+            # NUL is the padding byte, a label holding one has to go the slow way or the byte would get dropped
+            special = b'"\\' + bytes(range(32)) if quoted else (self.delimiter + '"\r\n\x00').encode('utf-8')
+            if _needs_escaping(labels.data[labels.offsets[0]:labels.offsets[-1]], special):
+                return self._slow_chunk(labels, scores)
+            label_chars = _string_chars(labels)
+        else:
+            return self._slow_chunk(labels, scores)
+
+        score_chars = _float_chars(scores, self.precision)
+        if self.format == 'ndjson':
+            quote = [_column('"', rows)] if quoted else []
+            parts = [_column('{"node": ', rows), *quote, label_chars, *quote, _column(', "score": ', rows),
+                     score_chars, _column('}\n', rows)]
+        else:
+            parts = [label_chars, _column(self.delimiter, rows), score_chars, _column('\n', rows)]
+        return _join(parts)
+
+    def _slow_chunk(self, labels, scores):
+        """Row by row with the csv/json modules, for labels that need quoting or escaping"""
+        labels = labels.tolist()
+        scores = [f"{score:.{self.precision - 1}e}" for score in np.asarray(scores, dtype=np.float64).tolist()]
+
+        if self.format == 'ndjson':
+            plain = lambda label: label if isinstance(label, (str, int, float, bool)) or label is None else str(label)
+            return ''.join(f'{{"node": {json.dumps(plain(label), ensure_ascii=False)}, "score": {score}}}\n'
+                           for label, score in zip(labels, scores)).encode('utf-8')
+
+        text = io.StringIO()
+        csv.writer(text, delimiter=self.delimiter, lineterminator='\n').writerows(zip(labels, scores))
+        return text.getvalue().encode('utf-8')
+
+def _label_chunks(nodes, order, chunk_size):
+    """Pieces of the label table (in `order` when given), chunk_size labels at a time"""
+    count = len(nodes) if order is None else len(order)
+    for start in range(0, count, chunk_size):
+        stop = min(start + chunk_size, count)
+        yield start, stop, nodes[start:stop] if order is None else nodes.take(order[start:stop])
+
+def _open(path, compress, compresslevel):
+    if compress:
+        return gzip.open(path, 'wb', compresslevel=compresslevel)
+    return open(path, 'wb')
+
+def export_scores(scores, path, format=None, top=None, compress=None, precision=10, dtype='float64',
+                  chunk_size=1 << 18, compresslevel=1):
+    """Stream a PageRankScores to a file, returns how many rows were written
+
+    format is 'csv', 'tsv', 'ndjson' or 'binary' (guessed from the extension by default), top=k only writes the k
+    best nodes (best first, otherwise rows follow the score array), compress gzips (the default is on for .gz paths),
+    precision is significant digits in the text formats and dtype the score type in the binary one.
+    """
+    format = format or guess_format(path)
+    if format not in FORMATS:
+        raise ValueError(f"Unknown export format '{format}', pick one of: {', '.join(FORMATS)}")
+    if compress is None:
+        compress = str(path).lower().endswith('.gz')
+    if precision < 1:
+        raise ValueError("precision has to be at least 1 significant digit")
+
+    order = top_positions(scores.scores, top, chunk_size) if top is not None else None
+    values = scores.scores
+
+    with _open(path, compress, compresslevel) as f:
+        if format == 'binary':
+            return _write_columns(f, scores.nodes, values, order, np.dtype(dtype), chunk_size)
+
+        writer = _TextWriter(format, precision)
+        f.write(writer.header())
+        rows = 0
+        for start, stop, labels in _label_chunks(scores.nodes, order, chunk_size):
+            chunk_scores = values[start:stop] if order is None else values[order[start:stop]]
+            f.write(writer.chunk(labels, chunk_scores))
+            rows += stop - start
+        return rows
+
+def _write_columns(f, nodes, values, order, dtype, chunk_size):
+    """Binary columnar file: magic, JSON header, then the node column(s) and the score column back to back"""
+    count = len(values) if order is None else len(order)
+    numeric = nodes.kind == 'numeric'
+    score_dtype = dtype.newbyteorder('<')
+
+    if numeric:
+        columns = [{'name': 'node', 'dtype': nodes.values.dtype.newbyteorder('<').str, 'length': count}]
+    else:
+        columns = [{'name': 'label_offsets', 'dtype': '<i8', 'length': count + 1}, {'name': 'label_bytes', 'dtype': '|u1'}]
+    columns.append({'name': 'score', 'dtype': score_dtype.str, 'length': count})
+
+    header = json.dumps({'version': COLUMNS_VERSION, 'rows': count, 'label_kind': 'numeric' if numeric else 'utf8',
+                         'columns': columns}).encode('utf-8')
+    f.write(COLUMNS_MAGIC)
+    f.write(struct.pack('<I', len(header)))
+    f.write(header)
+
+    if numeric:
+        for _, _, labels in _label_chunks(nodes, order, chunk_size):
+            f.write(labels.values.astype(columns[0]['dtype']).tobytes())
+    else:
+        # Offsets first (the reader gets the byte column's length from the last one), then the bytes themselves
+        f.write(np.zeros(1, dtype='<i8').tobytes())
+        total = 0
+        for _, _, labels in _label_chunks(nodes, order, chunk_size):
+            _, arrays = labels.arrays()
+            offsets = arrays['label_offsets']
+            f.write((offsets[1:] - offsets[0] + total).astype('<i8').tobytes())
+            total += int(offsets[-1] - offsets[0])
+        for _, _, labels in _label_chunks(nodes, order, chunk_size):
+            _, arrays = labels.arrays()
+            f.write(arrays['label_bytes'][arrays['label_offsets'][0]:arrays['label_offsets'][-1]].tobytes())
+
+    for start in range(0, count, chunk_size):
+        chunk = values[start:start + chunk_size] if order is None else values[order[start:start + chunk_size]]
+        f.write(chunk.astype(score_dtype).tobytes())
+    return count
+
+def load_columns(path):
+    """Read a binary export back as (LabelTable, scores array)"""
+    with open(path, 'rb') as f:
+        gzipped = f.read(2) == b'\x1f\x8b'
+
+    with (gzip.open if gzipped else open)(path, 'rb') as f:
+        if f.read(len(COLUMNS_MAGIC)) != COLUMNS_MAGIC:
+            raise ValueError(f"{path} is not a binary score export")
+        (length,) = struct.unpack('<I', f.read(4))
+        header = json.loads(f.read(length).decode('utf-8'))
+        if header.get('version') != COLUMNS_VERSION:
+            raise ValueError(f"{path} uses export format version {header.get('version')}, expected {COLUMNS_VERSION}")
+
+        arrays = {}
+        for column in header['columns']:
+            count = column['length'] if 'length' in column else int(arrays['label_offsets'][-1])
+            dtype = np.dtype(column['dtype'])
+            data = f.read(count * dtype.itemsize)
+            if len(data) != count * dtype.itemsize:
+                raise ValueError(f"{path} is truncated (column '{column['name']}' runs past the end of the file)")
+            arrays[column['name']] = np.frombuffer(data, dtype=dtype)
+
+    if header['label_kind'] == 'numeric':
+        return LabelTable('numeric', values=arrays['node']), arrays['score']
+    return LabelTable.from_arrays('utf8', arrays), arrays['score']
@@ -0,0 +1,107 @@
+import numpy as np
+
+from graph_loader import EdgeListGraph
+
+'''
+Synthetic graph generators for testing and benchmarking at sizes the 4 node sample graphs can't reach. Everything is
+vectorized over all the edges at once, so 10^8 edges take seconds rather than hours. They all return an
+EdgeListGraph (integer labels 0..n-1) that pagerank() and the other engines take directly.
+'''
+
+def rmat_graph(scale, edge_factor=16, probabilities=(0.57, 0.19, 0.19, 0.05), seed=None, permute=True):
+    """R-MAT / Kronecker graph with 2**scale nodes and edge_factor * 2**scale edges (Graph500 style)"""
+    return kronecker_graph(scale, edge_factor, np.reshape(probabilities, (2, 2)), seed=seed, permute=permute)
+
+def kronecker_graph(scale, edge_factor=16, initiator=((0.57, 0.19), (0.19, 0.05)), seed=None, permute=True):
+    """Stochastic Kronecker graph: every edge picks one quadrant of the 2x2 initiator per bit of its endpoints"""
+    rng = np.random.default_rng(seed)
+    n = 1 << scale
+    m = edge_factor * n
+
+    initiator = np.asarray(initiator, dtype=np.float64)
+    initiator = initiator / initiator.sum()
+    a, b, c = initiator[0, 0], initiator[0, 1], initiator[1, 0]
+
+    src = np.zeros(m, dtype=np.int64)
+    dst = np.zeros(m, dtype=np.int64)
+
+    for bit in range(scale):
+        quadrant = rng.random(m)
+        lower = quadrant >= a + b # Bottom half of the initiator: the source gets this bit
+        right = ((quadrant >= a) & (quadrant < a + b)) | (quadrant >= a + b + c) # Right half: the destination does
+        src |= lower.astype(np.int64) << bit
+        dst |= right.astype(np.int64) << bit
+
+    if permute: # Otherwise the high degree nodes all sit at the low ids, which flatters caches unrealistically
+        relabel = rng.permutation(n)
+        src, dst = relabel[src], relabel[dst]
+
+    return EdgeListGraph(np.arange(n), src, dst)
+
+def barabasi_albert_graph(n, m=8, seed=None):
+    """Preferential attachment: every new node links to m earlier nodes picked in proportion to their degree
+
+    Uses the linearized chord diagram trick: each new link copies the endpoint of a uniformly random earlier
+    link slot, which is exactly degree-proportional. The copies are resolved for all links at once by pointer jumping.
+    """
+    rng = np.random.default_rng(seed)
+    if n < 2:
+        return EdgeListGraph(np.arange(n), np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64))
+
+    edges = (n - 1) * m
+    edge_ids = np.arange(edges, dtype=np.int64)
+    src = edge_ids // m + 1 # Node t (from 1) owns links (t-1)*m .. t*m-1
+
+    # Slot 2e holds the source of link e, slot 2e+1 its target. A target copies a random slot of an earlier node.
+    earlier_slots = 2 * (src - 1) * m
+    pointer = (rng.random(edges) * earlier_slots).astype(np.int64)
+
+    first = earlier_slots == 0 # Node 1 has nothing to copy from, it links to node 0
+    while True:
+        chained = ~first & ((pointer & 1) == 1) # Copied another target slot, follow it to what that one copied
+        if not chained.any():
+            break
+        copied = (pointer[chained] - 1) // 2
+        first[chained] = first[copied]
+        pointer[chained] = pointer[copied]
+
+    dst = np.where(first, 0, src[pointer // 2])
+    return EdgeListGraph(np.arange(n), src, dst)
+
+def random_graph(n, edges, seed=None):
+    """Uniform random directed graph with n nodes and the given number of edges (parallel links allowed)"""
+    rng = np.random.default_rng(seed)
+    src = rng.integers(0, n, edges, dtype=np.int64)
+    dst = rng.integers(0, n, edges, dtype=np.int64)
+    return EdgeListGraph(np.arange(n), src, dst)
+
+def web_graph(n, edges, core=0.4, reach=16, seed=None):
+    """Bow-tie shaped graph like the web: a random strongly connected core in the middle third of the ids, nodes before
+    it only link forward into later nodes and the core (the IN side), nodes after it only forward (OUT and long tails)
+
+    Forward links go at most `reach` ids ahead, so outside the core the graph is a deep DAG of chains.
+    """
+    rng = np.random.default_rng(seed)
+    first = int(n * (1 - core) / 2)
+    last = first + int(n * core)
+
+    src = rng.integers(0, n, edges, dtype=np.int64)
+    dst = np.minimum(src + rng.integers(1, reach + 1, edges), n - 1)
+
+    in_core = (src >= first) & (src < last) & (rng.random(edges) < 0.9) # Most core links stay in the core
+    dst[in_core] = rng.integers(first, last, np.count_nonzero(in_core))
+    return EdgeListGraph(np.arange(n), src, dst)
+
+def generate(kind, edges, seed=None):
+    """Graph of roughly `edges` links from one of the generators ('rmat', 'kronecker', 'ba', 'random', 'web')"""
+    edges = int(edges)
+    if kind in ('rmat', 'kronecker'):
+        scale = max(int(round(np.log2(max(edges, 16) / 16))), 1)
+        return rmat_graph(scale, seed=seed)
+    if kind == 'ba':
+        return barabasi_albert_graph(max(edges // 8, 2) + 1, 8, seed=seed)
+    if kind == 'random':
+        return random_graph(max(edges // 10, 1), edges, seed=seed)
+    if kind == 'web':
+        return web_graph(max(edges // 8, 2), edges, seed=seed)
+    raise ValueError(f"Unknown generator '{kind}', use 'rmat', 'kronecker', 'ba', 'random' or 'web'")
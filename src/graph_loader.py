@@ -1,9 +1,59 @@
 import numpy as np
 import networkx as nx
+import gzip
+import json
+import os
+import struct
+import warnings
+import zlib
+from collections import namedtuple
+from itertools import islice
+
+from cache import FingerprintedDiGraph
+from compressed import CompressedGraph
+from interning import LabelTable
+from pagerank import graph_arrays
+
+BINARY_MAGIC = b'PRGRAPH\x00'
+BINARY_VERSION = 1
+BINARY_ALIGN = 64 # Every array starts on a 64 byte boundary so the memory maps line up nicely
+
+class EdgeListGraph(namedtuple('EdgeListGraph', ['labels', 'src', 'dst'])):
+    """A graph kept as plain arrays: a node label table plus integer source/destination index arrays (no networkx)"""
+    __slots__ = ()
+
+    def number_of_nodes(self):
+        return len(self.labels)
+
+    def number_of_edges(self):
+        return len(self.src)
+
+    def to_networkx(self):
+        """Build the equivalent nx.DiGraph (only sensible for small graphs)"""
+        g = nx.DiGraph()
+        labels = self.labels.tolist()
+        g.add_nodes_from(labels)
+        g.add_edges_from(zip(self.labels[self.src].tolist(), self.labels[self.dst].tolist()))
+        return g
+
+class CSRGraph(namedtuple('CSRGraph', ['labels', 'indptr', 'indices', 'out_degree'])):
+    """A compiled graph: the successors of node i are indices[indptr[i]:indptr[i+1]]"""
+    __slots__ = ()
+
+    def number_of_nodes(self):
+        return len(self.labels)
+
+    def number_of_edges(self):
+        return len(self.indices)
+
+    def to_networkx(self):
+        """Build the equivalent nx.DiGraph (only sensible for small graphs)"""
+        src = np.repeat(np.arange(len(self.labels)), np.diff(self.indptr))
+        return EdgeListGraph(self.labels, src, np.asarray(self.indices)).to_networkx()
 
 def load_default_graph():
     """Load the default graph from pagerank.py"""
-    g = nx.DiGraph()
+    g = FingerprintedDiGraph() # Keeps its own fingerprint up to date for the result cache
     g.add_edge('A', 'B')
     g.add_edge('A', 'C')
     g.add_edge('B', 'C')
@@ -14,7 +64,7 @@ def load_default_graph():
 
 def load_custom_graph():
     """Load a custom graph by user input"""
-    g = nx.DiGraph()
+    g = FingerprintedDiGraph()
     
     print("\n" + "="*40)
     print("CREATE CUSTOM GRAPH")
@@ -44,6 +94,282 @@ def load_custom_graph():
     print(f"\nGraph created with {len(g.nodes())} nodes and {len(g.edges())} edges")
     return g
 
+def _open_text(path):
+    """Open a text file for reading, transparently un-gzipping it"""
+    with open(path, 'rb') as f:
+        gzipped = f.read(2) == b'\x1f\x8b'
+
+    if gzipped:
+        return gzip.open(path, 'rt')
+    return open(path, 'r')
+
+def _guess_delimiter(path):
+    """Pick the delimiter from the file extension (None means any whitespace)"""
+    name = str(path).lower()
+    if name.endswith('.gz'):
+        name = name[:-3]
+
+    if name.endswith('.csv'):
+        return ','
+    if name.endswith('.tsv'):
+        return '\t'
+    return None
+
+def _parse_edge_chunk(lines, delimiter, comments, dtype):
+    """Parse a chunk of edge lines into an (m, 2) array, extra columns like weights are ignored"""
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', UserWarning) # loadtxt complains about chunks that are only comments
+        edges = np.loadtxt(lines, dtype=dtype, delimiter=delimiter, comments=comments, usecols=(0, 1), ndmin=2)
+
+    if dtype is str:
+        edges = np.char.strip(edges)
+    return edges
+
+def iter_edge_chunks(path, dtype=np.int64, delimiter='auto', comments='#', chunk_size=1_000_000):
+    """Yield the edges of a file as (m, 2) arrays of `dtype`, chunk_size lines at a time"""
+    if delimiter == 'auto':
+        delimiter = _guess_delimiter(path)
+
+    with _open_text(path) as f:
+        while True:
+            lines = list(islice(f, chunk_size))
+            if not lines:
+                break
+
+            edges = _parse_edge_chunk(lines, delimiter, comments, dtype)
+            if len(edges):
+                yield edges
+
+def load_edge_list(path, delimiter='auto', comments='#', chunk_size=1_000_000):
+    """Load a (optionally gzipped) whitespace/CSV/TSV edge list file straight into arrays, chunk by chunk"""
+    options = dict(delimiter=delimiter, comments=comments, chunk_size=chunk_size)
+
+    try:
+        chunks = list(iter_edge_chunks(path, np.int64, **options)) # Numeric ids are way cheaper
+    except ValueError:
+        chunks = list(iter_edge_chunks(path, str, **options)) # Only fall back to string labels if we have to
+        dtype = str
+    else:
+        dtype = np.int64
+
+    if not chunks:
+        return EdgeListGraph(LabelTable.from_labels(np.empty(0, dtype=dtype)), np.empty(0, dtype=np.int64),
+                             np.empty(0, dtype=np.int64))
+
+    edges = np.concatenate(chunks)
+    m = len(edges)
+
+    # Number the nodes 0..n-1 in sorted label order, the label table maps them back
+    labels, index = np.unique(edges.T.ravel(), return_inverse=True)
+    index = index.astype(np.int64, copy=False)
+
+    return EdgeListGraph(LabelTable.from_labels(labels), index[:m], index[m:])
+
+def compile_graph(graph, compress=False):
+    """Compile any graph (networkx, EdgeListGraph, CSRGraph or CompressedGraph) into CSR arrays
+
+    compress=True gives a CompressedGraph instead (gap + varint encoded in-links, 2-4.5 bytes a link).
+    """
+    if compress:
+        return graph if isinstance(graph, CompressedGraph) else CompressedGraph.from_edges(*graph_arrays(graph))
+    if isinstance(graph, CSRGraph):
+        return graph
+
+    labels, src, dst = graph_arrays(graph)
+    n = len(labels)
+    m = len(src)
+
+    # int32 indexes are half the size, both arrays share a dtype so scipy can use them without copying
+    index_dtype = np.int32 if max(n, m) < 2**31 else np.int64
+
+    out_degree = np.bincount(src, minlength=n).astype(index_dtype)
+    indptr = np.zeros(n + 1, dtype=index_dtype)
+    np.cumsum(out_degree, out=indptr[1:])
+
+    order = np.argsort(src, kind='stable')
+    indices = dst[order].astype(index_dtype)
+
+    return CSRGraph(labels, indptr, indices, out_degree)
+
+def _link_chunks(graph, keep, chunk_size=1_000_000):
+    """(src, dst) index arrays covering at least every link out of the `keep` positions, a piece at a time"""
+    if isinstance(graph, CompressedGraph): # In-links, one block at a time, never the whole graph decoded
+        for row, degrees, ids in graph.iter_blocks():
+            yield ids, np.repeat(np.arange(row, row + len(degrees)), degrees)
+    elif isinstance(graph, CSRGraph): # Just the rows of the kept nodes
+        starts = np.asarray(graph.indptr[keep], dtype=np.int64)
+        lengths = np.asarray(graph.indptr[keep + 1], dtype=np.int64) - starts
+        offsets = np.cumsum(lengths) - lengths
+        positions = np.repeat(starts - offsets, lengths) + np.arange(lengths.sum())
+        yield np.repeat(keep, lengths), np.asarray(graph.indices[positions], dtype=np.int64)
+    else:
+        for start in range(0, len(graph.src), chunk_size):
+            yield graph.src[start:start + chunk_size], graph.dst[start:start + chunk_size]
+
+def subgraph_networkx(graph, nodes):
+    """nx.DiGraph of just these nodes and the links between them, for graphs too big to convert whole"""
+    if isinstance(graph, nx.Graph):
+        return nx.DiGraph(graph.subgraph(nodes))
+
+    labels = LabelTable.from_labels(graph.labels)
+    keep = labels.ids(nodes)
+    keep = np.unique(keep[keep >= 0])
+    inside = np.zeros(len(labels), dtype=bool)
+    inside[keep] = True
+
+    g = nx.DiGraph()
+    g.add_nodes_from(labels.take(keep).tolist())
+    for src, dst in _link_chunks(graph, keep):
+        both = inside[src] & inside[dst]
+        g.add_edges_from(zip(labels.take(src[both]).tolist(), labels.take(dst[both]).tolist()))
+    return g
+
+def _checksum(arrays):
+    """CRC32 over all the array bytes, done in chunks so memory maps don't get copied whole"""
+    crc = 0
+    for name in sorted(arrays):
+        data = np.ascontiguousarray(arrays[name]).reshape(-1).view(np.uint8)
+        for start in range(0, len(data), 1 << 24):
+            crc = zlib.crc32(data[start:start + (1 << 24)], crc)
+    return crc
+
+def save_binary_graph(graph, path, source=None):
+    """Write the compiled CSR (or compressed) arrays to one binary file that load_binary_graph can memory map"""
+    layout = 'compressed' if isinstance(graph, CompressedGraph) else 'csr'
+    graph = compile_graph(graph, compress=layout == 'compressed')
+
+    label_kind, arrays = LabelTable.from_labels(graph.labels).arrays()
+    if layout == 'compressed':
+        arrays.update((name, np.ascontiguousarray(getattr(graph, name))) for name in CompressedGraph._fields[1:])
+    else:
+        arrays.update(indptr=np.ascontiguousarray(graph.indptr),
+                      indices=np.ascontiguousarray(graph.indices),
+                      out_degree=np.ascontiguousarray(graph.out_degree))
+
+    header = {
+        'version': BINARY_VERSION,
+        'layout': layout,
+        'nodes': graph.number_of_nodes(),
+        'edges': graph.number_of_edges(),
+        'label_kind': label_kind,
+        'checksum': _checksum(arrays),
+        'checksums': {name: _checksum({name: array}) for name, array in arrays.items()}, # Says which array broke
+        'source': _source_stamp(source) if source is not None else None,
+        'arrays': {},
+    }
+
+    # Lay the arrays out back to back after the header, we need the header size first to know the offsets
+    header_space = BINARY_ALIGN * 64
+    while True:
+        offset = header_space
+        for name, array in arrays.items():
+            header['arrays'][name] = {'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': offset}
+            offset += -(-array.nbytes // BINARY_ALIGN) * BINARY_ALIGN
+
+        header_bytes = json.dumps(header).encode('utf-8')
+        if len(BINARY_MAGIC) + 4 + len(header_bytes) <= header_space:
+            break
+        header_space *= 2
+
+    with open(path, 'wb') as f:
+        f.write(BINARY_MAGIC)
+        f.write(struct.pack('<I', len(header_bytes)))
+        f.write(header_bytes)
+        for name, array in arrays.items():
+            f.seek(header['arrays'][name]['offset'])
+            f.write(array.tobytes())
+        f.truncate(offset)
+
+def read_binary_header(path):
+    """Read and sanity check the header of a binary graph file"""
+    with open(path, 'rb') as f:
+        if f.read(len(BINARY_MAGIC)) != BINARY_MAGIC:
+            raise ValueError(f"{path} is not a binary graph file")
+        (length,) = struct.unpack('<I', f.read(4))
+        header = json.loads(f.read(length).decode('utf-8'))
+
+    if header.get('version') != BINARY_VERSION:
+        raise ValueError(f"{path} uses binary graph format version {header.get('version')}, expected {BINARY_VERSION}")
+
+    size = os.path.getsize(path)
+    end = 0
+    for name, info in header['arrays'].items():
+        nbytes = np.dtype(info['dtype']).itemsize * int(np.prod(info['shape']))
+        if info['offset'] + nbytes > size:
+            raise ValueError(f"{path} is truncated (array '{name}' runs past the end of the file)")
+        end = max(end, info['offset'] + -(-nbytes // BINARY_ALIGN) * BINARY_ALIGN)
+    if header['arrays'] and size != end: # The writer stops right after the last array, anything else got mangled
+        raise ValueError(f"{path} is {size} bytes, its header says {end}")
+
+    return header
+
+def load_binary_graph(path, verify=True, source=None):
+    """Memory map a file written by save_binary_graph, checking the CRC32 of every array first
+
+    The header and the file size are always checked. verify=False skips the checksums (which read the whole file
+    once) for files you trust, then nothing gets read until the pages are actually used.
+    """
+    header = read_binary_header(path)
+
+    if source is not None and header.get('source') != _source_stamp(source):
+        raise ValueError(f"{path} is stale, {source} changed since it was written")
+
+    arrays = {}
+    for name, info in header['arrays'].items():
+        shape = tuple(info['shape'])
+        if int(np.prod(shape)) == 0:
+            arrays[name] = np.empty(shape, dtype=info['dtype'])
+        else:
+            arrays[name] = np.memmap(path, dtype=info['dtype'], mode='r', offset=info['offset'], shape=shape)
+
+    if verify:
+        for name, expected in header.get('checksums', {}).items():
+            if _checksum({name: arrays[name]}) != expected:
+                raise ValueError(f"{path} failed its checksum (array '{name}'), the file is corrupted")
+        if 'checksums' not in header and _checksum(arrays) != header['checksum']: # Files from before per array sums
+            raise ValueError(f"{path} failed its checksum, the file is corrupted")
+
+    labels = LabelTable.from_arrays(header['label_kind'], arrays) # Stays memory mapped, strings only get decoded when asked for
+    if header.get('layout', 'csr') == 'compressed':
+        return CompressedGraph(labels, *(arrays[name] for name in CompressedGraph._fields[1:]))
+    return CSRGraph(labels, arrays['indptr'], arrays['indices'], arrays['out_degree'])
+
+def _source_stamp(source):
+    """Size and modification time of the text file a binary graph was compiled from"""
+    stat = os.stat(source)
+    return [stat.st_size, stat.st_mtime_ns]
+
+def load_edge_list_cached(path, binary_path=None, compress=False, **kwargs):
+    """Load an edge list file, reusing its compiled binary copy when the text file hasn't changed since"""
+    binary_path = binary_path or f"{path}.prg"
+
+    try:
+        graph = load_binary_graph(binary_path, source=path)
+        if isinstance(graph, CompressedGraph) == compress: # Otherwise it was written in the other layout
+            return graph
+    except (OSError, ValueError):
+        pass
+
+    graph = compile_graph(load_edge_list(path, **kwargs), compress=compress)
+    save_binary_graph(graph, binary_path, source=path)
+    return graph
+
+def load_edge_list_interactive():
+    """Ask for an edge list (or compiled .prg binary) file and load it"""
+    path = input("Enter edge list file path: ").strip()
+
+    try:
+        if path.endswith('.prg'):
+            graph = load_binary_graph(path)
+        else:
+            graph = load_edge_list(path)
+    except (OSError, ValueError) as e:
+        print(f"Error loading file: {e}")
+        return None
+
+    print(f"Loaded {graph.number_of_nodes()} nodes and {graph.number_of_edges()} edges from {path}")
+    return graph
+
 def load_sample_graphs():
     """Load predefined sample graphs"""
     graphs = {
@@ -84,7 +410,7 @@ def load_sample_graphs():
 
 def create_chain_graph():
     """Create a simple chain graph A->B->C->D"""
-    g = nx.DiGraph()
+    g = FingerprintedDiGraph()
     g.add_edge('A', 'B')
     g.add_edge('B', 'C')
     g.add_edge('C', 'D')
@@ -92,7 +418,7 @@ def create_chain_graph():
 
 def create_star_graph():
     """Create a star graph with center node connecting to all others"""
-    g = nx.DiGraph()
+    g = FingerprintedDiGraph()
     center = 'CENTER'
     nodes = ['A', 'B', 'C', 'D']
     
@@ -104,7 +430,7 @@ def create_star_graph():
 
 def create_complete_graph():
     """Create a complete directed graph where every node connects to every other"""
-    g = nx.DiGraph()
+    g = FingerprintedDiGraph()
     nodes = ['A', 'B', 'C', 'D']
     
     for source in nodes:
@@ -116,6 +442,12 @@ def create_complete_graph():
 
 def display_graph_info(graph):
     """Display information about the graph"""
+    if isinstance(graph, (EdgeListGraph, CSRGraph, CompressedGraph)):
+        print(f"\nGraph Information:")
+        print(f"Number of nodes: {graph.number_of_nodes()}")
+        print(f"Number of edges: {graph.number_of_edges()}")
+        return
+    
     print(f"\nGraph Information:")
     print(f"Nodes: {list(graph.nodes())}")
     print(f"Edges: {list(graph.edges())}")
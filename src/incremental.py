@@ -0,0 +1,277 @@
+import numpy as np
+from scipy import sparse
+from scipy.sparse.linalg import LinearOperator
+
+from pagerank import PageRankScores, power_iteration, residual_norm
+from graph_loader import compile_graph
+from cache import GraphFingerprint
+from interning import LabelTable
+
+'''
+Keeps a graph and its last PageRank scores around so small edits (a few thousand links an hour) don't mean starting
+from scratch. The links live in a compiled CSR matrix plus a small dict of pending edits on top of it, the edits get
+merged into the matrix once there are enough of them. Every update warm starts from the previous scores.
+'''
+
+class IncrementalPageRank:
+    """Stateful ranker that patches the graph with edge/node edits and re-converges from the last scores"""
+
+    def __init__(self, graph, d=0.85, tol=1e-6, max_iter=100, norm='l1', compact_ratio=0.05):
+        self.d = d
+        self.tol = tol
+        self.max_iter = max_iter
+        self.norm = norm
+        self.compact_ratio = compact_ratio # Merge the pending edits into the matrix once they pass this share of the links
+
+        compiled = compile_graph(graph)
+        n = compiled.number_of_nodes()
+
+        self.labels = list(LabelTable.from_labels(compiled.labels).tolist())
+        self.node_map = {node: i for i, node in enumerate(self.labels)}
+        self.active = np.ones(n, dtype=bool) # Removed nodes keep their slot so no index ever shifts
+
+        self._base = sparse.csr_matrix((np.ones(compiled.number_of_edges()), np.asarray(compiled.indices), np.asarray(compiled.indptr)), shape=(n, n))
+        self._base_in = None # Column (predecessor) view of the base matrix, only built if someone removes a node
+        self._delta = {} # source -> {destination: +/- link count} edits not merged into the base yet
+        self._delta_size = 0
+        self._out_degree = np.asarray(compiled.out_degree, dtype=np.float64).copy()
+
+        self._touched = {} # source -> (successors, out degree) before the first edit since the last update
+        self._nodes_changed = False
+
+        self.fingerprint = GraphFingerprint.of(compiled) # Kept up to date with every edit, for cache keys
+
+        self.scores = None
+        self._x = None
+
+    @property
+    def n(self):
+        return len(self.labels)
+
+    def _index(self, node):
+        i = self.node_map.get(node)
+        if i is None or not self.active[i]:
+            raise KeyError(f"Node {node!r} is not in the graph")
+        return i
+
+    def _base_row(self, j):
+        """Successors of j in the base matrix (repeated for parallel links)"""
+        if j >= self._base.shape[0]:
+            return np.empty(0, dtype=np.int64)
+        start, end = self._base.indptr[j], self._base.indptr[j + 1]
+        return np.repeat(self._base.indices[start:end], self._base.data[start:end].astype(np.int64))
+
+    def successors(self, node):
+        """Current successors of a node, base matrix plus pending edits"""
+        return [self.labels[i] for i in self._successor_indices(self._index(node))]
+
+    def _successor_indices(self, j):
+        row = self._base_row(j)
+        edits = self._delta.get(j)
+        if not edits:
+            return row
+
+        counts = dict(zip(*np.unique(row, return_counts=True)))
+        for i, change in edits.items():
+            counts[i] = counts.get(i, 0) + change
+        return np.repeat(np.fromiter(counts.keys(), dtype=np.int64), np.fromiter(counts.values(), dtype=np.int64))
+
+    def _edit(self, j, i, change):
+        if j not in self._touched:
+            self._touched[j] = (self._successor_indices(j), self._out_degree[j])
+
+        edits = self._delta.setdefault(j, {})
+        edits[i] = edits.get(i, 0) + change
+        if not edits[i]:
+            del edits[i]
+        self._delta_size += 1
+        self._out_degree[j] += change
+        self.fingerprint.add_edge(self.labels[j], self.labels[i], change)
+
+    def _link_count(self, j, i):
+        return int(np.count_nonzero(self._base_row(j) == i)) + self._delta.get(j, {}).get(i, 0)
+
+    def add_node(self, node):
+        """Add a node without any links (does nothing if it's already there)"""
+        i = self.node_map.get(node)
+        if i is not None:
+            if not self.active[i]:
+                self.active[i] = True
+                self._nodes_changed = True
+                self.fingerprint.add_node(node)
+            return i
+
+        i = len(self.labels)
+        self.labels.append(node)
+        self.node_map[node] = i
+        self.active = np.append(self.active, True)
+        self._out_degree = np.append(self._out_degree, 0.0)
+        self._nodes_changed = True
+        self.fingerprint.add_node(node)
+        return i
+
+    def remove_node(self, node):
+        """Remove a node together with all its links"""
+        i = self._index(node)
+
+        for k in self._successor_indices(i):
+            self._edit(i, int(k), -1)
+
+        for j in self._predecessor_indices(i):
+            self._edit(int(j), i, -self._link_count(int(j), i))
+
+        self.active[i] = False
+        self._nodes_changed = True
+        self.fingerprint.remove_node(node)
+
+    def _predecessor_indices(self, i):
+        if self._base_in is None:
+            self._base_in = self._base.tocsc()
+
+        predecessors = set()
+        if i < self._base_in.shape[1]:
+            predecessors.update(self._base_in.indices[self._base_in.indptr[i]:self._base_in.indptr[i + 1]].tolist())
+        predecessors.update(j for j, edits in self._delta.items() if edits.get(i, 0) > 0)
+        return [j for j in predecessors if self._link_count(j, i) > 0]
+
+    def add_edge(self, u, v):
+        """Add the link u -> v, adding either node if needed"""
+        j = self.add_node(u)
+        i = self.add_node(v)
+        self._edit(j, i, 1)
+
+    def remove_edge(self, u, v):
+        """Remove one u -> v link"""
+        j = self._index(u)
+        i = self._index(v)
+        if self._link_count(j, i) <= 0:
+            raise KeyError(f"No edge {u!r} -> {v!r}")
+        self._edit(j, i, -1)
+
+    def add_edges(self, edges):
+        for u, v in edges:
+            self.add_edge(u, v)
+
+    def remove_edges(self, edges):
+        for u, v in edges:
+            self.remove_edge(u, v)
+
+    def _delta_matrix(self):
+        """The pending edits as a sparse (source x destination) matrix"""
+        rows, cols, counts = [], [], []
+        for j, edits in self._delta.items():
+            rows.extend([j] * len(edits))
+            cols.extend(edits.keys())
+            counts.extend(edits.values())
+        return sparse.csr_matrix((np.asarray(counts, dtype=np.float64), (rows, cols)), shape=(self.n, self.n))
+
+    def _grow_base(self):
+        if self._base.shape[0] < self.n:
+            self._base.resize((self.n, self.n))
+            self._base_in = None
+
+    def compact(self):
+        """Merge the pending edits into the base matrix"""
+        self._grow_base()
+        if self._delta:
+            self._base = (self._base + self._delta_matrix()).tocsr()
+            self._base.eliminate_zeros()
+            self._base_in = None
+        self._delta = {}
+        self._delta_size = 0
+
+    def _operator(self, delta):
+        """Damped vote matrix as an operator on top of the base matrix plus the edits, nothing gets rebuilt"""
+        inv_degree = np.zeros(self.n)
+        np.divide(self.d, self._out_degree, out=inv_degree, where=self._out_degree > 0)
+
+        base_in = self._base.T # CSC view of the same arrays, no copy
+        delta_in = delta.T if delta is not None else None
+        weighted = np.empty(self.n)
+
+        def matvec(x):
+            np.multiply(np.ravel(x), inv_degree, out=weighted)
+            y = base_in @ weighted
+            if delta_in is not None:
+                y += delta_in @ weighted
+            return y
+
+        return LinearOperator((self.n, self.n), matvec=matvec, dtype=np.float64)
+
+    def _teleport(self):
+        base = np.zeros(self.n)
+        base[self.active] = (1 - self.d) / np.count_nonzero(self.active)
+        return base
+
+    def update(self, frontier=False):
+        """Re-converge after the edits, optionally only pushing the change out from the edited links"""
+        self._grow_base()
+        if self._delta_size > self.compact_ratio * max(self._base.nnz, 1):
+            self.compact()
+
+        delta = self._delta_matrix() if self._delta else None
+
+        if frontier and self._x is not None and not self._nodes_changed:
+            x, residuals, converged = self._frontier_update(delta)
+        else:
+            x0 = self._teleport() * (1 / (1 - self.d)) if self._x is None else self._warm_start()
+            x, residuals, converged = power_iteration(self._operator(delta), self._teleport(), x0,
+                                                      self.max_iter, self.tol, self.norm)
+
+        self._x = x
+        self._touched = {}
+        self._nodes_changed = False
+
+        active = np.flatnonzero(self.active)
+        self.scores = PageRankScores([self.labels[i] for i in active], x[active],
+                                     iterations=len(residuals), residual=residuals[-1] if residuals else 0.0,
+                                     residuals=residuals, converged=converged)
+        return self.scores
+
+    def _warm_start(self):
+        x = np.zeros(self.n)
+        x[:len(self._x)] = self._x
+        fresh = np.zeros(self.n, dtype=bool)
+        fresh[len(self._x):] = True
+        x[fresh & self.active] = (1 - self.d) / np.count_nonzero(self.active)
+        x[~self.active] = 0.0
+        return x
+
+    def _frontier_update(self, delta):
+        """Push only the change caused by the edited links through the graph, touching as few nodes as possible"""
+        x = self._x.copy()
+        d = self.d
+        r = np.zeros(self.n)
+
+        # What the edited sources used to hand out versus what they hand out now
+        for j, (old_successors, old_degree) in self._touched.items():
+            if old_degree > 0:
+                np.add.at(r, old_successors, -d * x[j] / old_degree)
+            if self._out_degree[j] > 0:
+                np.add.at(r, self._successor_indices(j), d * x[j] / self._out_degree[j])
+
+        inv_degree = np.zeros(self.n)
+        np.divide(d, self._out_degree, out=inv_degree, where=self._out_degree > 0)
+        threshold = self.tol / self.n
+
+        residuals = []
+        converged = False
+
+        for i in range(self.max_iter):
+            front = np.flatnonzero(np.abs(r) > threshold)
+            residuals.append(residual_norm(r.copy(), self.norm))
+
+            if residuals[-1] <= self.tol or not front.size:
+                converged = True
+                break
+
+            push = r[front]
+            r[front] = 0.0
+            x[front] += push
+
+            weighted = push * inv_degree[front]
+            r += self._base[front].T @ weighted
+            if delta is not None:
+                r += delta[front].T @ weighted
+
+        return x, residuals, converged
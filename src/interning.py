@@ -0,0 +1,357 @@
+import hashlib
+import numpy as np
+
+'''
+The node label table. Every graph numbers its nodes 0..n-1 once (when it's loaded), and the labels live in a
+LabelTable instead of a python list plus a {label: number} dict:
+
+- numbers stay a plain NumPy array
+- strings are one UTF-8 byte array plus an offsets array (label i is data[offsets[i]:offsets[i + 1]])
+- anything else (tuples, mixed types from a networkx graph) is an object array with a dict, the old way
+
+Looking a label up goes through an open addressing hash index (an int array of slots) that's built the first time
+somebody asks and then kept on the table, so every result computed from the same graph shares it. The loader, the
+engine, the score mapping, the exporter and the cache all pass the same table around.
+'''
+
+M64 = (1 << 64) - 1
+FNV_OFFSET = 0xCBF29CE484222325
+FNV_PRIME = 0x100000001B3
+EMPTY = -1 # Free slot in the hash index
+
+def _mix(x):
+    """splitmix64 finalizer on a uint64 array (wraps around on purpose)"""
+    x = x ^ (x >> np.uint64(30))
+    x = x * np.uint64(0xBF58476D1CE4E5B9)
+    x = x ^ (x >> np.uint64(27))
+    x = x * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+def _mix_int(x):
+    """_mix for one python int, gives the same number"""
+    x = (x ^ (x >> 30)) * 0xBF58476D1CE4E5B9 & M64
+    x = (x ^ (x >> 27)) * 0x94D049BB133111EB & M64
+    return x ^ (x >> 31)
+
+def _fnv_int(data):
+    h = FNV_OFFSET
+    for byte in data:
+        h = (h ^ byte) * FNV_PRIME & M64
+    return h
+
+def _fnv(data, starts, lengths):
+    """FNV-1a of every byte string data[starts[i]:starts[i] + lengths[i]], one pass per character position"""
+    h = np.full(len(starts), FNV_OFFSET, dtype=np.uint64)
+    longest_first = np.argsort(-lengths, kind='stable')
+    counts = np.bincount(lengths, minlength=1)
+    still_going = len(starts) - np.cumsum(counts) # Strings longer than c, for every c
+
+    with np.errstate(over='ignore'):
+        for c in range(int(lengths.max()) if len(lengths) else 0):
+            remaining = int(still_going[c]) if c < len(still_going) else 0
+            rows = longest_first[:remaining]
+            h[rows] = (h[rows] ^ data[starts[rows] + c].astype(np.uint64)) * np.uint64(FNV_PRIME)
+    return h
+
+def _bytes_equal(data_a, starts_a, data_b, starts_b, lengths):
+    """Whether each pair of equally long byte strings matches"""
+    equal = np.ones(len(lengths), dtype=bool)
+    for c in range(int(lengths.max()) if len(lengths) else 0):
+        rows = np.flatnonzero(equal & (lengths > c))
+        equal[rows] = data_a[starts_a[rows] + c] == data_b[starts_b[rows] + c]
+    return equal
+
+def _integer_kind(types):
+    return all(issubclass(t, (int, np.integer)) and not issubclass(t, (bool, np.bool_)) for t in types)
+
+class LabelTable:
+    """Node labels stored as arrays with a hash index from label back to node number"""
+
+    def __init__(self, kind, values=None, offsets=None, data=None):
+        if kind not in ('numeric', 'utf8', 'object'):
+            raise ValueError(f"Unknown label kind '{kind}'")
+        self.kind = kind
+        self.values = values # Numbers or objects
+        self.offsets = offsets # UTF-8 strings
+        self.data = data
+
+        self._slots = None # The hash index, built on the first lookup
+        self._dict = None # Object labels just get a dict
+        self._list = None
+
+    @classmethod
+    def from_labels(cls, labels):
+        """Intern a list or array of labels (a LabelTable is passed through as is)"""
+        if isinstance(labels, LabelTable):
+            return labels
+
+        if isinstance(labels, np.ndarray) and labels.dtype.kind in 'iuf':
+            return cls('numeric', values=labels)
+        if isinstance(labels, np.ndarray) and labels.dtype.kind in 'US':
+            return cls._from_string_array(labels)
+
+        labels = labels.tolist() if isinstance(labels, np.ndarray) else list(labels)
+        types = {type(label) for label in labels}
+        if types and _integer_kind(types):
+            values = np.asarray(labels)
+            if values.dtype.kind in 'iu':
+                return cls('numeric', values=values)
+        elif types and types <= {float, np.float64}:
+            return cls('numeric', values=np.asarray(labels, dtype=np.float64))
+        elif all(issubclass(t, str) for t in types):
+            encoded = [label.encode('utf-8') for label in labels]
+            offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+            np.cumsum(np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded)), out=offsets[1:])
+            return cls('utf8', offsets=offsets, data=np.frombuffer(b''.join(encoded), dtype=np.uint8))
+
+        values = np.empty(len(labels), dtype=object)
+        values[:] = labels
+        return cls('object', values=values)
+
+    @classmethod
+    def _from_string_array(cls, labels, chunk_size=1 << 20):
+        """Fixed width NumPy strings to bytes + offsets, a chunk at a time so the padded copies stay small"""
+        lengths = []
+        pieces = []
+        for start in range(0, len(labels), chunk_size):
+            chunk = labels[start:start + chunk_size]
+            length = np.char.str_len(chunk).astype(np.int64)
+            if chunk.dtype.kind == 'U':
+                codes = chunk.view(np.uint32).reshape(len(chunk), -1) if len(chunk) else np.zeros((0, 1), np.uint32)
+                if codes.size and codes.max() < 128: # Plain ASCII, the code points already are the bytes
+                    chars = codes.astype(np.uint8)
+                else:
+                    chunk = np.char.encode(chunk, 'utf-8')
+                    length = np.char.str_len(chunk).astype(np.int64)
+            if chunk.dtype.kind == 'S':
+                width = chunk.dtype.itemsize
+                chars = np.frombuffer(chunk.tobytes(), dtype=np.uint8).reshape(len(chunk), width)
+            pieces.append(chars[np.arange(chars.shape[1]) < length[:, None]])
+            lengths.append(length)
+
+        offsets = np.zeros(len(labels) + 1, dtype=np.int64)
+        if lengths:
+            np.cumsum(np.concatenate(lengths), out=offsets[1:])
+        data = np.concatenate(pieces) if pieces else np.empty(0, dtype=np.uint8)
+        return cls('utf8', offsets=offsets, data=data)
+
+    @classmethod
+    def from_arrays(cls, kind, arrays):
+        """Table from the arrays arrays() gives (memory maps work, nothing gets decoded)"""
+        if kind == 'numeric':
+            return cls('numeric', values=arrays['labels'])
+        return cls('utf8', offsets=arrays['label_offsets'], data=arrays['label_bytes'])
+
+    def arrays(self):
+        """(kind, {name: array}) to write to a file, object labels get written as their str()"""
+        if self.kind == 'numeric':
+            return 'numeric', {'labels': self.values}
+        table = self if self.kind == 'utf8' else LabelTable.from_labels([str(label) for label in self.values.tolist()])
+        return 'utf8', {'label_offsets': table.offsets, 'label_bytes': table.data}
+
+    def __len__(self):
+        return len(self.offsets) - 1 if self.kind == 'utf8' else len(self.values)
+
+    @property
+    def nbytes(self):
+        if self.kind == 'utf8':
+            return self.offsets.nbytes + self.data.nbytes
+        if self.kind == 'object':
+            return 64 * len(self.values) # Rough size of the python objects themselves
+        return self.values.nbytes
+
+    def lengths(self):
+        """Byte length of every string label"""
+        return np.diff(self.offsets)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return self._slice(key)
+        if isinstance(key, (int, np.integer)):
+            return self._label(int(key))
+        return self.take(key)
+
+    def _label(self, i):
+        if i < 0:
+            i += len(self)
+        if self._list is not None:
+            return self._list[i]
+        if self.kind == 'utf8':
+            return self.data[self.offsets[i]:self.offsets[i + 1]].tobytes().decode('utf-8')
+        value = self.values[i]
+        return value.item() if isinstance(value, np.generic) else value
+
+    def _slice(self, key):
+        start, stop, step = key.indices(len(self))
+        if self.kind != 'utf8' or step != 1:
+            return self.take(np.arange(start, stop, step)) if self.kind == 'utf8' else LabelTable(self.kind, self.values[key])
+        stop = max(stop, start)
+        base = self.offsets[start]
+        return LabelTable('utf8', offsets=self.offsets[start:stop + 1] - base,
+                          data=self.data[base:self.offsets[stop]])
+
+    def take(self, ids):
+        """Sub-table of the labels at these positions, in that order"""
+        ids = np.asarray(ids, dtype=np.int64)
+        if self.kind != 'utf8':
+            return LabelTable(self.kind, values=self.values[ids])
+
+        starts = self.offsets[ids]
+        lengths = self.offsets[ids + 1] - starts
+        offsets = np.zeros(len(ids) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        gather = np.repeat(starts - offsets[:-1], lengths) + np.arange(offsets[-1])
+        return LabelTable('utf8', offsets=offsets, data=self.data[gather])
+
+    def tolist(self):
+        """All labels as python objects (remembered, the score mapping iterates over them a lot)"""
+        if self._list is None:
+            if self.kind != 'utf8':
+                self._list = self.values.tolist()
+            elif not len(self.data) or self.data.max() < 128: # ASCII: byte offsets are character offsets too
+                text = self.data.tobytes().decode('ascii')
+                bounds = self.offsets.tolist()
+                self._list = [text[a:b] for a, b in zip(bounds[:-1], bounds[1:])]
+            else:
+                blob = self.data.tobytes()
+                bounds = self.offsets.tolist()
+                self._list = [blob[a:b].decode('utf-8') for a, b in zip(bounds[:-1], bounds[1:])]
+        return self._list
+
+    def __iter__(self):
+        return iter(self.tolist())
+
+    def __array__(self, dtype=None, copy=None):
+        array = self.values if self.kind != 'utf8' else np.array(self.tolist(), dtype=str)
+        return array if dtype is None else array.astype(dtype)
+
+    def __repr__(self):
+        shown = ', '.join(repr(label) for label in self[:5])
+        return f"LabelTable({self.kind}, {len(self)} labels: {shown}{', ...' if len(self) > 5 else ''})"
+
+    def hashes(self):
+        """64 bit hash of every label (numbers hash their bits, strings their UTF-8 bytes)"""
+        if self.kind == 'numeric':
+            if self.values.dtype.kind == 'f':
+                bits = self.values.astype(np.float64) + 0.0 # -0.0 == 0.0 so they must hash alike, + 0.0 gives 0.0
+            else:
+                bits = self.values.astype(np.int64)
+            return _mix(bits.view(np.uint64))
+        if self.kind == 'utf8':
+            return _mix(_fnv(self.data, self.offsets[:-1], self.lengths()))
+
+        digest = lambda label: hashlib.blake2b(repr(label).encode('utf-8'), digest_size=8).digest()
+        return np.frombuffer(b''.join(digest(label) for label in self.values.tolist()), dtype=np.uint64).copy()
+
+    def _hash_one(self, label):
+        """Hash of a single label the way this table stores it, None if it can't be in here"""
+        if self.kind == 'utf8':
+            return (_mix_int(_fnv_int(label.encode('utf-8'))), label.encode('utf-8')) if isinstance(label, str) else None
+
+        if isinstance(label, (bool, np.bool_)) or not isinstance(label, (int, float, np.integer, np.floating)):
+            return None
+        if self.values.dtype.kind == 'f':
+            label = float(label) + 0.0 # -0.0 -> 0.0 like hashes()
+            return _mix_int(int(np.float64(label).view(np.uint64))), label
+        if isinstance(label, (float, np.floating)):
+            if not float(label).is_integer():
+                return None
+            label = int(label)
+        return _mix_int(int(label) & M64), int(label)
+
+    def _index(self):
+        """The hash index: 2x as many slots as labels, each holding a node number or EMPTY"""
+        if self._slots is None:
+            n = len(self)
+            size = 1 << max(int(2 * n - 1).bit_length(), 3)
+            mask = np.uint64(size - 1)
+            slots = np.full(size, EMPTY, dtype=np.int32 if n < 2**31 else np.int64)
+
+            position = (self.hashes() & mask).astype(np.int64)
+            pending = np.arange(n)
+            while len(pending): # Every round places one label per free slot, the rest move to the next slot
+                free = pending[slots[position[pending]] == EMPTY]
+                slots[position[free]] = free # When several want the same slot one of them ends up in it
+                placed = np.zeros(len(pending), dtype=bool)
+                placed[np.isin(pending, free[slots[position[free]] == free], assume_unique=True)] = True
+                pending = pending[~placed]
+                position[pending] = (position[pending] + 1) & int(mask)
+            self._slots = slots
+        return self._slots
+
+    def find(self, label):
+        """Node number of a label, KeyError if it isn't in the table"""
+        if self.kind == 'object':
+            if self._dict is None:
+                self._dict = {value: i for i, value in enumerate(self.values.tolist())}
+            return self._dict[label]
+
+        hashed = self._hash_one(label)
+        if hashed is None:
+            raise KeyError(label)
+        h, key = hashed
+
+        slots = self._index()
+        mask = len(slots) - 1
+        position = h & mask
+        while True:
+            i = int(slots[position])
+            if i == EMPTY:
+                raise KeyError(label)
+            if self.kind == 'utf8':
+                if self.data[self.offsets[i]:self.offsets[i + 1]].tobytes() == key:
+                    return i
+            elif self.values[i] == key:
+                return i
+            position = (position + 1) & mask
+
+    def __contains__(self, label):
+        try:
+            self.find(label)
+        except (KeyError, TypeError):
+            return False
+        return True
+
+    def ids(self, labels):
+        """Node numbers of many labels at once, -1 for the ones that aren't in the table"""
+        queries = LabelTable.from_labels(labels)
+        result = np.full(len(queries), -1, dtype=np.int64)
+        if self.kind == 'object' or queries.kind == 'object':
+            for k, label in enumerate(queries.tolist()):
+                try:
+                    result[k] = self.find(label)
+                except (KeyError, TypeError):
+                    pass
+            return result
+        if queries.kind != self.kind or not len(queries):
+            return result
+
+        if self.kind == 'numeric' and self.values.dtype.kind == 'f' and queries.values.dtype.kind != 'f':
+            queries = LabelTable('numeric', values=queries.values.astype(np.float64))
+        elif self.kind == 'numeric' and self.values.dtype.kind != 'f' and queries.values.dtype.kind == 'f':
+            whole = queries.values == np.round(queries.values)
+            found = np.full(len(queries), -1, dtype=np.int64)
+            found[whole] = self.ids(queries.values[whole].astype(np.int64))
+            return found
+
+        slots = self._index()
+        mask = len(slots) - 1
+        position = (queries.hashes() & np.uint64(mask)).astype(np.int64)
+        pending = np.arange(len(queries))
+        while len(pending):
+            candidates = slots[position[pending]].astype(np.int64)
+            occupied = candidates != EMPTY
+            pending, candidates = pending[occupied], candidates[occupied]
+
+            if self.kind == 'utf8':
+                lengths = self.offsets[candidates + 1] - self.offsets[candidates]
+                same = lengths == queries.offsets[pending + 1] - queries.offsets[pending]
+                same[same] = _bytes_equal(self.data, self.offsets[candidates[same]], queries.data,
+                                          queries.offsets[pending[same]], lengths[same])
+            else:
+                same = self.values[candidates] == queries.values[pending]
+
+            result[pending[same]] = candidates[same]
+            pending = pending[~same]
+            position[pending] = (position[pending] + 1) & mask
+        return result
@@ -0,0 +1,203 @@
+import itertools
+import logging
+import multiprocessing as mp
+import time
+import numpy as np
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from scipy import stats
+
+from distributed import SharedMemoryTransport, attach
+from interning import LabelTable
+from pagerank import PageRankScores, graph_arrays, top_positions
+from parallel import resolve_workers
+
+logger = logging.getLogger(__name__)
+
+'''
+Approximate PageRank from random walks instead of iterating the vote matrix (the "complete path" Monte Carlo method).
+Every page starts `walks` surfers. At every step a surfer carries on with probability d to a random page its current
+page links to, otherwise it stops (1 - d is the restart probability), and surfers on pages without links just stop,
+the same as the vote matrix losing their votes. Counting every page each surfer stands on gives
+
+    score(v) = (1 - d) / (n * walks) * visits(v)
+
+which on average is exactly what pagerank() converges to, so the two can be compared score for score. The walks are
+split into batches, each with its own random stream (SeedSequence.spawn, so the batches are independent whatever the
+order they run in), and the spread of the batch estimates gives a confidence interval for every score.
+
+All the surfers of a batch move together as one array of positions, a step is a handful of NumPy gathers. Batches
+run in worker processes that attach to the link arrays in shared memory, about one batch per worker in flight at a
+time. With 'top_k' set, the batches are folded in order and the walk stops early once the top k pages have stayed the
+same set for 'patience' batches in a row.
+'''
+
+CHUNK_WALKERS = 1 << 20 # Surfers moved at once, each one costs about 30 bytes for its visits
+
+def successor_arrays(g):
+    """Node labels plus CSR out-links (indptr, indices, out_degree) where the rows are the pages linking out"""
+    if hasattr(g, 'indptr'): # Compiled CSRGraph, already the right way round
+        return LabelTable.from_labels(g.labels), np.asarray(g.indptr), np.asarray(g.indices), np.asarray(g.out_degree)
+
+    all_nodes, src, dst = graph_arrays(g)
+    n = len(all_nodes)
+    out_degree = np.bincount(src, minlength=n)
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(out_degree, out=indptr[1:])
+    return all_nodes, indptr, dst[np.argsort(src, kind='stable')], out_degree
+
+def walk_batch(indptr, indices, out_degree, walks, d, seed):
+    """Visit counts of `walks` surfers started from every page, seed is the batch's SeedSequence"""
+    rng = np.random.default_rng(seed)
+    n = len(out_degree)
+    index = np.int32 if n < 2**31 else np.int64
+    visits = np.zeros(n, dtype=np.int64)
+    steps = 0
+
+    total = n * walks
+    for start in range(0, total, CHUNK_WALKERS):
+        position = (np.arange(start, min(start + CHUNK_WALKERS, total)) % n).astype(index)
+        seen = []
+        while len(position):
+            seen.append(position)
+            steps += len(position)
+
+            # One uniform per surfer does both jobs: below d it carries on, and then u / d is uniform again and
+            # picks which link to follow
+            u = rng.random(len(position))
+            degree = out_degree[position]
+            going = (u < d) & (degree > 0)
+            position, degree = position[going], degree[going]
+            pick = (u[going] * (1.0 / d) * degree).astype(np.int64)
+            np.minimum(pick, degree - 1, out=pick) # Rounding can land exactly on the degree
+            position = indices[indptr[position] + pick].astype(index)
+
+        visits += np.bincount(np.concatenate(seen), minlength=n)
+    return visits, steps
+
+_shared = None # The link arrays a worker process attached to
+
+def _attach_links(handles):
+    global _shared
+    keep = []
+    _shared = tuple(attach(handle, keep) for handle in handles) + (keep,)
+
+def _walk_shared(walks, d, seed):
+    return walk_batch(*_shared[:3], walks, d, seed)
+
+def _windowed(pool, window, walks, d, seeds):
+    """Batch results in seed order with at most `window` batches submitted at a time
+
+    The next batch only goes in once the caller asks for more, so stopping early leaves at most window - 1 batches
+    running that nobody needs, instead of the whole lot queued up front.
+    """
+    seeds = iter(seeds)
+    pending = deque(pool.submit(_walk_shared, walks, d, seed) for seed in itertools.islice(seeds, window))
+    while pending:
+        yield pending.popleft().result()
+        for seed in itertools.islice(seeds, 1):
+            pending.append(pool.submit(_walk_shared, walks, d, seed))
+
+class MonteCarloScores(PageRankScores):
+    """PageRankScores from random walks, with a confidence interval around every score"""
+
+    def __init__(self, nodes=(), scores=None, lower=None, upper=None, confidence=0.95, walk_stats=None, **kwargs):
+        super().__init__(nodes, scores, **kwargs)
+        self.lower = self.scores.copy() if lower is None else np.asarray(lower)
+        self.upper = self.scores.copy() if upper is None else np.asarray(upper)
+        self.confidence = confidence
+        self.walk_stats = walk_stats if walk_stats is not None else {}
+
+    def interval(self, node):
+        """(lower, upper) bounds the node's exact score lies in with the given confidence"""
+        i = self.position(node)
+        return float(self.lower[i]), float(self.upper[i])
+
+    def half_width(self):
+        """Largest distance from a score to the ends of its interval"""
+        return float((self.upper - self.scores).max()) if len(self.scores) else 0.0
+
+def batch_intervals(estimates, confidence):
+    """Mean of the batch estimates (batches x n) and the Student t confidence bounds around it"""
+    batches = len(estimates)
+    mean = estimates.mean(axis=0)
+    if batches < 2:
+        return mean, np.full_like(mean, -np.inf), np.full_like(mean, np.inf)
+    spread = estimates.std(axis=0, ddof=1) / np.sqrt(batches)
+    margin = stats.t.ppf(0.5 + confidence / 2, batches - 1) * spread
+    return mean, np.maximum(mean - margin, 0.0), mean + margin
+
+def monte_carlo_pagerank(g, walks=64, d=0.85, batches=8, workers=1, seed=None, confidence=0.95, top_k=None,
+                         patience=2):
+    """Approximate pagerank() scores from `walks` random walks per page, with confidence intervals
+
+    The walks are run in `batches` independent batches (at least 2, the intervals come from how much they disagree),
+    over `workers` processes (None uses every core). With top_k set it stops as soon as the top k pages haven't
+    changed for `patience` batches in a row, walk_stats on the result says how many walks that took.
+    """
+    if not 0 < d < 1:
+        raise ValueError("Damping factor must be between 0 and 1")
+    if batches < 2:
+        raise ValueError("Need at least 2 batches to get confidence intervals")
+
+    all_nodes, indptr, indices, out_degree = successor_arrays(g)
+    n = len(all_nodes)
+    if not n:
+        return MonteCarloScores(converged=True)
+
+    per_batch = max(int(walks) // batches, 1)
+    seeds = np.random.SeedSequence(seed).spawn(batches)
+    workers = min(resolve_workers(workers), batches)
+
+    logger.info("\nWalking %d surfers per page in %d batches on %d workers\n", per_batch * batches, batches, workers)
+    started = time.perf_counter()
+
+    transport = pool = None
+    if workers > 1:
+        transport = SharedMemoryTransport()
+        handles = [transport.share(a) for a in (indptr, indices, out_degree)]
+        pool = ProcessPoolExecutor(workers, mp_context=mp.get_context(), initializer=_attach_links, initargs=(handles,))
+        results = _windowed(pool, workers, per_batch, d, seeds)
+    else:
+        results = (walk_batch(indptr, indices, out_degree, per_batch, d, s) for s in seeds)
+
+    try:
+        counts = []
+        steps = 0
+        best = None
+        stable = 0
+        total = np.zeros(n, dtype=np.int64)
+        for visits, batch_steps in results: # In seed order, so the same seed always stops at the same batch
+            counts.append(visits)
+            steps += batch_steps
+            total += visits
+            if top_k is None or len(counts) < 2:
+                continue
+
+            top = frozenset(top_positions(total, top_k).tolist())
+            stable = stable + 1 if top == best else 0
+            best = top
+            if stable >= patience:
+                logger.info("Top %d has held for %d batches, stopping after %d of %d", top_k, stable, len(counts), batches)
+                break
+    finally:
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
+        if transport is not None:
+            transport.close()
+
+    scale = (1 - d) / (n * per_batch)
+    scores, lower, upper = batch_intervals(np.stack(counts) * scale, confidence)
+    elapsed = time.perf_counter() - started
+
+    walk_stats = {
+        'walks_per_node': per_batch * len(counts),
+        'batches': len(counts),
+        'steps': steps,
+        'stopped_early': len(counts) < batches,
+        'seconds': elapsed,
+    }
+    logger.info("Complete! %d walks per page, %d steps in %.2fs\n", walk_stats['walks_per_node'], steps, elapsed)
+
+    return MonteCarloScores(all_nodes, scores, lower, upper, confidence, walk_stats, iterations=len(counts),
+                            converged=True, timings={'iterate': elapsed})
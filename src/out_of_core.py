@@ -0,0 +1,257 @@
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+import numpy as np
+
+from interning import LabelTable
+from pagerank import PageRankScores, graph_arrays, power_iteration
+from graph_loader import iter_edge_chunks
+
+logger = logging.getLogger(__name__)
+
+'''
+PageRank for graphs with more links than fit in memory. The edges get sorted once into blocks on disk, each block
+holding every link that points into one range of destination nodes. Every iteration then streams the blocks through
+memory maps in order, only the O(n) score vectors (and the out-degrees) ever stay in RAM.
+
+'memory_budget' is roughly how many bytes of edges we allow in memory at once, both while sorting and while iterating.
+'''
+
+DEFAULT_MEMORY_BUDGET = 256 * 2**20
+EDGE_BYTES = 24 # Source + destination index plus the gathered score, per edge in flight
+
+def _budget_edges(memory_budget):
+    return max(int(memory_budget) // EDGE_BYTES, 1)
+
+def _scan_labels(path, chunk_edges, options):
+    """First pass over an edge list file: collect the sorted table of distinct node labels"""
+    for dtype in (np.int64, str):
+        try:
+            labels = np.empty(0, dtype=dtype)
+            pending = []
+            pending_size = 0
+
+            for edges in iter_edge_chunks(path, dtype, chunk_size=chunk_edges, **options):
+                pending.append(np.unique(edges))
+                pending_size += len(pending[-1])
+                if pending_size > chunk_edges:
+                    labels = np.unique(np.concatenate([labels] + pending))
+                    pending = []
+                    pending_size = 0
+
+            return np.unique(np.concatenate([labels] + pending))
+        except ValueError:
+            if dtype is str:
+                raise
+
+def _indexed_chunks(source, chunk_edges, options):
+    """Label table plus a function yielding (src, dst) index chunks for a file or an in-memory graph"""
+    if isinstance(source, (str, os.PathLike)):
+        labels = _scan_labels(source, chunk_edges, options)
+        dtype = labels.dtype if labels.dtype.kind in 'iu' else str
+
+        def chunks():
+            for edges in iter_edge_chunks(source, dtype, chunk_size=chunk_edges, **options):
+                yield np.searchsorted(labels, edges[:, 0]), np.searchsorted(labels, edges[:, 1])
+
+        return labels, chunks
+
+    if hasattr(source, 'indptr'): # Compiled CSRGraph
+        labels = source.labels
+        src = np.repeat(np.arange(len(source.indptr) - 1), np.diff(source.indptr))
+        dst = source.indices
+    else:
+        labels, src, dst = graph_arrays(source)
+
+    def chunks():
+        for start in range(0, len(src), chunk_edges):
+            yield np.asarray(src[start:start + chunk_edges]), np.asarray(dst[start:start + chunk_edges])
+
+    return labels, chunks
+
+def _destination_bounds(in_degree, chunk_edges):
+    """Cut the destination ids into ranges with about chunk_edges incoming links each"""
+    n = len(in_degree)
+    total = np.cumsum(in_degree)
+    m = int(total[-1]) if n else 0
+
+    targets = np.arange(chunk_edges, m, chunk_edges)
+    cuts = np.searchsorted(total, targets, side='right')
+    return np.unique(np.concatenate([[0], cuts, [n]])).astype(np.int64)
+
+def build_disk_graph(source, directory, memory_budget=DEFAULT_MEMORY_BUDGET, **loader_options):
+    """Sort the edges of a file (or in-memory graph) into destination-range blocks under directory"""
+    os.makedirs(directory, exist_ok=True)
+    chunk_edges = _budget_edges(memory_budget)
+
+    labels, chunks = _indexed_chunks(source, chunk_edges, loader_options)
+    n = len(labels)
+
+    # Index every edge once into a flat binary file while counting degrees
+    out_degree = np.zeros(n, dtype=np.int64)
+    in_degree = np.zeros(n, dtype=np.int64)
+    raw_path = os.path.join(directory, 'edges.tmp')
+
+    with open(raw_path, 'wb') as f:
+        for src, dst in chunks():
+            out_degree += np.bincount(src, minlength=n)
+            in_degree += np.bincount(dst, minlength=n)
+            f.write(np.stack([src, dst], axis=1).astype(np.int64).tobytes())
+
+    m = int(out_degree.sum())
+    bounds = _destination_bounds(in_degree, chunk_edges)
+    index_dtype = np.int32 if n < 2**31 else np.int64
+
+    # Scatter the edges into one file per destination range
+    block_paths = [os.path.join(directory, f'block_{b:05d}.tmp') for b in range(len(bounds) - 1)]
+    block_files = [open(path, 'wb') for path in block_paths]
+    try:
+        edges = np.memmap(raw_path, dtype=np.int64, mode='r', shape=(m, 2)) if m else np.empty((0, 2), dtype=np.int64)
+        for start in range(0, m, chunk_edges):
+            part = np.array(edges[start:start + chunk_edges])
+            block = np.searchsorted(bounds, part[:, 1], side='right') - 1
+            order = np.argsort(block, kind='stable')
+            part, block = part[order], block[order]
+            cuts = np.searchsorted(block, np.arange(len(bounds)))
+            for b in np.flatnonzero(np.diff(cuts)):
+                block_files[b].write(part[cuts[b]:cuts[b + 1]].tobytes())
+        del edges
+    finally:
+        for f in block_files:
+            f.close()
+    os.remove(raw_path)
+
+    # Sort each block by source so the score lookups walk memory in order
+    blocks = []
+    for b, path in enumerate(block_paths):
+        part = np.fromfile(path, dtype=np.int64).reshape(-1, 2)
+        os.remove(path)
+        order = np.argsort(part[:, 0], kind='stable')
+
+        name = f'block_{b:05d}'
+        np.save(os.path.join(directory, f'{name}_src.npy'), part[order, 0].astype(index_dtype))
+        np.save(os.path.join(directory, f'{name}_dst.npy'), (part[order, 1] - bounds[b]).astype(index_dtype))
+        blocks.append({'name': name, 'start': int(bounds[b]), 'end': int(bounds[b + 1]), 'edges': len(part)})
+
+    # Labels go in as plain arrays (numbers, or UTF-8 bytes plus offsets), never pickled, so opening a directory
+    # can't run code somebody dropped into it
+    label_kind, label_arrays = LabelTable.from_labels(labels).arrays()
+    for name, array in label_arrays.items():
+        np.save(os.path.join(directory, f'{name}.npy'), np.ascontiguousarray(array), allow_pickle=False)
+    np.save(os.path.join(directory, 'out_degree.npy'), out_degree)
+    with open(os.path.join(directory, 'meta.json'), 'w') as f:
+        json.dump({'nodes': n, 'edges': m, 'blocks': blocks, 'label_kind': label_kind,
+                   'label_arrays': list(label_arrays)}, f)
+
+    return DiskGraph(directory)
+
+class DiskGraph:
+    """Edge blocks written by build_disk_graph, opened lazily as memory maps"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, 'meta.json')) as f:
+            self.meta = json.load(f)
+
+        if 'label_kind' not in self.meta:
+            raise ValueError(f"{directory} was written by an older version that pickled its labels, build it again")
+        arrays = {name: np.load(os.path.join(directory, f'{name}.npy'), mmap_mode='r', allow_pickle=False)
+                  for name in self.meta['label_arrays']}
+        self.labels = LabelTable.from_arrays(self.meta['label_kind'], arrays)
+        self.out_degree = np.load(os.path.join(directory, 'out_degree.npy'), allow_pickle=False)
+
+    def number_of_nodes(self):
+        return self.meta['nodes']
+
+    def number_of_edges(self):
+        return self.meta['edges']
+
+    def blocks(self):
+        """Yield (first destination, end destination, sources, local destinations) per block"""
+        for block in self.meta['blocks']:
+            src = np.load(os.path.join(self.directory, f"{block['name']}_src.npy"), mmap_mode='r')
+            dst = np.load(os.path.join(self.directory, f"{block['name']}_dst.npy"), mmap_mode='r')
+            yield block['start'], block['end'], src, dst
+
+class DiskMatvec:
+    """The damped vote matrix as an operator that streams the disk blocks for every multiply"""
+
+    def __init__(self, graph, d, memory_budget=DEFAULT_MEMORY_BUDGET):
+        n = graph.number_of_nodes()
+        self.graph = graph
+        self.shape = (n, n)
+        self.chunk_edges = _budget_edges(memory_budget)
+
+        out_degree = graph.out_degree.astype(np.float64)
+        self.inv_degree = np.zeros(n)
+        np.divide(d, out_degree, out=self.inv_degree, where=out_degree > 0)
+        self.weighted = np.empty(n)
+
+        self.bytes_read = 0
+        self.read_seconds = 0.0
+        self.total_seconds = 0.0
+
+    def matvec_into(self, x, out):
+        started = time.perf_counter()
+        np.multiply(x, self.inv_degree, out=self.weighted)
+        out.fill(0)
+
+        for start, end, src, dst in self.graph.blocks():
+            for offset in range(0, len(src), self.chunk_edges):
+                read_started = time.perf_counter()
+                sources = np.array(src[offset:offset + self.chunk_edges])
+                targets = np.array(dst[offset:offset + self.chunk_edges])
+                self.read_seconds += time.perf_counter() - read_started
+                self.bytes_read += sources.nbytes + targets.nbytes
+
+                out[start:end] += np.bincount(targets, weights=self.weighted[sources], minlength=end - start)
+
+        self.total_seconds += time.perf_counter() - started
+        return out
+
+    def io_stats(self):
+        """How much edge data was streamed and how fast"""
+        mb = self.bytes_read / 2**20
+        return {
+            'bytes_read': self.bytes_read,
+            'read_seconds': self.read_seconds,
+            'total_seconds': self.total_seconds,
+            'read_mb_per_s': mb / self.read_seconds if self.read_seconds else float('inf'),
+            'effective_mb_per_s': mb / self.total_seconds if self.total_seconds else float('inf'),
+        }
+
+def out_of_core_pagerank(graph, max_iter=100, d=0.85, tol=1e-6, norm='l1', memory_budget=DEFAULT_MEMORY_BUDGET,
+                         directory=None):
+    """pagerank() for graphs bigger than RAM, graph can be a DiskGraph, an edge list path or any in-memory graph"""
+    scratch = None
+    if not isinstance(graph, DiskGraph):
+        if directory is None:
+            directory = scratch = tempfile.mkdtemp(prefix='pagerank_blocks_')
+        graph = build_disk_graph(graph, directory, memory_budget)
+
+    try:
+        n = graph.number_of_nodes()
+        if not n:
+            return PageRankScores(converged=True)
+
+        operator = DiskMatvec(graph, d, memory_budget)
+        scores = np.ones(n) / n
+
+        logger.info("\nDoing up to %d interations from %d disk blocks\n", max_iter, len(graph.meta['blocks']))
+
+        scores, residuals, converged = power_iteration(operator, (1 - d) / n, scores, max_iter, tol, norm)
+
+        stats = operator.io_stats()
+        logger.info("Complete! %d interations, streamed %.1f MB at %.1f MB/s\n", len(residuals),
+                    stats['bytes_read'] / 2**20, stats['effective_mb_per_s'])
+
+        result = PageRankScores(graph.labels, scores, iterations=len(residuals),
+                                residual=residuals[-1] if residuals else 0.0, residuals=residuals, converged=converged)
+        result.io_stats = stats
+        return result
+    finally:
+        if scratch is not None:
+            shutil.rmtree(scratch, ignore_errors=True)
@@ -1,42 +1,128 @@
+import logging
+import sys
+import time
 import numpy as np
-import scipy
+from scipy import sparse
 import networkx as nx
-import pprint # Just prints a map better
+from collections import namedtuple
+from collections.abc import ItemsView, Mapping, ValuesView
+from contextlib import contextmanager
+
+from compressed import CompressedGraph, CompressedMatvec
+from interning import LabelTable
+from parallel import ParallelMatvec, _sparsetools # C kernels for y += A @ x into a buffer we own (None if unusable)
+
+
+try:
+    import resource
+except ImportError: # Not on Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+FLOAT32_TOL = 1e-7 # Smallest L1 change float32 scores can reliably get down to
 
 '''
 'g' is the passed graph (the grpah containing the internet),
 
-'rounds' are the number of iterations the the processing is gonna go through as we we don't what depends on what
+'max_iter' is the most iterations the the processing is gonna go through as we we don't what depends on what
+
+'tol' is how small the change between two rounds has to get before we call it done, measured with 'norm' ('l1' adds up
+all the changes, 'linf' just looks at the biggest one)
 
 'd' is the damping factor just a suggested value by the pagerank founders i won't fuck with it niether should you.
+
+'dense' builds the full n x n vote matrix like we do on paper. Only use it for tiny teaching graphs, the default sparse
+matrix only stores the links so it scales to millions of edges.
+
+'method' picks the solver: 'power' (the plain iteration below), or one of the faster ones in solvers.py
+('gauss-seidel', 'aitken', 'quadratic', 'gmres', 'bicgstab') that help a lot when d is close to 1, or 'scc' which
+solves the strongly connected components one by one and only iterates the big ones (great for chains and trees).
+
+'workers' splits every matrix multiply over that many threads (None uses every core), worth it on really big graphs.
+
+'callback' gets called after every iteration as callback(iteration, residual, elapsed seconds), handy for progress bars
+or sending metrics somewhere.
+
+'dtype' is what the vote matrix weights and the score vectors are stored as. np.float32 halves the bytes every
+iteration has to stream through memory (the iteration is limited by memory speed, not math), so big graphs run faster
+and twice as big ones fit in RAM. The residual is still added up in float64. The other methods keep their own vectors
+in float64 (they need it) and only get the smaller matrix. Scores come out within about 1e-7 of
+float64 and the ranking barely moves, compare_precision() measures exactly how much on a given graph.
+
+'compress' keeps the links gap + varint encoded (compressed.CompressedGraph, 2-4.5 bytes a link instead of 12) and
+decodes them block by block on every iteration, slower per iteration but 3-6x less memory. Graphs loaded with
+graph_loader.compile_graph(g, compress=True) are already compressed and always run this way.
+
+'log_level' is the logging level the progress messages go out at (the menu shows INFO, pass logging.DEBUG to hush them).
+The returned scores carry 'timings' (seconds per phase plus every iteration) and 'memory' (bytes used) so you can see
+which part blows up on a given graph.
 '''
 
-def pagerank(g,rounds,d = 0.85):
-    all_nodes = []
+def graph_arrays(g):
+    """Get the node label table and the edges as integer source/destination index arrays"""
+    if hasattr(g, 'indptr'): # Compiled CSRGraph, the sources are implied by the row of every link
+        return LabelTable.from_labels(g.labels), np.repeat(np.arange(len(g.indptr) - 1), np.diff(g.indptr)), \
+            np.asarray(g.indices, dtype=np.int64)
+    if hasattr(g, 'edge_arrays'): # CompressedGraph, decode it
+        return (LabelTable.from_labels(g.labels),) + g.edge_arrays()
+    if not isinstance(g, nx.Graph): # Already arrays (like graph_loader.load_edge_list gives us), nothing to do
+        return LabelTable.from_labels(g.labels), np.asarray(g.src, dtype=np.int64), np.asarray(g.dst, dtype=np.int64)
 
-    for node in g.nodes():
-        all_nodes.append(node) # Gets the nodes from our graph (internet) and adds it to a list
+    all_nodes = list(g.nodes()) # Gets the nodes from our graph (internet)
 
-    
-    n = len(all_nodes) # Basically getting hte number of nodes present
-    
-    node_map = {}
-    
-    i = 0
+    node_map = {node: i for i, node in enumerate(all_nodes)}
 
-    for node in all_nodes:
-        node_map[node] = i
-        i+=1
+    m = g.number_of_edges()
+    flat = np.fromiter((node_map[node] for edge in g.edges() for node in edge[:2]), dtype=np.int64, count=2 * m)
 
+    return LabelTable.from_labels(all_nodes), flat[0::2].copy(), flat[1::2].copy()
+
+def transition_matrix(src, dst, n, dtype=np.float64):
+    """Build the sparse vote matrix where M[i, j] = 1/out_degree(j) for every link j -> i"""
+    src = np.asarray(src, dtype=np.int64)
+    dst = np.asarray(dst, dtype=np.int64)
+
+    out_degree = np.bincount(src, minlength=n)
+    weights = 1.0 / out_degree[src].astype(dtype) # Every page splits its vote equally between the pages it links to
+
+    return sparse.csr_matrix((weights, (dst, src)), shape=(n, n), dtype=dtype)
+
+def compiled_vote_matrix(indptr, indices, out_degree, dtype=np.float64):
+    """Vote matrix straight from compiled CSR adjacency arrays (graph_loader.CSRGraph), reusing them without a copy"""
+    n = len(indptr) - 1
+    out_degree = np.asarray(out_degree)
+
+    weights = np.repeat(1.0 / np.maximum(out_degree, 1).astype(dtype), out_degree)
+
+    # The adjacency rows are the sources, read column-wise that is exactly M (column j holds the votes of page j)
+    return sparse.csc_matrix((weights, indices, indptr), shape=(n, n), copy=False)
+
+def graph_matrix(g, dtype=np.float64):
+    """Node labels plus the sparse vote matrix for any graph type we know about"""
+    if hasattr(g, 'indptr'):
+        return LabelTable.from_labels(g.labels), compiled_vote_matrix(g.indptr, g.indices, g.out_degree, dtype)
+
+    all_nodes, src, dst = graph_arrays(g)
+    return all_nodes, transition_matrix(src, dst, len(all_nodes), dtype)
+
+def damp(voteMatrix, d):
+    """Fold the damping factor into a freshly built vote matrix in place, so the index arrays never get copied"""
+    if sparse.issparse(voteMatrix):
+        voteMatrix.data *= d
+    else:
+        voteMatrix *= d
+    return voteMatrix
+
+def dense_vote_matrix(g, node_map):
+    """Build the full n x n vote matrix one link at a time (the way we explain it in class)"""
+    n = len(node_map)
 
-    if not n:
-        return {} # If there are no nodes return nothing
-    
     voteMatrix = np.zeros((n, n))
 
     for j_node in g.nodes():
         out_degree = g.out_degree(j_node)
-        
+
         if out_degree > 0:
             for i_node in g.successors(j_node):
 
@@ -45,46 +131,495 @@ def pagerank(g,rounds,d = 0.85):
 
                 voteMatrix[i,j] = 1.0 / out_degree
 
+    return voteMatrix
+
+def matvec_into(M, x, out):
+    """Compute out = M @ x without allocating a new vector (or block of vectors) each step"""
+    if hasattr(M, 'matvec_into'): # Our own operators (like the threaded one) know how to fill the buffer themselves
+        return M.matvec_into(x, out)
+
+    if isinstance(M, np.ndarray):
+        return np.dot(M, x, out=out)
+
+    if (_sparsetools is not None and sparse.issparse(M) and M.format in ('csr', 'csc')
+            and M.dtype == x.dtype == out.dtype and x.flags.c_contiguous and out.flags.c_contiguous):
+        out.fill(0)
+        if x.ndim == 1:
+            kernel = _sparsetools.csr_matvec if M.format == 'csr' else _sparsetools.csc_matvec
+            kernel(M.shape[0], M.shape[1], M.indptr, M.indices, M.data, x, out)
+        else:
+            kernel = _sparsetools.csr_matvecs if M.format == 'csr' else _sparsetools.csc_matvecs
+            kernel(M.shape[0], M.shape[1], x.shape[1], M.indptr, M.indices, M.data, x.ravel(), out.ravel())
+        return out
+
+    out[:] = M @ x
+    return out
+
+def top_positions(scores, k, chunk_size=1 << 20):
+    """Positions of the k highest scores, best first (ties go to the node that came first)
+
+    Walks the scores chunk_size at a time keeping only the best k so far, so the extra memory doesn't grow with n.
+    """
+    n = len(scores)
+    k = min(int(k), n)
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+
+    best = np.empty(0, dtype=np.int64)
+    for start in range(0, n, chunk_size):
+        candidates = np.concatenate([best, np.arange(start, min(start + chunk_size, n))])
+        values = scores[candidates]
+        if len(candidates) <= k:
+            best = candidates
+            continue
+
+        cutoff = np.partition(values, len(values) - k)[len(values) - k] # k-th highest
+        above = candidates[values > cutoff]
+        tied = np.sort(candidates[values == cutoff])[:k - len(above)]
+        best = np.concatenate([above, tied])
+
+    return best[np.lexsort((best, -scores[best]))]
+
+class _ScoreItems(ItemsView):
+    def __iter__(self):
+        return zip(self._mapping.labels(), self._mapping.scores)
+
+class _ScoreValues(ValuesView):
+    def __iter__(self):
+        return iter(self._mapping.scores)
+
+class PageRankScores(Mapping):
+    """Read-only node -> score mapping backed by the label and score arrays, remembers how the iterations went too"""
+
+    def __init__(self, nodes=(), scores=None, iterations=0, residual=0.0, residuals=None, converged=False, timings=None,
+                 memory=None):
+        self.nodes = LabelTable.from_labels(nodes) # Usually the graph's own table, so its hash index gets reused
+        self.scores = np.zeros(len(self.nodes)) if scores is None else np.asarray(scores)
+        self.iterations = iterations
+        self.residual = residual
+        self.residuals = residuals if residuals is not None else []
+        self.converged = converged
+        self.timings = timings if timings is not None else {}
+        self.memory = memory if memory is not None else {}
+
+    def labels(self):
+        """Node labels as a plain list (in the same order as the score array)"""
+        return self.nodes.tolist()
+
+    def position(self, node):
+        """Where a node sits in the score array"""
+        return self.nodes.find(node)
+
+    def __getitem__(self, node):
+        return self.scores[self.position(node)]
+
+    def __iter__(self):
+        return iter(self.labels())
+
+    def __len__(self):
+        return len(self.scores)
+
+    def items(self):
+        return _ScoreItems(self)
+
+    def values(self):
+        return _ScoreValues(self)
+
+    def __repr__(self):
+        if len(self) <= 20:
+            return f"PageRankScores({dict(self.items())})"
+        return f"PageRankScores({len(self)} nodes, top {self.top_k(5)})"
+
+    def to_dict(self):
+        return dict(self.items())
+
+    def total(self):
+        return float(self.scores.sum(dtype=np.float64))
+
+    def top_indices(self, k=10):
+        """Positions of the k highest scores, best first, without sorting everything"""
+        return top_positions(self.scores, k)
+
+    def top_k(self, k=10):
+        """The k highest scoring (node, score) pairs, best first"""
+        return [(self.nodes[i], self.scores[i]) for i in self.top_indices(k)]
+
+    def rank(self, node):
+        """1 for the best node, ties share the better rank"""
+        return int(np.count_nonzero(self.scores > self[node])) + 1
+
+    def percentile(self, node):
+        """Percentage of nodes that score at most as much as this one"""
+        return 100.0 * np.count_nonzero(self.scores <= self[node]) / len(self.scores)
+
+class PhaseTimer:
+    """Adds up the wall time spent in each named phase"""
+
+    def __init__(self):
+        self.seconds = {}
+
+    @contextmanager
+    def phase(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.seconds[name] = self.seconds.get(name, 0.0) + time.perf_counter() - started
+
+def matrix_bytes(M):
+    """Bytes held by a vote matrix (values plus index arrays for sparse ones)"""
+    M = getattr(M, 'M', M) # The threaded wrapper keeps the real matrix in .M
+    if sparse.issparse(M):
+        return sum(a.nbytes for a in (M.data, M.indices, M.indptr))
+    return getattr(M, 'nbytes', 0)
+
+def peak_rss_bytes():
+    """Peak resident memory of this process so far (None where the OS doesn't tell us)"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024 # bytes on macOS, KB on Linux
+
+def residual_norm(diff, norm='l1', axis=None):
+    """Size of the change between two score vectors (diff gets overwritten), per column if axis=0"""
+    np.abs(diff, out=diff)
+
+    if norm == 'l1': # Added up in float64 even for float32 scores, so a million tiny changes don't get rounded away
+        return float(diff.sum(dtype=np.float64)) if axis is None else diff.sum(axis=axis, dtype=np.float64)
+    if norm == 'linf':
+        if axis is not None:
+            return diff.max(axis=axis, initial=0.0)
+        return float(diff.max()) if diff.size else 0.0
+
+    raise ValueError(f"Unknown norm '{norm}', use 'l1' or 'linf'")
+
+def power_iteration(voteMatrix, baseRank, scoreMatrix, max_iter=100, tol=1e-6, norm='l1', callback=None):
+    """Run score = baseRank + voteMatrix @ score until it stops changing (damping already folded into voteMatrix)"""
+    nextScores = np.empty_like(scoreMatrix) # Preallocated so the loop just swaps the buffers
+    diff = np.empty_like(scoreMatrix)
+
+    residuals = []
+    converged = False
+    started = time.perf_counter()
+
+    for i in range(max_iter): # The reason we go through multiple iterations is because its like the what comes first egg or chicken puzzle The score of A depend of C and score of C depend on A so as we go thorugh many iteration the value gets closer and closer to to the value it is supposed to be. As soon as the score stops changing by very much we stop.
+
+        matvec_into(voteMatrix, scoreMatrix, nextScores)
+        nextScores += baseRank
+
+        np.subtract(nextScores, scoreMatrix, out=diff)
+        residuals.append(residual_norm(diff, norm))
+
+        scoreMatrix, nextScores = nextScores, scoreMatrix
+
+        if callback is not None:
+            callback(i + 1, residuals[-1], time.perf_counter() - started)
+
+        if residuals[-1] <= tol:
+            converged = True
+            break
+
+    return scoreMatrix, residuals, converged
+
+def pagerank(g,max_iter = 100,d = 0.85,tol = 1e-6,norm = 'l1',dense = False,workers = 1,method = 'power',callback = None,
+             log_level = logging.INFO,dtype = np.float64,compress = False):
+    dtype = np.dtype(dtype)
+    if dtype not in (np.float32, np.float64):
+        raise ValueError(f"dtype has to be float32 or float64, not {dtype}")
+
+    timer = PhaseTimer()
+
+    if compress and not isinstance(g, CompressedGraph):
+        with timer.phase('matrix'):
+            g = CompressedGraph.from_edges(*graph_arrays(g))
+
+    with timer.phase('index'): # Give every node a number 0..n-1
+        if hasattr(g, 'indptr') or isinstance(g, CompressedGraph):
+            all_nodes = LabelTable.from_labels(g.labels) # Compiled graphs already are numbered
+        elif dense and isinstance(g, nx.Graph):
+            all_nodes = list(g.nodes())
+            node_map = {node: i for i, node in enumerate(all_nodes)}
+        else:
+            all_nodes, src, dst = graph_arrays(g)
+
+    n = len(all_nodes) # Basically getting hte number of nodes present
+
+    with timer.phase('matrix'):
+        if isinstance(g, CompressedGraph):
+            voteMatrix = CompressedMatvec(g, dtype, workers) # Does its own threading
+        elif hasattr(g, 'indptr'):
+            voteMatrix = compiled_vote_matrix(g.indptr, g.indices, g.out_degree, dtype)
+        elif dense and isinstance(g, nx.Graph):
+            voteMatrix = dense_vote_matrix(g, node_map).astype(dtype, copy=False)
+        else:
+            voteMatrix = transition_matrix(src, dst, n, dtype)
+
+        if dense and sparse.issparse(voteMatrix):
+            voteMatrix = voteMatrix.toarray()
+
+    if not n:
+        return PageRankScores(converged=True, timings=timer.seconds) # If there are no nodes return nothing
+
+    if dense and n <= 10:
+        logger.log(log_level, "Vote Matrix\n%s\n", voteMatrix)
+
+    with timer.phase('matrix'):
+        voteMatrix = damp(voteMatrix, d) # Fold the damping in once instead of multiplying every round
 
-    print("Vote Matrix")
-    print(voteMatrix, '\n')
 
+    scoreMatrix = np.ones(n, dtype=dtype)/n
 
 
-    scoreMatrix = np.ones(n)/n
+    baseRank = (1-d)/n # Just a calculated guess what if the user gets bored and don't go through one of the links and rather jumps to a random page (Its a escape route that also helps in completing the probability equation)
 
 
-    baseRankVector = np.ones(n) * ((1-d)/n) # Just a calculated guess what if the user gets bored and don't go through one of the links and rather jumps to a random page (Its a escape route that also helps in completing the probability equation)
-    
+    logger.log(log_level, "\nDoing up to %d interations (tol %s, %s, %s, %s)\n", max_iter, tol, norm, method, dtype.name)
+    if dtype == np.float32 and tol < FLOAT32_TOL:
+        logger.warning("tol %s is below what float32 scores can resolve (about %s), the scores won't get more accurate "
+                       "than that", tol, FLOAT32_TOL)
 
-    print (f"\nDoing {rounds} interations\n")
+    if method == 'power':
+        solve = power_iteration
+    else:
+        from solvers import METHODS # solvers builds on this module, so only pull it in when asked for
+        if method not in METHODS:
+            raise ValueError(f"Unknown method '{method}', pick one of: {', '.join(METHODS)}")
+        solve = METHODS[method]
 
-    for i in range(rounds): # The reason we go through multiple iterations is because its like the what comes first egg or chicken puzzle The score of A depend of C and score of C depend on A so as we go thorugh many iteration the value gets closer and closer to to the value it is supposed to be. Also a quick note as soon as the score start not to change by very much we should stop the iterations.
+    finished = [] # Elapsed time at the end of every iteration
 
-        scoreMatrix = baseRankVector + d * (voteMatrix @ scoreMatrix)
+    def progress(iteration, residual, elapsed):
+        finished.append(elapsed)
+        if callback is not None:
+            callback(iteration, residual, elapsed)
 
-    print("Complete! The interations are done!\n")
+    with timer.phase('iterate'):
+        if not dense and workers != 1 and sparse.issparse(voteMatrix):
+            with ParallelMatvec(voteMatrix, workers) as parallelMatrix:
+                scoreMatrix, residuals, converged = solve(parallelMatrix, baseRank, scoreMatrix, max_iter, tol, norm,
+                                                          callback=progress)
+        else:
+            scoreMatrix, residuals, converged = solve(voteMatrix, baseRank, scoreMatrix, max_iter, tol, norm,
+                                                      callback=progress)
+        if isinstance(voteMatrix, CompressedMatvec):
+            voteMatrix.close()
 
-    pagerank = {}
+    if converged:
+        logger.log(log_level, "Complete! Converged after %d interations\n", len(residuals))
+    else:
+        logger.log(log_level, "Complete! Hit the %d interation cap before converging\n", max_iter)
 
-    for node in node_map:
-        i = node_map[node]
+    with timer.phase('results'): # Hand the scores back under the original node names
+        result = PageRankScores(all_nodes, scoreMatrix.astype(dtype, copy=False), iterations=len(residuals),
+                                residual=residuals[-1] if residuals else 0.0, residuals=residuals, converged=converged)
 
-        score = scoreMatrix[i]
+    result.timings = dict(timer.seconds, iterations=np.diff(finished, prepend=0.0).tolist())
+    result.memory = {
+        'matrix_bytes': matrix_bytes(voteMatrix),
+        'vector_bytes': 3 * scoreMatrix.nbytes, # Current scores, next scores and the difference between them
+        'peak_rss_bytes': peak_rss_bytes(),
+    }
 
-        pagerank[node] = score
+    logger.debug("Phases: index %.4fs, matrix %.4fs, iterate %.4fs, results %.4fs, vote matrix %.1f MB",
+                 result.timings['index'], result.timings['matrix'], result.timings['iterate'],
+                 result.timings['results'], result.memory['matrix_bytes'] / 2**20)
 
-    return pagerank
+    return result
 
 
+PersonalizedPageRank = namedtuple('PersonalizedPageRank', ['nodes', 'scores', 'iterations', 'residuals', 'converged'])
 
+def personalized_pagerank(g, teleport, d=0.85, tol=1e-6, max_iter=100, norm='l1'):
+    """Personalized PageRank for every row of a (k x n) teleport matrix with one matrix build and one block iteration"""
+    all_nodes, voteMatrix = graph_matrix(g)
+    n = len(all_nodes)
 
+    teleport = teleport.toarray() if sparse.issparse(teleport) else np.array(teleport, dtype=np.float64, ndmin=2)
+    if teleport.ndim != 2 or teleport.shape[1] != n:
+        raise ValueError(f"Teleport matrix must have shape (k, {n}), got {teleport.shape}")
 
+    k = teleport.shape[0]
 
+    weight = teleport.sum(axis=1, keepdims=True)
+    if np.any(weight <= 0):
+        raise ValueError("Every teleport vector needs some positive weight")
 
+    # Each column is one random surfer who, instead of jumping anywhere, jumps back to its own seed pages
+    startBlock = np.ascontiguousarray((teleport / weight).T)
+    baseBlock = startBlock * (1 - d)
 
+    scores = np.zeros((k, n))
+    iterations = np.zeros(k, dtype=np.int64)
+    residuals = np.zeros(k)
+    converged = np.zeros(k, dtype=bool)
 
+    if not n or not k:
+        converged[:] = True
+        return PersonalizedPageRank(all_nodes, scores, iterations, residuals, converged)
 
+    voteMatrix = damp(voteMatrix, d)
 
+    active = np.arange(k) # Columns still iterating, finished ones drop out so they stop costing anything
+    scoreBlock = startBlock
+    nextBlock = np.empty_like(scoreBlock)
+    diff = np.empty_like(scoreBlock)
 
+    for i in range(1, max_iter + 1):
+        matvec_into(voteMatrix, scoreBlock, nextBlock)
+        nextBlock += baseBlock
+
+        np.subtract(nextBlock, scoreBlock, out=diff)
+        columnResidual = residual_norm(diff, norm, axis=0)
+
+        scoreBlock, nextBlock = nextBlock, scoreBlock
+
+        iterations[active] = i
+        residuals[active] = columnResidual
+
+        done = columnResidual <= tol
+        if done.any():
+            scores[active[done]] = scoreBlock[:, done].T
+            converged[active[done]] = True
+
+            keep = ~done
+            active = active[keep]
+            if not active.size:
+                break
+
+            scoreBlock = np.ascontiguousarray(scoreBlock[:, keep])
+            baseBlock = np.ascontiguousarray(baseBlock[:, keep])
+            nextBlock = np.empty_like(scoreBlock)
+            diff = np.empty_like(scoreBlock)
+
+    if active.size:
+        scores[active] = scoreBlock.T
+
+    return PersonalizedPageRank(all_nodes, scores, iterations, residuals, converged)
+
+
+DampingSweep = namedtuple('DampingSweep', ['nodes', 'dampings', 'scores', 'iterations', 'residuals', 'converged'])
+
+def damping_sweep(g, dampings, tol=1e-6, max_iter=100, norm='l1', method='block'):
+    """PageRank for a whole list of damping factors with one matrix build, scores come back as a (k x n) array
 
+    'block' iterates every d together as the columns of one block (one pass over the matrix per round for all of
+    them), 'continuation' solves them one by one from low to high d, each warm started from the last answer.
+    """
+    all_nodes, voteMatrix = graph_matrix(g)
+    n = len(all_nodes)
+
+    dampings = np.atleast_1d(np.asarray(dampings, dtype=np.float64))
+    if dampings.ndim != 1 or np.any((dampings < 0) | (dampings >= 1)):
+        raise ValueError("Damping factors have to be a list of numbers in [0, 1)")
+
+    k = len(dampings)
+    scores = np.zeros((k, n))
+    iterations = np.zeros(k, dtype=np.int64)
+    residuals = np.zeros(k)
+    converged = np.zeros(k, dtype=bool)
+
+    if not n or not k:
+        converged[:] = True
+        return DampingSweep(all_nodes, dampings, scores, iterations, residuals, converged)
+
+    if method == 'continuation':
+        x = np.ones(n) / n
+        folded = 1.0 # Damping currently folded into the matrix, rescaled in place so nothing gets copied
+        for c in np.argsort(dampings, kind='stable'):
+            d = dampings[c]
+            if d != folded:
+                voteMatrix = damp(voteMatrix, d / folded) if folded else damp(graph_matrix(g)[1], d)
+                folded = d
+            x, history, converged[c] = power_iteration(voteMatrix, (1 - d) / n, x.copy(), max_iter, tol, norm)
+            scores[c] = x
+            iterations[c] = len(history)
+            residuals[c] = history[-1] if history else 0.0
+        return DampingSweep(all_nodes, dampings, scores, iterations, residuals, converged)
+
+    if method != 'block':
+        raise ValueError(f"Unknown sweep method '{method}', use 'block' or 'continuation'")
+
+    # Every column is one damping factor: x_c = d_c * M @ x_c + (1 - d_c) / n
+    active = np.arange(k) # Columns still iterating, finished ones drop out so they stop costing anything
+    dampRow = dampings.copy()
+    baseRow = (1 - dampings) / n
+    scoreBlock = np.full((n, k), 1.0 / n)
+    nextBlock = np.empty_like(scoreBlock)
+    diff = np.empty_like(scoreBlock)
+
+    for i in range(1, max_iter + 1):
+        matvec_into(voteMatrix, scoreBlock, nextBlock)
+        nextBlock *= dampRow
+        nextBlock += baseRow
+
+        np.subtract(nextBlock, scoreBlock, out=diff)
+        columnResidual = residual_norm(diff, norm, axis=0)
+
+        scoreBlock, nextBlock = nextBlock, scoreBlock
+
+        iterations[active] = i
+        residuals[active] = columnResidual
+
+        done = columnResidual <= tol
+        if done.any():
+            scores[active[done]] = scoreBlock[:, done].T
+            converged[active[done]] = True
+
+            keep = ~done
+            active = active[keep]
+            if not active.size:
+                break
+
+            scoreBlock = np.ascontiguousarray(scoreBlock[:, keep])
+            dampRow = dampRow[keep]
+            baseRow = baseRow[keep]
+            nextBlock = np.empty_like(scoreBlock)
+            diff = np.empty_like(scoreBlock)
+
+    if active.size:
+        scores[active] = scoreBlock.T
+
+    return DampingSweep(all_nodes, dampings, scores, iterations, residuals, converged)
+
+
+def rank_agreement(reference, scores, k=100):
+    """How far a result (say float32) is from a reference one (float64) in score and in ranking over the top k"""
+    exact = reference.scores.astype(np.float64)
+    approx = scores.scores.astype(np.float64)
+    error = np.abs(approx - exact)
+
+    top = reference.top_indices(k)
+    k = len(top)
+    best = set(scores.top_indices(k).tolist())
+
+    # Where the reference top k land in the other ranking (1 = best)
+    ordered = np.sort(approx)
+    ranks = len(approx) - np.searchsorted(ordered, approx[top], side='right') + 1
+
+    # Pairs of top k nodes the other result puts the wrong way round (Kendall distance)
+    top_scores = approx[top]
+    swapped = int(np.count_nonzero(np.triu(top_scores[:, None] < top_scores[None, :], 1))) if k > 1 else 0
+
+    return {
+        'max_abs_error': float(error.max()) if len(error) else 0.0,
+        'max_rel_error': float((error / np.maximum(exact, np.finfo(np.float64).tiny)).max()) if len(error) else 0.0,
+        'l1_error': float(error.sum()),
+        'k': k,
+        'top_k_overlap': len(best.intersection(top.tolist())) / k if k else 1.0,
+        'swapped_pairs': swapped / (k * (k - 1) / 2) if k > 1 else 0.0,
+        'max_rank_shift': int(np.abs(ranks - np.arange(1, k + 1)).max()) if k else 0,
+    }
+
+def compare_precision(g, dtype=np.float32, k=100, **options):
+    """Rank the graph in float64 and in dtype, report the speed and memory of both and how well the rankings agree"""
+    options.setdefault('log_level', logging.DEBUG)
+    reference = pagerank(g, dtype=np.float64, **options)
+    scores = pagerank(g, dtype=dtype, **options)
+
+    report = rank_agreement(reference, scores, k)
+    report['dtype'] = np.dtype(dtype).name
+    for name, result in (('float64', reference), ('low', scores)):
+        report[f'{name}_iterations'] = result.iterations
+        report[f'{name}_seconds'] = result.timings.get('iterate', 0.0)
+        report[f'{name}_bytes'] = result.memory.get('matrix_bytes', 0) + result.memory.get('vector_bytes', 0)
+    return report
@@ -1,9 +1,21 @@
 import tkinter as tk
 import math
-from pagerank import pagerank
+import numpy as np
+from cache import cached_pagerank
 from graph_loader import load_default_graph
 from utils import calculate_layout, get_node_color, get_node_size, format_scores_for_display
 
+# Level of detail: Tk chokes on tens of thousands of canvas items, so big graphs only get the important bits drawn
+DETAIL_NODES = 200 # Top scoring visible nodes drawn in full (shadow, circle, labels)
+MAX_EDGES = 1500 # Only the visible edges carrying the most PageRank get drawn
+TILE_SIZE = 16 # The other visible nodes are summed into density tiles this many pixels wide
+NAME_SIZE = 24 # On screen node size the name needs to be readable
+SCORE_SIZE = 36 # Same for the score
+ARROW_SCALE = 0.4 # Node scale from which edges get arrowheads
+MIN_ZOOM, MAX_ZOOM = 0.2, 200.0
+FORCE_LAYOUT_NODES = 30 # Past this many nodes the circle gets unreadable, so they get the force-directed layout
+LAYOUT_BUDGET_MS = 800 # How long one layout run may take before we draw what we have
+
 # Global variables
 canvas = None
 info_label = None
@@ -11,30 +23,70 @@ iterations_var = None
 graph = None
 scores = None
 node_positions = {}
+layout_xy = None # Layout positions as an (n, 2) array in the order of the score array
+edge_index = None # (source, destination) positions of every edge in that order
+edge_share = None # 1 / out-degree of every edge's source, so score * share is the PageRank flowing along it
+view = {'zoom': 1.0, 'x': 0.0, 'y': 0.0} # Screen position = layout position * zoom + (x, y)
+node_items = {} # node -> (size, canvas ids of its shadow, circle, name and score, labels None when too small)
+edge_items = [] # (start position, end position, line id, arrowhead id or None)
+drawn_scale = None # Node scale of the last render
+resize_job = None
+render_job = None
+drag_start = None
 
 def set_graph(input_graph):
     """Set the graph to visualize"""
     global graph
     graph = input_graph
 
-def calculate_node_layout():
-    """Calculate node positions using utils function"""
-    global graph, canvas
-    
-    # Get canvas dimensions
+def canvas_size():
+    """Current canvas size (800x600 before it is on screen)"""
+    global canvas
     canvas_width = canvas.winfo_width()
     canvas_height = canvas.winfo_height()
     
     if canvas_width <= 1 or canvas_height <= 1:
         canvas_width, canvas_height = 800, 600
+    return canvas_width, canvas_height
+
+def calculate_node_layout(previous=None, iterations=200):
+    """Calculate node positions using utils function (warm started from 'previous' for the force layout)"""
+    global graph
+    canvas_width, canvas_height = canvas_size()
     
-    return calculate_layout(graph, canvas_width, canvas_height)
+    if graph.number_of_nodes() <= FORCE_LAYOUT_NODES:
+        return calculate_layout(graph, canvas_width, canvas_height)
+    return calculate_layout(graph, canvas_width, canvas_height, method='force', previous=previous,
+                            iterations=iterations, time_budget_ms=LAYOUT_BUDGET_MS)
 
+def prepare_layout(refine=True):
+    """Lay the graph out and keep positions and edges as arrays, so culling to the viewport is vectorized
 
+    Without refine an existing force layout is only fitted to the canvas again (that's all a resize needs).
+    """
+    global node_positions, layout_xy, edge_index, edge_share
+    
+    node_positions = calculate_node_layout(node_positions or None, 200 if refine else 0)
+    layout_xy = np.array([node_positions[node] for node in scores.labels()], dtype=float).reshape(-1, 2)
+    
+    if edge_index is None:
+        edge_index = np.array([(scores.position(u), scores.position(v)) for u, v in graph.edges()],
+                              dtype=np.int64).reshape(-1, 2)
+        out_degree = np.bincount(edge_index[:, 0], minlength=len(layout_xy))
+        edge_share = 1.0 / np.maximum(out_degree[edge_index[:, 0]], 1)
 
-def draw_edge(start_pos, end_pos, color='#666666', width=2):
-    """Draw an edge with arrow"""
-    global canvas
+def node_scale():
+    """How big nodes can get (1 = full size) before they run into each other at the current zoom"""
+    canvas_width, canvas_height = canvas_size()
+    spacing = math.sqrt(canvas_width * canvas_height / max(len(layout_xy), 1))
+    return min(1.0, view['zoom'] * spacing / 80)
+
+def screen_positions():
+    """Layout positions moved through the current zoom and pan"""
+    return layout_xy * view['zoom'] + (view['x'], view['y'])
+
+def edge_coords(start_pos, end_pos, scale=1.0):
+    """Line and arrowhead coordinates for an edge, None if both ends sit on the same spot"""
     x1, y1 = start_pos
     x2, y2 = end_pos
     
@@ -43,105 +95,262 @@ def draw_edge(start_pos, end_pos, color='#666666', width=2):
     dy = y2 - y1
     length = math.sqrt(dx*dx + dy*dy)
     
-    if length > 0:
-        # Shorten the line to not overlap with nodes
-        factor = (length - 35) / length
-        x2_adj = x1 + dx * factor
-        y2_adj = y1 + dy * factor
-        
-        # Draw main line
-        canvas.create_line(x1, y1, x2_adj, y2_adj, fill=color, width=width, smooth=True)
-        
-        # Draw arrowhead
-        arrow_length = 15
-        arrow_angle = math.pi / 6
-        
-        angle = math.atan2(dy, dx)
-        
-        # Arrow points
-        ax1 = x2_adj - arrow_length * math.cos(angle - arrow_angle)
-        ay1 = y2_adj - arrow_length * math.sin(angle - arrow_angle)
-        ax2 = x2_adj - arrow_length * math.cos(angle + arrow_angle)
-        ay2 = y2_adj - arrow_length * math.sin(angle + arrow_angle)
-        
-        canvas.create_polygon([x2_adj, y2_adj, ax1, ay1, ax2, ay2], 
-                             fill=color, outline=color)
+    if length == 0:
+        return None
+    
+    # Shorten the line to not overlap with nodes
+    factor = (length - 35 * scale) / length
+    x2_adj = x1 + dx * factor
+    y2_adj = y1 + dy * factor
+    
+    # Arrowhead
+    arrow_length = 15 * scale
+    arrow_angle = math.pi / 6
+    
+    angle = math.atan2(dy, dx)
+    
+    # Arrow points
+    ax1 = x2_adj - arrow_length * math.cos(angle - arrow_angle)
+    ay1 = y2_adj - arrow_length * math.sin(angle - arrow_angle)
+    ax2 = x2_adj - arrow_length * math.cos(angle + arrow_angle)
+    ay2 = y2_adj - arrow_length * math.sin(angle + arrow_angle)
+    
+    return [x1, y1, x2_adj, y2_adj], [x2_adj, y2_adj, ax1, ay1, ax2, ay2]
+
+def draw_edge(start_pos, end_pos, color='#666666', width=2, scale=1.0, arrowhead=True):
+    """Draw an edge with arrow, returns the (line, arrowhead) canvas ids"""
+    global canvas
+    coords = edge_coords(start_pos, end_pos, scale)
+    if coords is None:
+        return None, None
+    
+    line_coords, arrow_coords = coords
+    line = canvas.create_line(*line_coords, fill=color, width=width, smooth=True)
+    arrow = canvas.create_polygon(arrow_coords, fill=color, outline=color) if arrowhead else None
+    return line, arrow
+
+def node_coords(x, y, size):
+    """Canvas coordinates of a node's shadow, circle, name and score"""
+    return ([x - size//2 + 3, y - size//2 + 3, x + size//2 + 3, y + size//2 + 3],
+            [x - size//2, y - size//2, x + size//2, y + size//2],
+            [x, y - 8],
+            [x, y + 6])
+
+def get_scores(iterations):
+    """PageRank scores for the current graph, only computed again when the graph or iteration count changes"""
+    global graph
+    # Shared with the menu, so scores it already calculated show up here for free (and the other way around)
+    return cached_pagerank(graph, iterations)
 
 def visualize_graph():
     """Main visualization function"""
-    global graph, canvas, scores, node_positions, iterations_var, info_label
+    global graph, canvas, scores, edge_index, node_positions, iterations_var
     
     if not graph:
         return
     
-    # Clear canvas
-    canvas.delete("all")
-    
     # Calculate PageRank scores
     try:
         iterations = int(iterations_var.get())
     except ValueError:
         iterations = 100
         
-    scores = pagerank(graph, iterations)
+    new_scores = get_scores(iterations)
+    if new_scores is not scores:
+        edge_index = None # Node order may have changed
+        node_positions = {} # New graph, nothing to warm start the layout from
+    scores = new_scores
     
     if not scores:
+        canvas.delete("all")
         return
     
-    # Calculate positions
-    node_positions = calculate_node_layout()
+    prepare_layout()
+    render_view()
+
+def draw_tiles(screen, rest, values):
+    """Sum the scores of nodes that aren't drawn one by one into screen tiles and shade each tile by its total"""
+    tiles = np.floor(screen[rest] / TILE_SIZE).astype(np.int64)
+    keys, inverse = np.unique(tiles, axis=0, return_inverse=True)
+    mass = np.bincount(inverse.ravel(), weights=values[rest])
+    
+    max_mass, min_mass = mass.max(), mass.min()
+    for (tx, ty), total in zip(keys.tolist(), mass.tolist()):
+        canvas.create_rectangle(tx * TILE_SIZE, ty * TILE_SIZE, (tx + 1) * TILE_SIZE, (ty + 1) * TILE_SIZE,
+                                fill=get_node_color(total, max_mass, min_mass), outline='', stipple='gray50')
+
+def render_view():
+    """Draw the viewport: the top visible nodes in full, the rest as density tiles, and only the heaviest edges"""
+    global canvas, node_items, edge_items, drawn_scale, info_label
+    
+    # Clear canvas
+    canvas.delete("all")
+    node_items = {}
+    edge_items = []
+    
+    if layout_xy is None or not len(layout_xy):
+        return
+    
+    canvas_width, canvas_height = canvas_size()
+    scale = drawn_scale = node_scale()
+    screen = screen_positions()
+    margin = 40 * scale
+    visible = ((screen[:, 0] >= -margin) & (screen[:, 0] <= canvas_width + margin) &
+               (screen[:, 1] >= -margin) & (screen[:, 1] <= canvas_height + margin))
     
     # Get score statistics
-    scores_values = list(scores.values())
-    max_score = max(scores_values)
-    min_score = min(scores_values)
+    values = scores.scores
+    max_score = values.max()
+    min_score = values.min()
+    
+    shown = np.flatnonzero(visible)
+    detail = shown
+    if len(shown) > DETAIL_NODES:
+        detail = np.sort(shown[np.argpartition(-values[shown], DETAIL_NODES - 1)[:DETAIL_NODES]])
+        draw_tiles(screen, np.setdiff1d(shown, detail, assume_unique=True), values)
+    
+    screen_list = screen.tolist()
     
     # Draw edges first (so they appear behind nodes)
-    for edge in graph.edges():
-        start_node, end_node = edge
-        if start_node in node_positions and end_node in node_positions:
-            start_pos = node_positions[start_node]
-            end_pos = node_positions[end_node]
-            draw_edge(start_pos, end_pos, '#4CAF50', 2)
+    edges = np.flatnonzero(visible[edge_index[:, 0]] | visible[edge_index[:, 1]]) if len(edge_index) else []
+    if len(edges) > MAX_EDGES: # Keep the links that carry the most PageRank
+        flow = values[edge_index[edges, 0]] * edge_share[edges]
+        edges = edges[np.argpartition(-flow, MAX_EDGES - 1)[:MAX_EDGES]]
+    
+    arrowheads = scale >= ARROW_SCALE
+    for start, end in edge_index[edges].tolist():
+        line, arrow = draw_edge(screen_list[start], screen_list[end], '#4CAF50', 2 if arrowheads else 1, scale, arrowheads)
+        if line is not None:
+            edge_items.append((start, end, line, arrow))
     
     # Draw nodes
-    for node, score in scores.items():
-        if node not in node_positions:
-            continue
-            
-        x, y = node_positions[node]
+    labels = scores.labels()
+    for i in detail.tolist():
+        node = labels[i]
+        score = values[i]
+        x, y = screen_list[i]
         
         # Calculate node properties
         color = get_node_color(score, max_score, min_score)
-        size = get_node_size(score, max_score, min_score)
+        size = get_node_size(score, max_score, min_score) * scale
+        shadow_xy, circle_xy, name_xy, score_xy = node_coords(x, y, size)
         
         # Draw node shadow
-        canvas.create_oval(x - size//2 + 3, y - size//2 + 3, 
-                          x + size//2 + 3, y + size//2 + 3, 
-                          fill='#000000', outline='', stipple='gray50')
+        shadow = canvas.create_oval(*shadow_xy, fill='#000000', outline='', stipple='gray50')
         
         # Draw node
-        canvas.create_oval(x - size//2, y - size//2, 
-                          x + size//2, y + size//2, 
-                          fill=color, outline='#ffffff', width=3)
+        circle = canvas.create_oval(*circle_xy, fill=color, outline='#ffffff', width=max(1, round(3 * scale)))
         
-        # Draw node label
-        canvas.create_text(x, y - 8, text=node, fill='#000000', 
-                          font=('Arial', 12, 'bold'))
+        # Draw node label (only once it is zoomed in far enough to read)
+        name = None
+        if size >= NAME_SIZE:
+            name = canvas.create_text(*name_xy, text=node, fill='#000000', 
+                                      font=('Arial', 12, 'bold'))
         
         # Draw score label (smaller and positioned inside the circle)
-        score_text = f"{score:.3f}"
-        canvas.create_text(x, y + 6, text=score_text, fill='#000000', 
-                          font=('Arial', 7))
+        score_label = None
+        if size >= SCORE_SIZE:
+            score_text = f"{score:.3f}"
+            score_label = canvas.create_text(*score_xy, text=score_text, fill='#000000', 
+                                             font=('Arial', 7))
+        
+        node_items[node] = (size, shadow, circle, name, score_label)
     
     # Update info label
     info_text = format_scores_for_display(scores)
+    if len(detail) < len(values) or len(edge_items) < len(edge_index):
+        info_text += (f"\nShowing {len(detail)} of {len(values)} nodes and {len(edge_items)} of {len(edge_index)} edges"
+                      " (scroll to zoom, drag to pan)")
     info_label.config(text=info_text)
 
+def relayout():
+    """Fit the layout to the new canvas size, the scores don't change on a resize"""
+    global resize_job
+    resize_job = None
+    
+    if not node_items:
+        visualize_graph()
+        return
+    
+    prepare_layout(refine=False)
+    
+    if len(node_items) < len(layout_xy) or node_scale() != drawn_scale:
+        render_view() # What is visible (or readable) changed with the size, so draw the viewport again
+        return
+    
+    # Everything is on the canvas already, just move it
+    screen = screen_positions().tolist()
+    
+    for start, end, line, arrow in edge_items:
+        coords = edge_coords(screen[start], screen[end], drawn_scale)
+        if coords is None:
+            continue
+        canvas.coords(line, *coords[0])
+        if arrow is not None:
+            canvas.coords(arrow, *coords[1])
+    
+    for node, (size, *items) in node_items.items():
+        for item, xy in zip(items, node_coords(*screen[scores.position(node)], size)):
+            if item is not None:
+                canvas.coords(item, *xy)
+
 def on_canvas_resize(event):
     """Handle canvas resize event"""
-    # Recalculate layout and redraw after small delay
-    event.widget.after(100, visualize_graph)
+    global resize_job
+    # Dragging the window edge fires this constantly, only relayout once it settles down
+    if resize_job is not None:
+        event.widget.after_cancel(resize_job)
+    resize_job = event.widget.after(150, relayout)
+
+def finish_render():
+    global render_job
+    render_job = None
+    render_view()
+
+def schedule_render(delay=120):
+    """Redraw the viewport properly once the zooming or panning stops"""
+    global render_job
+    if render_job is not None:
+        canvas.after_cancel(render_job)
+    render_job = canvas.after(delay, finish_render)
+
+def on_zoom(event):
+    """Zoom around the mouse pointer: stretch what is drawn right away, render the new detail level afterwards"""
+    factor = 1 / 1.2 if event.num == 5 or event.delta < 0 else 1.2
+    zoom = min(max(view['zoom'] * factor, MIN_ZOOM), MAX_ZOOM)
+    factor = zoom / view['zoom']
+    if factor == 1:
+        return
+    
+    view['x'] = event.x - (event.x - view['x']) * factor
+    view['y'] = event.y - (event.y - view['y']) * factor
+    view['zoom'] = zoom
+    
+    canvas.scale('all', event.x, event.y, factor, factor)
+    schedule_render()
+
+def on_drag_start(event):
+    global drag_start
+    drag_start = (event.x, event.y)
+
+def on_drag(event):
+    """Pan: slide what is drawn right away, fill in the newly visible area afterwards"""
+    global drag_start
+    if drag_start is None:
+        return
+    
+    dx, dy = event.x - drag_start[0], event.y - drag_start[1]
+    drag_start = (event.x, event.y)
+    view['x'] += dx
+    view['y'] += dy
+    
+    canvas.move('all', dx, dy)
+    schedule_render()
+
+def reset_view():
+    """Back to the whole graph unzoomed"""
+    view.update(zoom=1.0, x=0.0, y=0.0)
+    render_view()
 
 def create_gui():
     """Create the GUI"""
@@ -188,8 +397,13 @@ def create_gui():
                            font=('Arial', 10, 'bold'), relief=tk.FLAT, padx=20)
     refresh_btn.pack(side=tk.LEFT)
     
+    # Reset view button
+    reset_btn = tk.Button(control_frame, text="Reset View", command=reset_view, bg='#555555', fg='white',
+                         font=('Arial', 10, 'bold'), relief=tk.FLAT, padx=20)
+    reset_btn.pack(side=tk.LEFT, padx=(10, 0))
+    
     # Iterations entry
-    tk.Label(control_frame, text="Iterations:", fg='#cccccc', bg='#1e1e1e').pack(side=tk.LEFT, padx=(20, 5))
+    tk.Label(control_frame, text="Max Iterations:", fg='#cccccc', bg='#1e1e1e').pack(side=tk.LEFT, padx=(20, 5))
     iterations_var = tk.StringVar(value="100")
     iterations_entry = tk.Entry(control_frame, textvariable=iterations_var, width=10)
     iterations_entry.pack(side=tk.LEFT)
@@ -197,11 +411,28 @@ def create_gui():
     # Bind canvas resize event
     canvas.bind('<Configure>', on_canvas_resize)
     
+    # Zoom with the mouse wheel (Button-4/5 on Linux), pan by dragging
+    canvas.bind('<MouseWheel>', on_zoom)
+    canvas.bind('<Button-4>', on_zoom)
+    canvas.bind('<Button-5>', on_zoom)
+    canvas.bind('<ButtonPress-1>', on_drag_start)
+    canvas.bind('<B1-Motion>', on_drag)
+    
     return root, canvas
 
 def main(input_graph=None):
     """Main function"""
-    global canvas
+    global canvas, scores, node_positions, node_items, edge_items, edge_index, resize_job, render_job
+    
+    # Items drawn in an earlier window don't exist on this one
+    scores = None
+    node_positions = {}
+    node_items = {}
+    edge_items = []
+    edge_index = None
+    resize_job = None
+    render_job = None
+    view.update(zoom=1.0, x=0.0, y=0.0)
     
     # Set the graph (use default if none provided)
     if input_graph is None:
@@ -0,0 +1,104 @@
+import os
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from scipy import sparse
+
+def load_kernels():
+    """scipy's C matvec kernels (they drop the GIL, so threads really do run side by side), or None
+
+    scipy.sparse._sparsetools is private and can move or change between releases, so it only gets used when it's
+    there and gives the right answer on a tiny matrix. Otherwise everything falls back to the public M @ x.
+    """
+    try:
+        from scipy.sparse import _sparsetools
+        A = sparse.csr_matrix(np.array([[1.0, 2.0], [0.0, 3.0]]))
+        B = A.tocsc()
+        x = np.array([1.0, 10.0])
+        X = np.array([[1.0, 0.0], [10.0, 1.0]])
+        one, many = np.zeros(2), np.zeros((2, 2))
+        for M, single, block in ((A, _sparsetools.csr_matvec, _sparsetools.csr_matvecs),
+                                 (B, _sparsetools.csc_matvec, _sparsetools.csc_matvecs)):
+            one.fill(0)
+            many.fill(0)
+            single(2, 2, M.indptr, M.indices, M.data, x, one)
+            block(2, 2, 2, M.indptr, M.indices, M.data, X.ravel(), many.ravel())
+            if not (np.allclose(one, A @ x) and np.allclose(many, A @ X)):
+                return None
+        return _sparsetools
+    except (ImportError, AttributeError, TypeError, ValueError, RuntimeError):
+        return None
+
+_sparsetools = load_kernels()
+
+'''
+Splits the vote matrix into row blocks with about the same number of links each, and runs one block per thread.
+Every block writes its own slice of the output vector so the threads never touch the same memory.
+'''
+
+def resolve_workers(workers):
+    """None or anything below 1 means use every core"""
+    if workers is None or workers < 1:
+        return os.cpu_count() or 1
+    return workers
+
+def row_blocks(indptr, parts):
+    """Row boundaries that cut the matrix into `parts` blocks with roughly equal nonzeros"""
+    n = len(indptr) - 1
+    targets = np.linspace(0, indptr[-1], parts + 1)
+    bounds = np.searchsorted(indptr, targets, side='left')
+    bounds[0], bounds[-1] = 0, n
+    return np.unique(np.clip(bounds, 0, n))
+
+class ParallelMatvec:
+    """Sparse matrix wrapper whose out = M @ x runs row blocks on a thread pool"""
+
+    def __init__(self, M, workers=None, blocks_per_worker=4):
+        if not sparse.issparse(M) or M.format != 'csr':
+            M = sparse.csr_matrix(M) # Rows have to be contiguous to hand them out as blocks
+
+        self.M = M
+        self.shape = M.shape
+        self.dtype = M.dtype
+        self.workers = resolve_workers(workers)
+
+        # A few blocks per thread so one dense block doesn't leave the others idle
+        self.bounds = row_blocks(M.indptr, self.workers * blocks_per_worker)
+        self._pool = ThreadPoolExecutor(max_workers=self.workers)
+        # Without the C kernels every block is its own small matrix, sliced once here instead of every multiply
+        self._rows = None if _sparsetools is not None else {
+            start: M[start:end] for start, end in zip(self.bounds[:-1], self.bounds[1:])}
+
+    def _block(self, start, end, x, out):
+        M = self.M
+        part = out[start:end]
+        part.fill(0)
+
+        if _sparsetools is None:
+            part[:] = self._rows[start] @ x
+        elif x.ndim == 1:
+            _sparsetools.csr_matvec(end - start, M.shape[1], M.indptr[start:end + 1], M.indices, M.data, x, part)
+        else:
+            _sparsetools.csr_matvecs(end - start, M.shape[1], x.shape[1], M.indptr[start:end + 1], M.indices,
+                                     M.data, x.ravel(), part.ravel())
+
+    def matvec_into(self, x, out):
+        """out = M @ x, each block filling its own rows of out"""
+        x = np.ascontiguousarray(x, dtype=self.dtype)
+        futures = [self._pool.submit(self._block, start, end, x, out)
+                   for start, end in zip(self.bounds[:-1], self.bounds[1:])]
+        for future in futures:
+            future.result()
+        return out
+
+    def __matmul__(self, x):
+        out = np.empty((self.shape[0],) + np.shape(x)[1:], dtype=self.dtype)
+        return self.matvec_into(x, out)
+
+    def close(self):
+        self._pool.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,342 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl, unquote, urlsplit
+import numpy as np
+
+from cache import GraphFingerprint, ResultCache
+from graph_loader import compile_graph, load_edge_list
+from pagerank import pagerank
+from solvers import METHODS
+
+'''
+Runs the engine as a small local HTTP/JSON service instead of the input() menu, so scripts and pipelines can use it.
+Everything runs on one asyncio event loop, the slow parts (parsing uploads, ranking) go to a thread pool so the loop
+never blocks while a graph is being crunched (scipy lets go of the GIL in its kernels).
+
+    POST   /graphs?name=web&format=csv   upload an edge list (plain or gzipped), it gets compiled and kept in memory
+                                          (&compress=1 keeps it gap + varint compressed, 2-4.5 bytes a link)
+    GET    /graphs                       the resident graphs
+    DELETE /graphs/<name>                drop one
+    POST   /graphs/<name>/rank           {"d": 0.85, "max_iter": 100, "tol": 1e-6, "norm": "l1", "method": "power",
+                                          "dtype": "float64", "top": 20, "nodes": [...]} (GET with the same query
+                                          parameters works too)
+    GET    /health                       graph count, requests in flight and cache stats
+
+Identical rank requests that come in while the first one is still running all wait on that one computation, and
+finished results stay in a ResultCache keyed by the graph fingerprint. Listens on a TCP port (localhost by default)
+or a Unix socket.
+
+    python main.py serve --port 8765
+    python main.py serve --socket /tmp/pagerank.sock
+'''
+
+logger = logging.getLogger(__name__)
+
+MAX_UPLOAD_BYTES = 1 << 30
+RANK_DEFAULTS = {'d': 0.85, 'max_iter': 100, 'tol': 1e-6, 'norm': 'l1', 'method': 'power', 'dtype': 'float64'}
+RANK_CHOICES = {'norm': ('l1', 'linf'), 'method': tuple(METHODS), 'dtype': ('float32', 'float64')}
+REASONS = {200: 'OK', 201: 'Created', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+           413: 'Payload Too Large', 500: 'Internal Server Error'}
+
+class ServiceError(Exception):
+    """An error that goes back to the client as a JSON body with an HTTP status"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+def _plain(value):
+    """NumPy scalars to python ones so json can write them"""
+    return value.item() if isinstance(value, np.generic) else value
+
+def parse_edge_list(data, format='txt'):
+    """Parse an uploaded edge list (bytes, maybe gzipped) with the same loader the menu uses"""
+    suffix = {'csv': '.csv', 'tsv': '.tsv'}.get(format, '.txt')
+    handle, path = tempfile.mkstemp(suffix=suffix)
+    try:
+        with os.fdopen(handle, 'wb') as f:
+            f.write(data)
+        return load_edge_list(path)
+    finally:
+        os.remove(path)
+
+class RankingService:
+    """Resident graphs plus the request handlers, independent of the socket they're served on"""
+
+    def __init__(self, workers=2, cache=None):
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='pagerank')
+        self.cache = cache if cache is not None else ResultCache()
+        self.graphs = {} # name -> (compiled CSRGraph, fingerprint)
+        self.inflight = {} # cache key -> future every identical request waits on
+        self.coalesced = 0
+        self._next_id = 1
+
+    async def _run(self, function, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.pool, lambda: function(*args, **kwargs))
+
+    def _graph(self, name):
+        if name not in self.graphs:
+            raise ServiceError(404, f"No graph named '{name}'")
+        return self.graphs[name]
+
+    async def handle(self, method, path, query, body):
+        """Route one request, returns (status, JSON-able payload)"""
+        parts = [unquote(part) for part in path.strip('/').split('/') if part]
+
+        if parts == ['health']:
+            return 200, self.health()
+        if parts == ['graphs']:
+            if method == 'GET':
+                return 200, {'graphs': [self._describe(name) for name in self.graphs]}
+            if method == 'POST':
+                return 201, await self.upload(body, query.get('name'), query.get('format', 'txt'),
+                                              query.get('compress', '').lower() in ('1', 'true', 'yes'))
+        elif len(parts) == 2 and parts[0] == 'graphs':
+            if method == 'GET':
+                return 200, self._describe(parts[1])
+            if method == 'DELETE':
+                self._graph(parts[1])
+                del self.graphs[parts[1]]
+                return 200, {'deleted': parts[1]}
+        elif len(parts) == 3 and parts[0] == 'graphs' and parts[2] == 'rank':
+            if method in ('GET', 'POST'):
+                return 200, await self.rank(parts[1], self._rank_options(query, body))
+        else:
+            raise ServiceError(404, f"Nothing at {path}")
+
+        raise ServiceError(405, f"{method} is not supported on {path}")
+
+    def health(self):
+        return {'status': 'ok', 'graphs': len(self.graphs), 'inflight': len(self.inflight),
+                'coalesced': self.coalesced, 'cache': self.cache.stats()}
+
+    def _describe(self, name):
+        graph, graph_fingerprint = self._graph(name)
+        return {'name': name, 'nodes': graph.number_of_nodes(), 'edges': graph.number_of_edges(),
+                'fingerprint': graph_fingerprint.hexdigest()}
+
+    async def upload(self, body, name=None, format='txt', compress=False):
+        """Parse, compile and fingerprint an edge list on the pool, then keep it under name"""
+        if not body:
+            raise ServiceError(400, "Upload an edge list as the request body")
+
+        def build():
+            graph = compile_graph(parse_edge_list(body, format), compress=compress)
+            return graph, GraphFingerprint.of(graph)
+
+        try:
+            graph, graph_fingerprint = await self._run(build)
+        except ValueError as e:
+            raise ServiceError(400, f"Could not parse the edge list: {e}")
+
+        if name is None:
+            name = f"g{self._next_id}"
+            self._next_id += 1
+        self.graphs[name] = (graph, graph_fingerprint)
+        logger.info("Loaded graph '%s' (%d nodes, %d edges)", name, graph.number_of_nodes(), graph.number_of_edges())
+        return self._describe(name)
+
+    def _rank_options(self, query, body):
+        """Settings from the query string, overridden by a JSON body"""
+        options = dict(query)
+        if body:
+            try:
+                options.update(json.loads(body))
+            except (ValueError, TypeError) as e:
+                raise ServiceError(400, f"Request body is not valid JSON: {e}")
+
+        try:
+            settings = {
+                'd': float(options.get('d', RANK_DEFAULTS['d'])),
+                'max_iter': int(options.get('max_iter', RANK_DEFAULTS['max_iter'])),
+                'tol': float(options.get('tol', RANK_DEFAULTS['tol'])),
+                'norm': str(options.get('norm', RANK_DEFAULTS['norm'])),
+                'method': str(options.get('method', RANK_DEFAULTS['method'])),
+                'dtype': str(options.get('dtype', RANK_DEFAULTS['dtype'])),
+            }
+            top = options.get('top', 20)
+            top = None if top in (None, 'all') else int(top)
+        except (TypeError, ValueError) as e:
+            raise ServiceError(400, f"Bad rank setting: {e}")
+
+        if not 0 <= settings['d'] < 1:
+            raise ServiceError(400, "Damping factor must be between 0 and 1")
+        for setting, choices in RANK_CHOICES.items():
+            if settings[setting] not in choices:
+                raise ServiceError(400, f"Unknown {setting} '{settings[setting]}', use one of: {', '.join(choices)}")
+
+        nodes = options.get('nodes', [])
+        if isinstance(nodes, str):
+            nodes = nodes.split(',')
+        return settings, top, nodes
+
+    async def rank(self, name, options):
+        settings, top, nodes = options
+        graph, graph_fingerprint = self._graph(name)
+        scores = await self.scores(graph, graph_fingerprint, settings)
+
+        result = {'graph': name, 'nodes': len(scores), 'iterations': scores.iterations,
+                  'residual': float(scores.residual), 'converged': bool(scores.converged)}
+        ranked = scores.top_k(len(scores) if top is None else top)
+        result['top'] = [[_plain(node), float(score)] for node, score in ranked]
+        if nodes:
+            result['scores'] = {str(node): self._lookup(scores, node) for node in nodes}
+        return result
+
+    @staticmethod
+    def _lookup(scores, node):
+        """Score of one node, letting "42" find the node 42 since query strings only carry text"""
+        for candidate in (node, str(node)) + ((int(node),) if str(node).lstrip('-').isdigit() else ()):
+            try:
+                return float(scores[candidate])
+            except KeyError:
+                continue
+        return None
+
+    async def scores(self, graph, graph_fingerprint, settings):
+        """Cached result, or a share of the computation already running for the same key, or a fresh one"""
+        key = self.cache.key(graph_fingerprint, **settings)
+
+        scores = self.cache.get(key)
+        if scores is not None:
+            return scores
+
+        running = self.inflight.get(key)
+        if running is not None:
+            self.coalesced += 1
+            return await self._share(running)
+
+        running = asyncio.ensure_future(self._run(pagerank, graph, log_level=logging.DEBUG, **settings))
+        self.inflight[key] = running
+        try:
+            scores = await self._share(running)
+        finally:
+            self.inflight.pop(key, None)
+
+        self.cache.put(key, scores)
+        return scores
+
+    @staticmethod
+    async def _share(running):
+        """Wait on a ranking every identical request shares, bad settings are a 400 for each of them"""
+        try:
+            return await asyncio.shield(running) # One impatient client hanging up doesn't cancel it for the rest
+        except ValueError as e:
+            raise ServiceError(400, str(e))
+
+    def close(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+async def _read_request(reader):
+    """Read one HTTP/1.1 request, returns None when the client closed the connection"""
+    request_line = await reader.readline()
+    if not request_line.strip():
+        return None
+
+    try:
+        method, target, _ = request_line.decode('latin-1').split()
+    except ValueError:
+        raise ServiceError(400, "Malformed request line")
+
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        key, _, value = line.decode('latin-1').partition(':')
+        headers[key.strip().lower()] = value.strip()
+
+    length = int(headers.get('content-length', 0) or 0)
+    if length > MAX_UPLOAD_BYTES:
+        raise ServiceError(413, f"Request bodies are capped at {MAX_UPLOAD_BYTES} bytes")
+    body = await reader.readexactly(length) if length else b''
+
+    url = urlsplit(target)
+    return method.upper(), url.path, dict(parse_qsl(url.query)), headers, body
+
+def _response(status, payload, keep_alive):
+    body = json.dumps(payload).encode('utf-8')
+    head = (f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+    return head.encode('latin-1') + body
+
+def connection_handler(service):
+    """asyncio stream callback serving HTTP requests on one connection until the client is done"""
+
+    async def serve(reader, writer):
+        try:
+            while True:
+                keep_alive = False
+                try:
+                    request = await _read_request(reader)
+                    if request is None:
+                        break
+                    method, path, query, headers, body = request
+                    keep_alive = headers.get('connection', '').lower() != 'close'
+                    status, payload = await service.handle(method, path, query, body)
+                except ServiceError as e:
+                    status, payload = e.status, {'error': str(e)}
+                except asyncio.IncompleteReadError:
+                    break
+                except Exception as e:
+                    logger.exception("Request failed")
+                    status, payload = 500, {'error': str(e)}
+
+                writer.write(_response(status, payload, keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    return serve
+
+async def start_server(service, host='127.0.0.1', port=8765, socket_path=None):
+    """Start listening (port 0 picks a free one), returns the asyncio server"""
+    handler = connection_handler(service)
+    if socket_path is not None:
+        return await asyncio.start_unix_server(handler, path=socket_path)
+    return await asyncio.start_server(handler, host, port)
+
+async def serve(host='127.0.0.1', port=8765, socket_path=None, workers=2, preload=()):
+    service = RankingService(workers=workers)
+    for path in preload:
+        with open(path, 'rb') as f:
+            name = os.path.basename(path).split('.')[0]
+            format = 'csv' if '.csv' in path.lower() else 'tsv' if '.tsv' in path.lower() else 'txt'
+            await service.upload(f.read(), name, format)
+
+    server = await start_server(service, host, port, socket_path)
+    where = socket_path or "http://%s:%d" % server.sockets[0].getsockname()[:2]
+    logger.info("PageRank service listening on %s (%d workers)", where, workers)
+
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        service.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='main.py serve', description="Serve PageRank over a local HTTP/JSON API")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--socket', help="Listen on this Unix socket instead of a TCP port")
+    parser.add_argument('--workers', type=int, default=2, help="Threads computing rankings")
+    parser.add_argument('--load', nargs='*', default=[], help="Edge list files to load at startup (named after the file)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    try:
+        asyncio.run(serve(args.host, args.port, args.socket, args.workers, args.load))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,381 @@
+import inspect
+import logging
+import time
+import numpy as np
+from scipy import sparse
+from scipy.sparse import csgraph
+from scipy.sparse.linalg import LinearOperator, bicgstab, gmres, spsolve, spsolve_triangular
+
+from pagerank import graph_matrix, damp, matvec_into, power_iteration, residual_norm
+from parallel import row_blocks
+
+'''
+Every method here solves the same thing as pagerank()'s power iteration, x = baseRank + d*M @ x (with d already
+folded into the vote matrix), which is the linear system (I - d*M) x = baseRank. They all return the same
+(scores, residuals, converged) triple so pagerank(method=...) can swap them freely.
+
+'power'         plain power (Jacobi) iteration
+'gauss-seidel'  forward sweeps over blocks of rows, each block uses the new scores of the blocks before it
+'aitken'        power iteration with componentwise Aitken delta-squared extrapolation every few steps
+'quadratic'     power iteration with quadratic extrapolation (Kamvar et al.) every few steps
+'gmres'         scipy's GMRES on the linear system
+'bicgstab'      scipy's BiCGSTAB on the linear system
+'scc'           splits the graph into strongly connected components and solves them one at a time in link order,
+                small and acyclic stretches directly in one pass, only the big components get power iterated
+
+The extrapolations and the Krylov solvers pay off most at high damping (d >= 0.95) where power iteration crawls.
+'scc' pays off on graphs with lots of DAG structure (chains, trees, the IN/OUT sides of a web crawl).
+'''
+
+logger = logging.getLogger(__name__)
+
+def _explicit_matrix(voteMatrix):
+    """The plain sparse matrix behind an operator (the threaded wrapper keeps it in .M, compressed ones decode)"""
+    voteMatrix = getattr(voteMatrix, 'M', voteMatrix)
+    return voteMatrix.tocsr() if hasattr(voteMatrix, 'tocsr') else sparse.csr_matrix(voteMatrix)
+
+GS_BLOCKS = 64 # Row blocks per Gauss-Seidel sweep, enough to get nearly all of the speed-up over power iteration
+
+def gauss_seidel(voteMatrix, baseRank, scoreMatrix, max_iter=100, tol=1e-6, norm='l1', callback=None):
+    """Block Gauss-Seidel sweeps: x[block] = baseRank[block] + M[block] @ x, using the earlier blocks' new scores
+
+    A row by row sweep is a triangular solve, and scipy's loops over the rows in Python on every call. Going a block
+    of rows at a time is one compiled matvec per block, so a sweep costs about the same as a power step while
+    converging nearly as fast as the row by row one (the rows inside a block still see each other's old scores).
+    """
+    M = _explicit_matrix(voteMatrix)
+    n = M.shape[0]
+    bounds = row_blocks(M.indptr, GS_BLOCKS)
+
+    # Views onto the rows of each block, cut once instead of slicing the matrix every sweep
+    blocks = []
+    for lo, hi in zip(bounds[:-1], bounds[1:]):
+        first, last = M.indptr[lo], M.indptr[hi]
+        rows = sparse.csr_matrix((M.data[first:last], M.indices[first:last], M.indptr[lo:hi + 1] - first),
+                                 shape=(hi - lo, n))
+        blocks.append((lo, hi, rows))
+    base = np.broadcast_to(baseRank, (n,))
+
+    scoreMatrix = np.array(scoreMatrix, dtype=np.float64)
+    nextScores = scoreMatrix.copy()
+    rhs = np.empty(n)
+    diff = np.empty(n)
+    residuals = []
+    converged = False
+    started = time.perf_counter()
+
+    for i in range(max_iter):
+        for lo, hi, rows in blocks:
+            matvec_into(rows, nextScores, rhs[lo:hi]) # nextScores has the new scores up to lo, the old ones after
+            np.add(rhs[lo:hi], base[lo:hi], out=nextScores[lo:hi])
+
+        np.subtract(nextScores, scoreMatrix, out=diff)
+        residuals.append(residual_norm(diff, norm))
+        scoreMatrix[:] = nextScores # The next sweep updates nextScores in place, keep this one to compare with
+
+        if callback is not None:
+            callback(i + 1, residuals[-1], time.perf_counter() - started)
+
+        if residuals[-1] <= tol:
+            converged = True
+            break
+
+    return scoreMatrix, residuals, converged
+
+def _aitken(history):
+    """Componentwise Aitken delta-squared from the last three iterates"""
+    x0, x1, x2 = history[-3:]
+    step = x2 - x1
+    bend = step - (x1 - x0)
+    safe = np.abs(bend) > 1e-14 * np.maximum(np.abs(x2), 1e-300)
+
+    extrapolated = x2.copy()
+    extrapolated[safe] = x2[safe] - step[safe] ** 2 / bend[safe]
+    return extrapolated
+
+def _quadratic(history):
+    """Quadratic extrapolation from the last four iterates (Kamvar, Haveliwala, Manning & Golub 2003)"""
+    x0, x1, x2, x3 = history[-4:]
+    y1, y2, y3 = x1 - x0, x2 - x0, x3 - x0
+
+    gamma, *_ = np.linalg.lstsq(np.column_stack([y1, y2]), -y3, rcond=None)
+    g1, g2, g3 = gamma[0], gamma[1], 1.0
+
+    beta0, beta1, beta2 = g1 + g2 + g3, g2 + g3, g3
+    total = beta0 + beta1 + beta2
+    if not np.isfinite(total) or abs(total) < 1e-12:
+        return x3
+    return (beta0 * x1 + beta1 * x2 + beta2 * x3) / total
+
+def extrapolated_iteration(voteMatrix, baseRank, scoreMatrix, max_iter=100, tol=1e-6, norm='l1', kind='quadratic', every=10,
+                           callback=None):
+    """Power iteration that jumps ahead with Aitken or quadratic extrapolation every `every` steps"""
+    extrapolate = {'aitken': (_aitken, 3), 'quadratic': (_quadratic, 4)}
+    if kind not in extrapolate:
+        raise ValueError(f"Unknown extrapolation '{kind}', use 'aitken' or 'quadratic'")
+    jump, needed = extrapolate[kind]
+
+    scoreMatrix = np.array(scoreMatrix, dtype=np.float64)
+    nextScores = np.empty_like(scoreMatrix)
+    diff = np.empty_like(scoreMatrix)
+    history = []
+    residuals = []
+    converged = False
+    started = time.perf_counter()
+
+    for i in range(max_iter):
+        matvec_into(voteMatrix, scoreMatrix, nextScores)
+        nextScores += baseRank
+
+        np.subtract(nextScores, scoreMatrix, out=diff)
+        residuals.append(residual_norm(diff, norm))
+        scoreMatrix, nextScores = nextScores, scoreMatrix
+
+        if callback is not None:
+            callback(i + 1, residuals[-1], time.perf_counter() - started)
+
+        if residuals[-1] <= tol:
+            converged = True
+            break
+
+        history.append(scoreMatrix.copy())
+        del history[:-needed]
+
+        if (i + 1) % every == 0 and len(history) == needed:
+            jumped = jump(history)
+            if np.all(np.isfinite(jumped)):
+                scoreMatrix[:] = jumped
+            history = []
+
+    return scoreMatrix, residuals, converged
+
+def _relative_tolerance(solver):
+    """Keyword for scipy's relative tolerance, rtol= since scipy 1.12 and tol= before that"""
+    return 'rtol' if 'rtol' in inspect.signature(solver).parameters else 'tol'
+
+def krylov_solve(voteMatrix, baseRank, scoreMatrix, max_iter=100, tol=1e-6, norm='l1', solver='gmres', restart=30,
+                 callback=None):
+    """Solve (I - d*M) x = baseRank with GMRES or BiCGSTAB
+
+    The residual history holds scipy's (2-norm) residual estimates per inner step, the final residual is
+    measured the same way as the other methods: the size of one more power step from the answer.
+    """
+    n = len(scoreMatrix)
+    product = np.empty(n)
+
+    def system(x):
+        matvec_into(voteMatrix, np.ascontiguousarray(x, dtype=np.float64), product)
+        return x - product
+
+    A = LinearOperator((n, n), matvec=system, dtype=np.float64)
+    b = np.broadcast_to(baseRank, (n,)).astype(np.float64)
+
+    # scipy stops on the 2-norm, pick one that guarantees our norm gets below tol too
+    atol = tol / np.sqrt(n) if norm == 'l1' else tol
+    history = []
+    started = time.perf_counter()
+
+    def record(residual):
+        history.append(residual)
+        if callback is not None:
+            callback(len(history), residual, time.perf_counter() - started)
+
+    if solver == 'gmres':
+        # scipy's maxiter counts restart cycles, not inner steps, so run the cycles one at a time and make the last
+        # one short enough that max_iter inner steps is really the cap
+        x, info = scoreMatrix, 1
+        b_norm = float(np.linalg.norm(b))
+        while info != 0 and len(history) < max_iter:
+            done = len(history)
+            x, info = gmres(A, b, x0=x, atol=atol, restart=min(restart, max_iter - done), maxiter=1,
+                            callback=lambda pr_norm: record(float(pr_norm) * b_norm), callback_type='pr_norm',
+                            **{_relative_tolerance(gmres): 0.0})
+            if len(history) == done: # No inner step happened, another cycle won't do any better
+                break
+    elif solver == 'bicgstab':
+        x, info = bicgstab(A, b, x0=scoreMatrix, atol=atol, maxiter=max_iter,
+                           callback=lambda xk: record(float(np.linalg.norm(b - A @ xk))),
+                           **{_relative_tolerance(bicgstab): 0.0})
+    else:
+        raise ValueError(f"Unknown Krylov solver '{solver}', use 'gmres' or 'bicgstab'")
+
+    diff = b - system(x)
+    final = residual_norm(diff, norm)
+    if history:
+        history[-1] = final
+    else:
+        history.append(final)
+
+    if info != 0 and final > tol and len(history) < max_iter:
+        # BiCGSTAB can break down (on acyclic graphs for example), power iteration finishes the job from where it got
+        done, spent = len(history), time.perf_counter() - started
+        more_callback = None if callback is None else lambda i, r, t: callback(done + i, r, spent + t)
+        x, more, converged = power_iteration(voteMatrix, baseRank, np.array(x, dtype=np.float64),
+                                             max_iter - len(history), tol, norm, callback=more_callback)
+        return x, history + more, converged
+
+    return x, history, info == 0 or final <= tol
+
+def condensation(voteMatrix):
+    """Strongly connected component of every node, numbered so a component only gets votes from lower numbered ones
+
+    Returns (count, labels).
+    """
+    M = _explicit_matrix(voteMatrix)
+    if not M.has_canonical_format: # scipy's strong components never finish on a matrix with repeated links
+        M = M.copy()
+        M.sum_duplicates()
+    count, labels = csgraph.connected_components(M, directed=True, connection='strong')
+
+    voter, voted = labels[M.indices], np.repeat(labels, np.diff(M.indptr)) # Column j votes for row i: link j -> i
+    across = voter != voted
+    voter, voted = voter[across], voted[across]
+    if np.all(voter < voted): # scipy finishes the components from the sources down, which is already link order
+        return count, labels
+
+    # Otherwise sort the component DAG ourselves (Kahn's algorithm, a whole frontier at a time)
+    dag = sparse.csr_matrix((np.ones(len(voter), dtype=np.int8), (voter, voted)), shape=(count, count))
+    dag.sum_duplicates()
+    indegree = np.diff(dag.tocsc().indptr)
+    position = np.empty(count, dtype=np.int64)
+    frontier = np.flatnonzero(indegree == 0)
+    placed = 0
+    while len(frontier):
+        position[frontier] = np.arange(placed, placed + len(frontier))
+        placed += len(frontier)
+        successors = dag[frontier].indices
+        np.subtract.at(indegree, successors, 1)
+        frontier = np.unique(successors[indegree[successors] == 0])
+    return count, position[labels]
+
+def scc_solve(voteMatrix, baseRank, scoreMatrix, max_iter=100, tol=1e-6, norm='l1', callback=None, direct_size=32):
+    """Solve the strongly connected components in link order, each one only needs the finished scores before it
+
+    With the nodes sorted by component the system is block lower triangular. Stretches of components with at most
+    direct_size nodes are solved exactly in one go (a triangular solve when they're all single nodes, a sparse LU
+    otherwise). Bigger components get power iteration on just their own block, with the votes coming in from
+    earlier components added to the base rank. Their residuals (and the callback) are per block iteration, and each
+    block stops at its share of tol, so the scores match iterating the whole graph to the same tol.
+    """
+    M = getattr(voteMatrix, 'M', voteMatrix) # Our own copy, so parallel links can be added up in place
+    M = M.tocsr(copy=True).astype(np.float64, copy=False) if hasattr(M, 'tocsr') else sparse.csr_matrix(M)
+    M.sum_duplicates()
+    n = M.shape[0]
+    count, labels = condensation(M)
+
+    order = np.argsort(labels, kind='stable') # Every component becomes one contiguous range of positions
+    position = np.empty(n, dtype=M.indices.dtype)
+    position[order] = np.arange(n)
+    M = M[order] # Rows in the new order, then the column indices renamed the same way
+    M.indices = position[M.indices]
+    M.has_sorted_indices = False
+
+    sizes = np.bincount(labels, minlength=count)
+    bounds = np.concatenate(([0], np.cumsum(sizes)))
+    base = np.broadcast_to(np.asarray(baseRank, dtype=np.float64), (n,))[order]
+    start = np.asarray(scoreMatrix, dtype=np.float64)[order]
+
+    x = np.zeros(n) # Filled in component by component, everything not solved yet is still 0
+    residuals = []
+    converged = True
+    work = 0 # Stored links touched, to compare with len(residuals) * M.nnz for iterating the whole graph
+    started = time.perf_counter()
+
+    def progress(iteration, residual, elapsed):
+        if callback is not None:
+            callback(len(residuals) + iteration, residual, time.perf_counter() - started)
+
+    def direct(lo, hi):
+        rows = M[lo:hi]
+        rhs = base[lo:hi] + rows @ x if lo else base[lo:hi].copy() # Nothing before the first one to get votes from
+        block = (sparse.identity(hi - lo, format='csr') - rows[:, lo:hi]).tocsr()
+        if labels[order[hi - 1]] - labels[order[lo]] + 1 == hi - lo: # All single nodes, so plain lower triangular
+            diagonal = block.diagonal() # 1 minus the self link, if there is one
+            if np.any(diagonal != 1): # Divide it out ourselves, scipy does it with a whole sparse matrix product
+                block.data /= np.repeat(diagonal, np.diff(block.indptr))
+                rhs /= diagonal
+            x[lo:hi] = spsolve_triangular(block, rhs, lower=True, unit_diagonal=True, overwrite_A=True,
+                                          overwrite_b=True)
+        else:
+            x[lo:hi] = spsolve(block.tocsc(), rhs, permc_spec='NATURAL') # Already block triangular, keep that order
+        return rows.nnz
+
+    def iterate(lo, hi):
+        nonlocal converged
+        rows = M[lo:hi]
+        inflow = base[lo:hi] + rows @ x
+        block = rows[:, lo:hi].tocsr()
+        share = tol * (hi - lo) / n if norm == 'l1' else tol
+        x[lo:hi], blockResiduals, blockConverged = power_iteration(block, inflow, start[lo:hi].copy(), max_iter,
+                                                                    share, norm, callback=progress)
+        residuals.extend(blockResiduals)
+        converged = converged and blockConverged
+        return rows.nnz + block.nnz * len(blockResiduals)
+
+    done = 0
+    big = np.flatnonzero(sizes > direct_size)
+    for c in big:
+        lo, hi = bounds[c], bounds[c + 1]
+        if done < lo:
+            work += direct(done, lo)
+        work += iterate(lo, hi)
+        done = hi
+    if done < n:
+        work += direct(done, n)
+
+    if not residuals: # Nothing needed iterating, one exact pass did it
+        residuals.append(0.0)
+        if callback is not None:
+            callback(1, 0.0, time.perf_counter() - started)
+
+    logger.debug("%d components, %d iterated (%d of %d nodes), work of %.1f full iterations", count, len(big),
+                 sizes[big].sum(), n, work / max(M.nnz, 1))
+
+    scores = np.empty(n)
+    scores[order] = x
+    return scores, residuals, converged
+
+METHODS = {
+    'power': power_iteration,
+    'gauss-seidel': gauss_seidel,
+    'aitken': lambda *args, **kwargs: extrapolated_iteration(*args, kind='aitken', **kwargs),
+    'quadratic': lambda *args, **kwargs: extrapolated_iteration(*args, kind='quadratic', **kwargs),
+    'gmres': lambda *args, **kwargs: krylov_solve(*args, solver='gmres', **kwargs),
+    'bicgstab': lambda *args, **kwargs: krylov_solve(*args, solver='bicgstab', **kwargs),
+    'scc': scc_solve,
+}
+
+def solve(voteMatrix, baseRank, scoreMatrix, max_iter=100, tol=1e-6, norm='l1', method='power', callback=None):
+    """Run any of the METHODS on the damped vote matrix, they all return (scores, residuals, converged)"""
+    if method not in METHODS:
+        raise ValueError(f"Unknown method '{method}', pick one of: {', '.join(METHODS)}")
+    return METHODS[method](voteMatrix, baseRank, scoreMatrix, max_iter, tol, norm, callback=callback)
+
+def compare_methods(g, methods=None, d=0.85, tol=1e-6, max_iter=1000, norm='l1'):
+    """Run every method on the same graph and report iterations, wall time and agreement with the first one (power)"""
+    all_nodes, voteMatrix = graph_matrix(g)
+    n = len(all_nodes)
+    if not n:
+        return []
+
+    voteMatrix = damp(voteMatrix, d)
+    baseRank = (1 - d) / n
+
+    rows = []
+    reference = None
+    for method in methods or list(METHODS):
+        started = time.perf_counter()
+        scores, residuals, converged = solve(voteMatrix, baseRank, np.ones(n) / n, max_iter, tol, norm, method)
+        seconds = time.perf_counter() - started
+
+        if reference is None:
+            reference = scores
+        rows.append({
+            'method': method,
+            'iterations': len(residuals),
+            'seconds': seconds,
+            'residual': residuals[-1] if residuals else 0.0,
+            'converged': converged,
+            'max_difference': float(np.max(np.abs(scores - reference))),
+        })
+    return rows
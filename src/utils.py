@@ -1,15 +1,24 @@
 import numpy as np
 import math
+import time
 import colorsys
 
-def calculate_layout(graph, canvas_width=800, canvas_height=600):
-    """Calculate node positions using a circular layout"""
+from pagerank import top_positions
+
+def calculate_layout(graph, canvas_width=800, canvas_height=600, method='circular', previous=None, iterations=100,
+                     time_budget_ms=None, seed=0):
+    """Calculate node positions using a circular or force-directed ('force') layout"""
     nodes = list(graph.nodes())
     n = len(nodes)
     
     if n == 0:
         return {}
     
+    if method == 'force':
+        return force_layout(graph, canvas_width, canvas_height, previous, iterations, time_budget_ms, seed)
+    if method != 'circular':
+        raise ValueError(f"Unknown layout '{method}', use 'circular' or 'force'")
+    
     # Calculate center and radius
     center_x = canvas_width // 2
     center_y = canvas_height // 2
@@ -28,6 +37,152 @@ def calculate_layout(graph, canvas_width=800, canvas_height=600):
     
     return positions
 
+# Children of the parent cell's 3x3 neighbourhood, relative to 2 * parent (the quadtree interaction list)
+_CHILD_OFFSETS = np.stack(np.meshgrid(np.arange(-2, 4), np.arange(-2, 4), indexing='ij'), axis=-1).reshape(-1, 2)
+_NEIGHBOUR_OFFSETS = np.stack(np.meshgrid(np.arange(-1, 2), np.arange(-1, 2), indexing='ij'), axis=-1).reshape(-1, 2)
+
+def _grid_cells(pos, lo, size, level):
+    """Cell (x, y) of every node on the 2**level x 2**level grid over the bounding square"""
+    cells = 1 << level
+    cell = np.clip(((pos - lo) * (cells / size)).astype(np.int64), 0, cells - 1)
+    return cell, cells
+
+def _push(force, rows, dx, dy, strength):
+    """force[rows] += strength * (dx, dy), summing repeated rows"""
+    n = len(force)
+    force[:, 0] += np.bincount(rows, weights=strength * dx, minlength=n)
+    force[:, 1] += np.bincount(rows, weights=strength * dy, minlength=n)
+
+def _repulsion(pos, k2):
+    """Repulsive forces k^2 / distance between all nodes, with far away groups lumped together per quadtree cell
+
+    Every level of the quadtree covers the cells that are too far to be neighbours but whose parents were neighbours.
+    Those cell pairs interact through their centres of mass, and each node gets its cell's far field corrected to first
+    order for where it sits inside the cell. Only the nearest cells at the finest level are done node by node, so a
+    step costs O(n log n) instead of O(n^2).
+    """
+    n = len(pos)
+    force = np.zeros_like(pos)
+    lo = pos.min(axis=0)
+    size = max(float((pos.max(axis=0) - lo).max()), 1e-9) * (1 + 1e-9)
+    depth = int(np.clip(np.ceil(np.log(max(n / 4, 1)) / np.log(4)), 1, 10)) # About 4 nodes per finest cell
+    eps = 1e-6 * k2
+    
+    for level in range(2, depth + 1):
+        cell, cells = _grid_cells(pos, lo, size, level)
+        occupied, inverse, mass = np.unique(cell[:, 0] * cells + cell[:, 1], return_inverse=True, return_counts=True)
+        m = len(occupied)
+        com = np.stack([np.bincount(inverse, weights=pos[:, 0], minlength=m),
+                        np.bincount(inverse, weights=pos[:, 1], minlength=m)], axis=1) / mass[:, None]
+        
+        slot = np.full(cells * cells, -1, dtype=np.int64)
+        slot[occupied] = np.arange(m)
+        home = np.stack([occupied // cells, occupied % cells], axis=1)
+        
+        target = (home // 2 * 2)[:, None, :] + _CHILD_OFFSETS # (m, 36, 2)
+        far = (np.all((target >= 0) & (target < cells), axis=2) &
+               np.any(np.abs(target - home[:, None, :]) > 1, axis=2))
+        rows, slots = np.nonzero(far)
+        other = slot[target[rows, slots, 0] * cells + target[rows, slots, 1]]
+        rows, other = rows[other >= 0], other[other >= 0]
+        
+        rx = com[rows, 0] - com[other, 0]
+        ry = com[rows, 1] - com[other, 1]
+        r2 = rx * rx + ry * ry + eps
+        w = k2 * mass[other] / r2
+        
+        # Field at each cell's centre of mass and its derivative, to shift it to the nodes inside
+        fx = np.bincount(rows, weights=w * rx, minlength=m)
+        fy = np.bincount(rows, weights=w * ry, minlength=m)
+        jxx = np.bincount(rows, weights=w * (1 - 2 * rx * rx / r2), minlength=m)
+        jxy = np.bincount(rows, weights=w * (-2 * rx * ry / r2), minlength=m)
+        jyy = np.bincount(rows, weights=w * (1 - 2 * ry * ry / r2), minlength=m)
+        
+        offset = pos - com[inverse]
+        force[:, 0] += fx[inverse] + jxx[inverse] * offset[:, 0] + jxy[inverse] * offset[:, 1]
+        force[:, 1] += fy[inverse] + jxy[inverse] * offset[:, 0] + jyy[inverse] * offset[:, 1]
+    
+    # Nearest cells node by node
+    cell, cells = _grid_cells(pos, lo, size, depth)
+    flat = cell[:, 0] * cells + cell[:, 1]
+    order = np.argsort(flat, kind='stable')
+    counts = np.bincount(flat, minlength=cells * cells)
+    starts = np.cumsum(counts) - counts
+    
+    for offset in _NEIGHBOUR_OFFSETS:
+        neighbour = cell + offset
+        rows = np.flatnonzero(np.all((neighbour >= 0) & (neighbour < cells), axis=1))
+        neighbour = neighbour[rows, 0] * cells + neighbour[rows, 1]
+        c = counts[neighbour]
+        
+        i = np.repeat(rows, c)
+        j = order[np.repeat(starts[neighbour] - (np.cumsum(c) - c), c) + np.arange(c.sum())]
+        other = i != j
+        i, j = i[other], j[other]
+        
+        dx = pos[i, 0] - pos[j, 0]
+        dy = pos[i, 1] - pos[j, 1]
+        _push(force, i, dx, dy, k2 / (dx * dx + dy * dy + eps))
+    
+    return force
+
+def force_layout(graph, canvas_width=800, canvas_height=600, previous=None, iterations=100, time_budget_ms=None, seed=0):
+    """Fruchterman-Reingold style spring layout, vectorized over all nodes and edges with NumPy
+    
+    'previous' (node -> (x, y) from an earlier layout) warm starts it so an updated graph keeps its shape, with
+    iterations=0 it just fits the previous layout to the new canvas. 'time_budget_ms' stops early to stay interactive.
+    """
+    started = time.perf_counter()
+    nodes = list(graph.nodes())
+    n = len(nodes)
+    index = {node: i for i, node in enumerate(nodes)}
+    edges = np.array([(index[u], index[v]) for u, v in graph.edges() if u != v], dtype=np.int64).reshape(-1, 2)
+    
+    rng = np.random.default_rng(seed)
+    pos = rng.random((n, 2))
+    temperature = 0.1
+    
+    if previous:
+        known = np.array([node in previous for node in nodes])
+        if known.any():
+            old = np.array([previous[node] for node in nodes if node in previous], dtype=float)
+            lo, size = old.min(axis=0), max(float((old.max(axis=0) - old.min(axis=0)).max()), 1e-9)
+            pos[known] = (old - lo) / size
+            temperature = 0.02 # Only settle things, don't shake the old layout up
+    
+    k = math.sqrt(1.0 / n) # Ideal edge length when the layout fills a unit square
+    gravity = 0.5 # Keeps disconnected parts from drifting off
+    
+    for step in range(iterations if n > 1 else 0):
+        force = _repulsion(pos, k * k)
+        
+        if len(edges): # Springs pull linked nodes together with d^2 / k
+            src, dst = edges[:, 0], edges[:, 1]
+            dx = pos[src, 0] - pos[dst, 0]
+            dy = pos[src, 1] - pos[dst, 1]
+            pull = np.sqrt(dx * dx + dy * dy) / k
+            _push(force, src, dx, dy, -pull)
+            _push(force, dst, dx, dy, pull)
+        
+        force -= gravity * (pos - pos.mean(axis=0))
+        
+        # Move every node along its force, but no further than the temperature allows
+        length = np.maximum(np.hypot(force[:, 0], force[:, 1]), 1e-12)
+        pos += force * (np.minimum(length, temperature) / length)[:, None]
+        temperature *= 0.95
+        
+        if time_budget_ms is not None and (time.perf_counter() - started) * 1000 >= time_budget_ms:
+            break
+    
+    # Fit the layout to the canvas, leaving room for the biggest node circles
+    padding = 50
+    lo, hi = pos.min(axis=0), pos.max(axis=0)
+    span = np.maximum(hi - lo, 1e-9)
+    scale = min((canvas_width - 2 * padding) / span[0], (canvas_height - 2 * padding) / span[1])
+    pos = (pos - (lo + hi) / 2) * scale + (canvas_width / 2, canvas_height / 2)
+    
+    return {node: (x, y) for node, (x, y) in zip(nodes, pos.tolist())}
+
 def get_node_color(score, max_score, min_score):
     """Generate color based on PageRank score"""
     if max_score == min_score:
@@ -55,32 +210,131 @@ def get_node_size(score, max_score, min_score):
     max_size = 80
     return min_size + (max_size - min_size) * normalized_score
 
-def format_scores_for_display(scores, precision=4):
+def top_scores(scores, k):
+    """The k best (node, score) pairs, without sorting every node when the scores know how to do top_k"""
+    if hasattr(scores, 'top_k'):
+        return scores.top_k(k)
+    return sorted(scores.items(), key=lambda x: x[1], reverse=True)[:k]
+
+def format_scores_for_display(scores, precision=4, top=20):
     """Format PageRank scores for display"""
-    sorted_scores = sorted(scores.items(), key=lambda x: x[1], reverse=True)
+    sorted_scores = top_scores(scores, top)
     info_text = "PageRank Scores (Ranked): "
-    for i, (node, score) in enumerate(sorted_scores):
-        info_text += f"{node}: {score:.{precision}f}"
-        if i < len(sorted_scores) - 1:
-            info_text += " | "
+    info_text += " | ".join(f"{node}: {score:.{precision}f}" for node, score in sorted_scores)
+    if len(scores) > len(sorted_scores):
+        info_text += f" | ... ({len(scores) - len(sorted_scores)} more)"
     return info_text
 
-def print_pagerank_results(scores):
+def print_pagerank_results(scores, top=20):
     """Print PageRank results in a formatted way"""
     print("\n" + "="*50)
     print("PAGERANK RESULTS")
     print("="*50)
     
-    sorted_scores = sorted(scores.items(), key=lambda x: x[1], reverse=True)
+    sorted_scores = top_scores(scores, top)
     
     print(f"{'Rank':<6} {'Node':<8} {'Score':<12} {'Percentage':<12}")
     print("-" * 48)
     
-    total_score = sum(scores.values())
+    total_score = scores.total() if hasattr(scores, 'total') else sum(scores.values())
     for i, (node, score) in enumerate(sorted_scores, 1):
         percentage = (score / total_score) * 100
         print(f"{i:<6} {node:<8} {score:<12.6f} {percentage:<11.2f}%")
     
+    if len(scores) > len(sorted_scores):
+        print(f"... and {len(scores) - len(sorted_scores)} more nodes")
+    
     print("-" * 48)
     print(f"Total: {total_score:.6f}")
     print("="*50)
+
+def print_confidence_intervals(scores, top=20):
+    """Print the top nodes of montecarlo.monte_carlo_pagerank with their confidence intervals"""
+    print("\n" + "="*60)
+    print(f"MONTE CARLO PAGERANK ({scores.confidence:.0%} intervals)")
+    print("="*60)
+    print(f"{'Rank':<6} {'Node':<8} {'Score':<12} {'Interval':<26}")
+    print("-" * 60)
+    for i, node in enumerate(scores.top_indices(top), 1):
+        interval = f"[{scores.lower[node]:.6f}, {scores.upper[node]:.6f}]"
+        print(f"{i:<6} {scores.nodes[node]:<8} {scores.scores[node]:<12.6f} {interval:<26}")
+    print("-" * 60)
+    walk_stats = scores.walk_stats
+    stop = ", stopped early" if walk_stats.get('stopped_early') else ""
+    print(f"{walk_stats.get('walks_per_node', 0)} walks per page in {walk_stats.get('batches', 0)} batches{stop}, "
+          f"widest interval ±{scores.half_width():.2e}")
+    print("="*60)
+
+def print_convergence_info(scores):
+    """Print how many iterations PageRank needed and how close it got"""
+    iterations = getattr(scores, 'iterations', None)
+    if iterations is None:
+        return
+    
+    status = "converged" if scores.converged else "did not converge"
+    print(f"Iterations used: {iterations} ({status}, final residual {scores.residual:.2e})")
+
+def print_method_comparison(rows):
+    """Print the solver comparison from solvers.compare_methods"""
+    print("\n" + "="*70)
+    print("SOLVER COMPARISON")
+    print("="*70)
+    print(f"{'Method':<14} {'Iterations':<12} {'Time (s)':<12} {'Residual':<12} {'Max Diff':<12}")
+    print("-" * 70)
+    
+    for row in rows:
+        flag = "" if row['converged'] else " (no convergence)"
+        print(f"{row['method']:<14} {row['iterations']:<12} {row['seconds']:<12.4f} "
+              f"{row['residual']:<12.2e} {row['max_difference']:<12.2e}{flag}")
+    
+    print("="*70)
+
+def print_phase_timings(scores):
+    """Print where pagerank() spent its time and memory"""
+    timings = getattr(scores, 'timings', None)
+    if not timings:
+        return
+    
+    phases = ", ".join(f"{name} {timings[name]:.4f}s" for name in ('index', 'matrix', 'iterate', 'results') if name in timings)
+    print(f"Time per phase: {phases}")
+    
+    memory = getattr(scores, 'memory', {})
+    if memory:
+        peak = memory.get('peak_rss_bytes')
+        peak_text = f", peak RSS {peak / 2**20:.1f} MB" if peak else ""
+        print(f"Memory: vote matrix {memory['matrix_bytes'] / 2**20:.2f} MB, "
+              f"score vectors {memory['vector_bytes'] / 2**20:.2f} MB{peak_text}")
+
+def print_damping_sweep(sweep, top=3):
+    """Print the result of pagerank.damping_sweep, one row per damping factor with its best nodes"""
+    print("\n" + "="*70)
+    print("DAMPING FACTOR SWEEP")
+    print("="*70)
+    print(f"{'Damping':<10} {'Iterations':<12} {'Top Nodes':<48}")
+    print("-" * 70)
+    
+    nodes = sweep.nodes
+    for c, d in enumerate(sweep.dampings):
+        row = sweep.scores[c]
+        best = top_positions(row, top)
+        leaders = ", ".join(f"{nodes[i]} ({row[i]:.4f})" for i in best)
+        flag = "" if sweep.converged[c] else " (no convergence)"
+        print(f"{d:<10.3f} {sweep.iterations[c]:<12} {leaders}{flag}")
+    
+    print("="*70)
+
+def print_precision_comparison(report):
+    """Print the result of pagerank.compare_precision"""
+    print("\n" + "="*60)
+    print(f"FLOAT64 vs {report['dtype'].upper()}")
+    print("="*60)
+    print(f"{'':<12} {'Iterations':<12} {'Iterate (s)':<14} {'Memory (MB)':<12}")
+    print("-" * 60)
+    for name, label in (('float64', 'float64'), ('low', report['dtype'])):
+        print(f"{label:<12} {report[name + '_iterations']:<12} {report[name + '_seconds']:<14.4f} "
+              f"{report[name + '_bytes'] / 2**20:<12.2f}")
+    print("-" * 60)
+    print(f"Max score error: {report['max_abs_error']:.2e} (relative {report['max_rel_error']:.2e}, L1 {report['l1_error']:.2e})")
+    print(f"Top {report['k']}: {report['top_k_overlap']:.1%} the same nodes, {report['swapped_pairs']:.2%} of pairs swapped, "
+          f"largest rank shift {report['max_rank_shift']}")
+    print("="*60)
@@ -0,0 +1,80 @@
+import logging
+import time
+
+import networkx as nx
+import numpy as np
+
+import graph_loader as gl
+from cache import FingerprintedDiGraph, GraphFingerprint, ResultCache, cached_pagerank, fingerprint
+from pagerank import pagerank
+
+def test_rewired_graph_gets_new_scores():
+    g = gl.load_default_graph()
+    cache = ResultCache()
+    before = cached_pagerank(g, cache=cache, log_level=logging.DEBUG)
+    old_fingerprint = fingerprint(g)
+
+    # Same node and link counts, different links
+    g.remove_edge('A', 'B')
+    g.add_edge('B', 'A')
+
+    assert fingerprint(g) != old_fingerprint
+    after = cached_pagerank(g, cache=cache, log_level=logging.DEBUG)
+    expected = pagerank(g, log_level=logging.DEBUG)
+    assert after is not before
+    np.testing.assert_allclose([after[node] for node in expected], list(expected.values()))
+    assert after['A'] != before['A']
+
+def test_unchanged_graph_hits_the_cache():
+    g = gl.load_default_graph()
+    cache = ResultCache()
+    first = cached_pagerank(g, cache=cache, log_level=logging.DEBUG)
+    assert cached_pagerank(gl.load_default_graph(), cache=cache, log_level=logging.DEBUG) is first
+    assert cache.stats()['hits'] == 1
+
+def test_fingerprint_ignores_container():
+    g = gl.load_default_graph()
+    assert fingerprint(g) == fingerprint(gl.compile_graph(g))
+
+def test_tracked_graph_fingerprint_follows_edits():
+    g = gl.load_default_graph()
+    assert isinstance(g, FingerprintedDiGraph)
+    edits = [
+        lambda: g.add_edge('D', 'E'),
+        lambda: g.add_edge('A', 'B'), # Already there
+        lambda: g.add_edges_from([('E', 'E'), ('E', 'A', {'weight': 2})]),
+        lambda: g.add_nodes_from(['F', ('G', {'color': 'red'})]),
+        lambda: g.remove_edge('A', 'B'),
+        lambda: g.remove_node('E'), # Takes its self link and the links both ways with it
+        lambda: g.remove_edges_from([('C', 'A'), ('X', 'Y')]),
+        lambda: g.remove_nodes_from(['F', 'missing']),
+        g.clear_edges,
+        lambda: g.add_edge('X', 'Z'),
+        g.clear,
+    ]
+    for edit in edits:
+        edit()
+        assert fingerprint(g) == GraphFingerprint.of(nx.DiGraph(g))
+    assert fingerprint(g.copy()) == fingerprint(g)
+
+def test_tracked_graph_lookup_skips_rehashing():
+    g = FingerprintedDiGraph(nx.gnm_random_graph(1000, 5000, seed=1, directed=True))
+    snapshot = fingerprint(g)
+    assert snapshot == GraphFingerprint.of(nx.DiGraph(g))
+
+    started = time.perf_counter()
+    GraphFingerprint.of(g)
+    rehash = time.perf_counter() - started
+    started = time.perf_counter()
+    for _ in range(100):
+        fingerprint(g)
+    lookup = (time.perf_counter() - started) / 100
+    assert lookup < rehash / 100
+
+    g.remove_edge(*next(iter(g.edges())))
+    assert fingerprint(g) != snapshot # A snapshot, later edits don't change it
+
+def test_views_are_hashed_from_content():
+    g = gl.load_default_graph()
+    view = g.subgraph(['A', 'B', 'C'])
+    assert fingerprint(view) == GraphFingerprint.of(nx.DiGraph(view))
@@ -0,0 +1,85 @@
+import logging
+
+import networkx as nx
+import numpy as np
+import pytest
+
+import graph_loader as gl
+from compressed import CompressedGraph, CompressedMatvec, vbyte_decode, vbyte_encode, vbyte_planes, zigzag, unzigzag
+from generators import generate
+from pagerank import graph_arrays, graph_matrix, pagerank
+
+GRAPHS = {
+    'rmat': lambda: generate('rmat', 20000, seed=7),
+    'random': lambda: generate('random', 20000, seed=8),
+    'default': gl.load_default_graph,
+    'isolated': lambda: nx.DiGraph([(0, 1), (1, 2)] + [(i, i) for i in range(3, 6)] + [(9, 0)]),
+}
+
+def edge_set(src, dst):
+    return sorted(zip(np.asarray(src).tolist(), np.asarray(dst).tolist()))
+
+def test_vbyte_round_trip():
+    rng = np.random.default_rng(1)
+    values = np.concatenate([rng.integers(0, 2**k, 500) for k in (8, 16, 24, 32)]).astype(np.uint32)
+    rng.shuffle(values)
+    at = [0, 3, 250, 1999]
+    flags, data, ranks = vbyte_encode(values, at)
+    planes = vbyte_planes(len(values), ranks[-1])
+    for row, (start, stop) in enumerate(zip(at, at[1:] + [len(values)])):
+        np.testing.assert_array_equal(vbyte_decode(flags, data, planes, start, stop, ranks[row]), values[start:stop])
+
+def test_zigzag_round_trip():
+    values = np.array([0, -1, 1, -2, 2, 2**30, -2**30])
+    np.testing.assert_array_equal(unzigzag(zigzag(values)), values)
+
+@pytest.mark.parametrize('graph', list(GRAPHS))
+@pytest.mark.parametrize('block_edges', [7, 1 << 16])
+def test_edges_round_trip(graph, block_edges):
+    labels, src, dst = graph_arrays(GRAPHS[graph]())
+    compressed = CompressedGraph.from_edges(labels, src, dst, block_edges=block_edges)
+
+    assert compressed.number_of_nodes() == len(labels)
+    assert compressed.number_of_edges() == len(src)
+    assert edge_set(*compressed.edge_arrays()) == edge_set(src, dst)
+    np.testing.assert_array_equal(compressed.out_degree, np.bincount(src, minlength=len(labels)))
+
+def test_to_networkx_round_trip():
+    g = gl.load_default_graph()
+    back = gl.compile_graph(g, compress=True).to_networkx()
+    assert set(back.nodes()) == set(g.nodes())
+    assert sorted(back.edges()) == sorted(g.edges())
+
+@pytest.mark.parametrize('graph', list(GRAPHS))
+def test_matvec_matches_csr(graph):
+    csr = gl.compile_graph(GRAPHS[graph]())
+    _, M = graph_matrix(csr)
+    operator = CompressedMatvec(gl.compile_graph(csr, compress=True))
+    n = M.shape[0]
+
+    x = np.random.default_rng(2).random(n)
+    np.testing.assert_allclose(operator @ x, M @ x, rtol=1e-12, atol=1e-15)
+    block = np.random.default_rng(3).random((n, 3))
+    np.testing.assert_allclose(operator @ block, M @ block, rtol=1e-12, atol=1e-15)
+
+    decoded = operator.tocsr()
+    assert decoded.nnz == M.nnz
+    assert abs(decoded - M).max() < 1e-15
+
+def test_binary_round_trip(tmp_path):
+    g = generate('rmat', 20000, seed=9)
+    compressed = gl.compile_graph(g, compress=True)
+    path = tmp_path / 'compressed.prg'
+    gl.save_binary_graph(compressed, path)
+    loaded = gl.load_binary_graph(path)
+
+    assert isinstance(loaded, CompressedGraph)
+    for name, a, b in zip(CompressedGraph._fields, loaded, compressed):
+        np.testing.assert_array_equal(np.asarray(a), np.asarray(b), err_msg=name)
+
+def test_pagerank_on_compressed_matches_csr():
+    g = generate('rmat', 20000, seed=10)
+    expected = pagerank(g, tol=1e-10, log_level=logging.DEBUG)
+    result = pagerank(gl.compile_graph(g, compress=True), tol=1e-10, log_level=logging.DEBUG)
+    assert list(result.nodes) == list(expected.nodes)
+    np.testing.assert_allclose(result.scores, expected.scores, rtol=0, atol=1e-9)
@@ -0,0 +1,64 @@
+import logging
+import multiprocessing as mp
+
+import networkx as nx
+import numpy as np
+import pytest
+
+import distributed
+from distributed import LocalTransport, SharedMemoryTransport, partitioned_pagerank
+from generators import generate
+from pagerank import pagerank
+
+@pytest.fixture(scope='module')
+def graph():
+    return generate('rmat', 5000, seed=7)
+
+@pytest.fixture(scope='module')
+def reference(graph):
+    return pagerank(graph, tol=1e-10, max_iter=200, log_level=logging.DEBUG)
+
+@pytest.mark.parametrize('transport', [LocalTransport, SharedMemoryTransport])
+@pytest.mark.parametrize('parts', [1, 3])
+def test_partitioned_matches_pagerank(graph, reference, transport, parts):
+    result = partitioned_pagerank(graph, parts=parts, tol=1e-10, max_iter=200, transport=transport())
+
+    assert result.converged
+    assert result.labels() == reference.labels()
+    np.testing.assert_allclose(result.scores, reference.scores, rtol=0, atol=1e-12)
+    assert result.iterations == reference.iterations
+
+def test_linf_norm_over_local_transport(graph):
+    reference = pagerank(graph, tol=1e-9, norm='linf', log_level=logging.DEBUG)
+    result = partitioned_pagerank(graph, parts=2, tol=1e-9, norm='linf', transport=LocalTransport())
+
+    np.testing.assert_allclose(result.scores, reference.scores, rtol=0, atol=1e-12)
+
+def test_empty_graph():
+    assert len(partitioned_pagerank(nx.DiGraph(), transport=LocalTransport())) == 0
+
+@pytest.mark.parametrize('transport', [LocalTransport, SharedMemoryTransport])
+def test_failing_worker_raises_instead_of_hanging(graph, transport, monkeypatch):
+    if transport is SharedMemoryTransport and mp.get_start_method() != 'fork':
+        pytest.skip("Spawned workers don't see the monkeypatch")
+    calls = []
+
+    def broken_matvec(M, x, out):
+        calls.append(1)
+        if len(calls) > 3: # Fail a few steps in, after some replies already went through
+            raise FloatingPointError("worker blew up")
+        out[:] = M @ x
+        return out
+
+    monkeypatch.setattr(distributed, 'matvec_into', broken_matvec) # Forked workers inherit the patch
+
+    with pytest.raises(RuntimeError, match="worker blew up"):
+        partitioned_pagerank(graph, parts=2, tol=1e-10, max_iter=200, transport=transport())
+
+def test_worker_that_cannot_start_raises(graph, monkeypatch):
+    def broken_attach(handle, keep):
+        raise OSError("no such shared block")
+
+    monkeypatch.setattr(distributed, 'attach', broken_attach)
+    with pytest.raises(RuntimeError, match="no such shared block"):
+        partitioned_pagerank(graph, parts=2, transport=LocalTransport())
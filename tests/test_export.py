@@ -0,0 +1,46 @@
+import csv
+import json
+
+import numpy as np
+import pytest
+
+from export import _float_chars, _join, export_scores, load_columns
+from pagerank import PageRankScores
+
+def printf(values, precision):
+    return ''.join(f"{value:.{precision - 1}e}" for value in values)
+
+@pytest.mark.parametrize('precision', [1, 3, 10])
+def test_float_chars_match_printf(precision):
+    rng = np.random.default_rng(5)
+    values = np.concatenate([
+        rng.random(20000) * 10.0 ** rng.integers(-12, 3, 20000),
+        -rng.random(100),
+        [0.0, 1.0, 9.9999999995, 0.99999999995, 9.5, 0.125, 1e-100, 9.999999999999e99, 2.5e-7, 1 / 3],
+        np.round(rng.random(2000), 10) + 5e-11, # Right on the rounding half of the 10th digit, give or take an ulp
+    ])
+    assert _join([_float_chars(values, precision)]).decode() == printf(values, precision)
+
+def test_rounding_half_matches_printf():
+    assert _join([_float_chars([9.9999999995], 10)]) == b'9.999999999e+00'
+
+@pytest.mark.parametrize('format', ['csv', 'tsv', 'ndjson'])
+def test_nul_in_label_survives(tmp_path, format):
+    scores = PageRankScores(['a\x00b', 'plain'], [0.25, 0.75])
+    path = tmp_path / f"scores.{format}"
+    export_scores(scores, path)
+
+    with open(path, newline='', encoding='utf-8') as f:
+        if format == 'ndjson':
+            labels = [json.loads(line)['node'] for line in f]
+        else:
+            labels = [row[0] for row in csv.reader(f, delimiter='\t' if format == 'tsv' else ',')][1:]
+    assert labels == ['a\x00b', 'plain']
+
+def test_binary_round_trip(tmp_path):
+    scores = PageRankScores([3, 1, 2], [0.5, 0.25, 0.125])
+    path = tmp_path / 'scores.prc'
+    assert export_scores(scores, path, top=2) == 2
+    nodes, values = load_columns(path)
+    assert nodes.tolist() == [3, 1]
+    assert values.tolist() == [0.5, 0.25]
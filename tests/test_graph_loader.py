@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+
+import graph_loader as gl
+from generators import generate
+
+@pytest.fixture
+def graph():
+    return gl.compile_graph(generate('rmat', 3000, seed=11))
+
+def same_graph(a, b):
+    assert list(a.labels) == list(b.labels)
+    np.testing.assert_array_equal(a.indptr, b.indptr)
+    np.testing.assert_array_equal(a.indices, b.indices)
+    np.testing.assert_array_equal(a.out_degree, b.out_degree)
+
+def test_binary_round_trip(tmp_path, graph):
+    path = tmp_path / 'graph.prg'
+    gl.save_binary_graph(graph, path)
+    same_graph(gl.load_binary_graph(path), graph)
+
+def test_binary_round_trip_string_labels(tmp_path):
+    g = gl.load_default_graph()
+    path = tmp_path / 'default.prg'
+    gl.save_binary_graph(g, path)
+    loaded = gl.load_binary_graph(path)
+    same_graph(loaded, gl.compile_graph(g))
+    assert sorted(loaded.to_networkx().edges()) == sorted(g.edges())
+
+def test_flipped_byte_is_caught_by_default(tmp_path, graph):
+    path = tmp_path / 'graph.prg'
+    gl.save_binary_graph(graph, path)
+    offset = gl.read_binary_header(path)['arrays']['indices']['offset']
+    with open(path, 'r+b') as f:
+        f.seek(offset + 5)
+        byte = f.read(1)
+        f.seek(offset + 5)
+        f.write(bytes([byte[0] ^ 0xFF]))
+
+    with pytest.raises(ValueError, match="indices"):
+        gl.load_binary_graph(path)
+    gl.load_binary_graph(path, verify=False) # Opting out still opens it
+
+def test_truncated_or_padded_file_is_caught(tmp_path, graph):
+    path = tmp_path / 'graph.prg'
+    gl.save_binary_graph(graph, path)
+    with open(path, 'ab') as f:
+        f.write(b'\0' * 64)
+    with pytest.raises(ValueError):
+        gl.load_binary_graph(path, verify=False)
+
+    gl.save_binary_graph(graph, path)
+    with open(path, 'r+b') as f:
+        f.truncate(path.stat().st_size - 100)
+    with pytest.raises(ValueError):
+        gl.load_binary_graph(path, verify=False)
+
+def test_cached_loader_rebuilds_corrupt_copy(tmp_path):
+    text = tmp_path / 'edges.txt'
+    text.write_text("1 2\n2 3\n3 1\n3 4\n")
+    first = gl.load_edge_list_cached(str(text))
+    binary = f"{text}.prg"
+    with open(binary, 'r+b') as f:
+        f.seek(gl.read_binary_header(binary)['arrays']['indices']['offset'])
+        f.write(b'\xff\xff')
+    same_graph(gl.load_edge_list_cached(str(text)), first)
+
+def test_subgraph_networkx_same_for_every_container():
+    g = generate('rmat', 20000, seed=12)
+    nodes = g.labels.tolist()[::7]
+    expected = g.to_networkx().subgraph(nodes)
+    for graph in (g, g.to_networkx(), gl.compile_graph(g), gl.compile_graph(g, compress=True)):
+        sub = gl.subgraph_networkx(graph, nodes)
+        assert set(sub.nodes()) == set(nodes)
+        assert sorted(sub.edges()) == sorted(expected.edges())
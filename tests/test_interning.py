@@ -0,0 +1,20 @@
+import numpy as np
+
+from interning import LabelTable
+
+def test_negative_zero_finds_zero():
+    table = LabelTable.from_labels([1.5, 0.0, -2.0])
+    assert table.find(-0.0) == 1
+    assert table.find(0.0) == 1
+    assert table.ids([-0.0, 0.0, 3.0]).tolist() == [1, 1, -1]
+
+    stored_negative = LabelTable.from_labels([1.5, -0.0])
+    assert stored_negative.find(0.0) == 1
+    assert stored_negative.ids(np.array([0.0])).tolist() == [1]
+
+def test_lookups_match_a_dict():
+    labels = ['a', 'bb', 'ccc', 'é']
+    table = LabelTable.from_labels(labels)
+    assert [table.find(label) for label in labels] == list(range(len(labels)))
+    assert 'missing' not in table
+    assert table.ids(['ccc', 'missing', 'a']).tolist() == [2, -1, 0]
@@ -0,0 +1,48 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+import montecarlo
+from generators import generate
+from montecarlo import monte_carlo_pagerank
+from pagerank import pagerank
+
+@pytest.fixture(scope='module')
+def graph():
+    return generate('rmat', 20000, seed=3)
+
+def test_intervals_cover_exact_scores(graph):
+    exact = pagerank(graph, tol=1e-12, max_iter=300, log_level=logging.DEBUG)
+    result = monte_carlo_pagerank(graph, walks=64, batches=8, seed=1)
+
+    assert result.labels() == exact.labels()
+    inside = (exact.scores >= result.lower - 1e-15) & (exact.scores <= result.upper + 1e-15)
+    assert inside.mean() > 0.85
+    assert abs(result.total() - exact.total()) < 0.02
+
+def test_same_seed_same_scores_on_any_worker_count(graph):
+    serial = monte_carlo_pagerank(graph, walks=16, batches=4, seed=7)
+    spread = monte_carlo_pagerank(graph, walks=16, batches=4, seed=7, workers=2)
+    np.testing.assert_array_equal(serial.scores, spread.scores)
+
+def test_early_stop_on_stable_top_k(graph):
+    result = monte_carlo_pagerank(graph, walks=256, batches=32, seed=5, top_k=5, patience=2)
+    assert result.walk_stats['stopped_early']
+    assert result.walk_stats['batches'] < 32
+
+def test_window_keeps_few_batches_in_flight(monkeypatch):
+    submitted = []
+
+    def batch(walks, d, seed):
+        submitted.append(seed)
+        return np.zeros(1, dtype=np.int64), 0
+
+    monkeypatch.setattr(montecarlo, '_walk_shared', batch)
+    with ThreadPoolExecutor(2) as pool:
+        results = montecarlo._windowed(pool, 2, 1, 0.85, range(10))
+        for _ in range(3):
+            next(results)
+        results.close()
+    assert len(submitted) == 4 # The 3 read plus one still running, not all 10
@@ -0,0 +1,40 @@
+import json
+import logging
+import os
+
+import networkx as nx
+import numpy as np
+import pytest
+
+from generators import generate
+from out_of_core import DiskGraph, build_disk_graph, out_of_core_pagerank
+from pagerank import pagerank
+
+@pytest.mark.parametrize('make', [lambda: generate('rmat', 4000, seed=2),
+                                  lambda: nx.DiGraph([('a', 'b'), ('b', 'c'), ('c', 'a'), ('c', 'é')])])
+def test_matches_pagerank(tmp_path, make):
+    g = make()
+    reference = pagerank(g, tol=1e-10, log_level=logging.DEBUG)
+    build_disk_graph(g, str(tmp_path), memory_budget=24 * 500) # Several blocks even on a small graph
+
+    result = out_of_core_pagerank(DiskGraph(str(tmp_path)), tol=1e-10)
+    assert result.labels() == reference.labels()
+    np.testing.assert_allclose(result.scores, reference.scores, rtol=0, atol=1e-12)
+
+def test_edge_list_file(tmp_path):
+    path = tmp_path / 'edges.txt'
+    path.write_text("1 2\n2 3\n3 1\n3 4\n")
+    result = out_of_core_pagerank(str(path), tol=1e-10, directory=str(tmp_path / 'blocks'))
+    assert sorted(result.labels()) == [1, 2, 3, 4]
+
+def test_never_unpickles_labels(tmp_path):
+    build_disk_graph(generate('random', 100, seed=1), str(tmp_path))
+    np.save(tmp_path / 'labels.npy', np.array([object()], dtype=object), allow_pickle=True)
+    with open(tmp_path / 'meta.json') as f:
+        meta = json.load(f)
+    for name in meta['label_arrays']:
+        os.remove(tmp_path / f'{name}.npy')
+        np.save(tmp_path / f'{name}.npy', np.array([object()], dtype=object), allow_pickle=True)
+
+    with pytest.raises(ValueError):
+        DiskGraph(str(tmp_path))
@@ -0,0 +1,93 @@
+import asyncio
+import http.client
+import json
+import threading
+import time
+
+import pytest
+
+import service
+from cache import GraphFingerprint
+from graph_loader import compile_graph
+from service import RankingService, ServiceError, start_server
+
+EDGES = b"A B\nA C\nB C\nC A\nC D\nD C\n"
+
+@pytest.fixture
+def server():
+    """The service listening on an ephemeral localhost port, its event loop running on a background thread"""
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+
+    ranking = RankingService(workers=2)
+    listener = asyncio.run_coroutine_threadsafe(start_server(ranking, port=0), loop).result(timeout=10)
+    host, port = listener.sockets[0].getsockname()[:2]
+    try:
+        yield host, port
+    finally:
+        listener.close()
+        asyncio.run_coroutine_threadsafe(listener.wait_closed(), loop).result(timeout=10)
+        ranking.close()
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(timeout=10)
+        loop.close()
+
+def request(address, method, path, body=None):
+    connection = http.client.HTTPConnection(*address, timeout=30)
+    try:
+        connection.request(method, path, body=body, headers={'Connection': 'close'})
+        response = connection.getresponse()
+        return response.status, json.loads(response.read())
+    finally:
+        connection.close()
+
+def test_upload_rank_and_health(server):
+    status, graph = request(server, 'POST', '/graphs?name=small', EDGES)
+    assert status == 201
+    assert (graph['name'], graph['nodes'], graph['edges']) == ('small', 4, 6)
+
+    status, result = request(server, 'POST', '/graphs/small/rank', json.dumps({'top': 2, 'nodes': ['D']}))
+    assert status == 200
+    assert result['converged']
+    assert [node for node, _ in result['top']] == ['C', 'A']
+    assert result['scores']['D'] == pytest.approx(0.2199, abs=1e-3)
+
+    status, again = request(server, 'GET', '/graphs/small/rank?top=2')
+    assert status == 200 and again['top'] == result['top']
+
+    status, health = request(server, 'GET', '/health')
+    assert status == 200
+    assert health['status'] == 'ok' and health['graphs'] == 1
+    assert health['cache']['hits'] == 1
+
+@pytest.mark.parametrize('options', [{'dtype': 'foo'}, {'method': 'nope'}, {'norm': 'l3'}, {'d': 1.5},
+                                     {'max_iter': 'many'}])
+def test_bad_rank_options_are_400(server, options):
+    request(server, 'POST', '/graphs?name=small', EDGES)
+    status, result = request(server, 'POST', '/graphs/small/rank', json.dumps(options))
+    assert status == 400
+    assert 'error' in result
+
+def test_unknown_graph_is_404(server):
+    assert request(server, 'GET', '/graphs/missing/rank')[0] == 404
+
+def test_coalesced_requests_all_get_400(monkeypatch):
+    def failing_pagerank(*args, **kwargs):
+        time.sleep(0.2) # Long enough for the other requests to join this one
+        raise ValueError("bad settings")
+
+    monkeypatch.setattr(service, 'pagerank', failing_pagerank)
+    graph = compile_graph(service.parse_edge_list(EDGES))
+
+    async def scenario():
+        ranking = RankingService(workers=1)
+        try:
+            waiting = [ranking.scores(graph, GraphFingerprint.of(graph), dict(service.RANK_DEFAULTS)) for _ in range(3)]
+            return await asyncio.gather(*waiting, return_exceptions=True), ranking.coalesced
+        finally:
+            ranking.close()
+
+    errors, coalesced = asyncio.run(scenario())
+    assert coalesced == 2
+    assert all(isinstance(e, ServiceError) and e.status == 400 for e in errors)
@@ -0,0 +1,45 @@
+import logging
+
+import networkx as nx
+import numpy as np
+import pytest
+
+import graph_loader as gl
+import solvers
+from generators import generate
+from pagerank import pagerank
+
+GRAPHS = {
+    'rmat': lambda: generate('rmat', 4000, seed=3),
+    'web': lambda: generate('web', 4000, seed=4),
+    'default': gl.load_default_graph,
+    'chain': lambda: nx.path_graph(50, create_using=nx.DiGraph),
+}
+
+@pytest.mark.parametrize('method', list(solvers.METHODS))
+@pytest.mark.parametrize('graph', list(GRAPHS))
+def test_every_method_matches_power(graph, method):
+    g = GRAPHS[graph]()
+    tol = 1e-8
+    expected = pagerank(g, max_iter=1000, tol=tol, log_level=logging.WARNING)
+    result = pagerank(g, max_iter=1000, tol=tol, method=method, log_level=logging.WARNING)
+
+    assert result.converged
+    assert list(result.nodes) == list(expected.nodes)
+    np.testing.assert_allclose(result.scores, expected.scores, rtol=0, atol=1e-6)
+
+def test_gauss_seidel_needs_fewer_iterations_at_high_damping():
+    g = generate('random', 200000, seed=5)
+    power = pagerank(g, d=0.95, max_iter=1000, log_level=logging.WARNING)
+    seidel = pagerank(g, d=0.95, max_iter=1000, method='gauss-seidel', log_level=logging.WARNING)
+
+    assert power.converged and seidel.converged
+    assert seidel.iterations < 0.8 * power.iterations
+    np.testing.assert_allclose(seidel.scores, power.scores, rtol=0, atol=1e-6)
+
+def test_gauss_seidel_residual_tracks_each_sweep():
+    g = generate('rmat', 2000, seed=6)
+    residuals = []
+    pagerank(g, method='gauss-seidel', callback=lambda i, r, t: residuals.append(r), log_level=logging.WARNING)
+    assert len(residuals) > 1
+    assert residuals[-1] < residuals[0]